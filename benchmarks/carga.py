@@ -0,0 +1,142 @@
+"""
+Teste de carga de uma rota do servidor.py: requisições por segundo e
+latências com o servidor de desenvolvimento do Flask (app.run(debug=True),
+como era executado antes) e com o producao.py (gunicorn, workers com threads
+e a versão pré-carregada).
+
+A planilha é importada uma vez em um diretório temporário e os dois modos
+servem a mesma versão. As conexões são threads deste processo com
+keep-alive; em máquinas com poucas CPUs elas disputam o processador com o
+servidor, então compare os números entre modos na mesma máquina.
+
+Uso: python -m benchmarks.carga [arquivo.xlsx] [--rota=/estoque] [--segundos=10] [--conexoes=8]
+         [--modos=desenvolvimento,producao] [--workers=N] [--threads=N]
+"""
+import http.client
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+from statistics import quantiles
+from time import perf_counter, sleep
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODOS = {
+    'desenvolvimento': lambda porta: [
+        sys.executable, '-c', f"import servidor; servidor.app.run(debug=True, host='127.0.0.1', port={porta})"],
+    'producao': lambda porta: [sys.executable, os.path.join(RAIZ, 'producao.py'), 'servidor'],
+}
+
+
+def porta_livre():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def aguardar(porta, rota, limite=60):
+    """Espera o servidor responder 200 na rota"""
+    fim = perf_counter() + limite
+    while perf_counter() < fim:
+        try:
+            conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=5)
+            conexao.request('GET', rota)
+            resposta = conexao.getresponse()
+            resposta.read()
+            conexao.close()
+            if resposta.status == 200:
+                return
+        except OSError:
+            pass
+        sleep(0.2)
+    raise RuntimeError(f"O servidor não respondeu em {rota} em {limite}s")
+
+
+def gerar_carga(porta, rota, segundos, conexoes):
+    """
+    Cada conexão repete a requisição até o tempo acabar, reconectando quando
+    o servidor fecha a conexão (o servidor de desenvolvimento não mantém keep-alive)
+
+    Returns:
+        tuple: (latências em segundos das respostas 200, quantidade de erros)
+    """
+    latencias = []
+    erros = [0]
+    lock = threading.Lock()
+    fim = perf_counter() + segundos
+
+    def conexao_cliente():
+        minhas, meus_erros = [], 0
+        conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=30)
+        while perf_counter() < fim:
+            inicio = perf_counter()
+            try:
+                conexao.request('GET', rota)
+                resposta = conexao.getresponse()
+                resposta.read()
+                if resposta.status == 200:
+                    minhas.append(perf_counter() - inicio)
+                else:
+                    meus_erros += 1
+                if resposta.will_close:
+                    conexao.close()
+            except (OSError, http.client.HTTPException):
+                meus_erros += 1
+                conexao.close()
+        conexao.close()
+        with lock:
+            latencias.extend(minhas)
+            erros[0] += meus_erros
+
+    threads = [threading.Thread(target=conexao_cliente) for _ in range(conexoes)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencias, erros[0]
+
+
+def medir_modo(modo, ambiente, rota, segundos, conexoes):
+    porta = porta_livre()
+    ambiente = dict(ambiente, RESTOQUE_ENDERECO=f"127.0.0.1:{porta}")
+    # Sessão própria para encerrar também os processos filhos (reloader, workers)
+    processo = subprocess.Popen(MODOS[modo](porta), cwd=RAIZ, env=ambiente, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.DEVNULL, start_new_session=True)
+    try:
+        aguardar(porta, rota)
+        latencias, erros = gerar_carga(porta, rota, segundos, conexoes)
+    finally:
+        os.killpg(processo.pid, signal.SIGTERM)
+        processo.wait()
+    if len(latencias) < 2:
+        raise RuntimeError(f"{modo}: apenas {len(latencias)} respostas e {erros} erros")
+    percentis = quantiles(latencias, n=100)
+    print(f"  {modo:<16}{len(latencias) / segundos:>10.1f} req/s   p50 {percentis[49] * 1000:>8.1f} ms"
+          f"   p99 {percentis[98] * 1000:>8.1f} ms   erros {erros}")
+
+
+if __name__ == "__main__":
+    opcoes = dict(argumento[2:].split('=', 1) for argumento in sys.argv[1:] if argumento.startswith('--'))
+    argumentos = [argumento for argumento in sys.argv[1:] if not argumento.startswith('--')]
+    arquivo = os.path.abspath(argumentos[0] if argumentos else os.path.join(RAIZ, 'tabela.xlsx'))
+    rota = opcoes.get('rota', '/estoque')
+    segundos = float(opcoes.get('segundos', 10))
+    conexoes = int(opcoes.get('conexoes', 8))
+    modos = opcoes.get('modos', ','.join(MODOS)).split(',')
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        ambiente = dict(os.environ, RESTOQUE_DADOS=os.path.join(diretorio, 'dados'),
+                        RESTOQUE_BANCO=os.path.join(diretorio, 'restoque.db'),
+                        PYTHONPATH=os.pathsep.join(filter(None, [RAIZ, os.environ.get('PYTHONPATH')])))
+        for opcao in ('workers', 'threads'):
+            if opcao in opcoes:
+                ambiente[f"RESTOQUE_{opcao.upper()}"] = opcoes[opcao]
+        subprocess.run([sys.executable, '-c', 'import sys, conversor; conversor.run(sys.argv[1])', arquivo],
+                       cwd=RAIZ, env=ambiente, stdout=subprocess.DEVNULL, check=True)
+
+        print(f"GET {rota}, {conexoes} conexões, {segundos:.0f}s por modo, {os.cpu_count()} CPUs")
+        for modo in modos:
+            medir_modo(modo, ambiente, rota, segundos, conexoes)
@@ -0,0 +1,58 @@
+"""
+Mede o ganho da compactação de tipos (conversor.compactar) nas abas
+'Tabela' e 'Estoque': memória do DataFrame e tamanho do parquet gravado.
+
+Compara três formas de cada aba:
+- pandas: pd.read_excel (object/int64/float64), como antes do leitor Arrow
+- arrow: leitor.ler_planilhas (dtypes Arrow, sem compactação)
+- compacto: depois de conversor.compactar (categorias, int32, EAN uint64)
+
+Uso: python -m benchmarks.compactacao [arquivo.xlsx]
+"""
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+from conversor import COLUNAS_LEITURA, compactar, gravar_parquet, ler, mapear_estoque
+
+
+def tamanho_parquet(df, nome, diretorio):
+    caminho = os.path.join(diretorio, f"{nome}.parquet")
+    gravar_parquet(df, caminho, nome)
+    return os.path.getsize(caminho)
+
+
+def formas(arquivo):
+    """Retorna {forma: {aba: DataFrame}} com o estoque já mapeado na tabela"""
+    pandas = {aba: pd.read_excel(arquivo, sheet_name=aba, engine='openpyxl', usecols=colunas.__contains__)
+              for aba, colunas in COLUNAS_LEITURA.items()}
+    esquemas = {}
+    arrow = ler(arquivo, esquemas)
+    for planilhas in (pandas, arrow):
+        mapear_estoque(planilhas['Tabela'], planilhas['Estoque'])
+    compacto = {aba: df.copy() for aba, df in arrow.items()}
+    compactar(compacto, esquemas)
+    return {'pandas': pandas, 'arrow': arrow, 'compacto': compacto}
+
+
+if __name__ == "__main__":
+    arquivo = sys.argv[1] if len(sys.argv) > 1 else "tabela.xlsx"
+    resultado = formas(arquivo)
+
+    print(f"Arquivo: {arquivo}")
+    with tempfile.TemporaryDirectory() as diretorio:
+        for aba in COLUNAS_LEITURA:
+            print(f"  Aba '{aba}'")
+            base = None
+            for forma, planilhas in resultado.items():
+                df = planilhas[aba]
+                memoria = df.memory_usage(deep=True).sum()
+                parquet = tamanho_parquet(df, aba.lower(), diretorio)
+                if base is None:
+                    base = (memoria, parquet)
+                print(f"    {forma:<9}memória {memoria / 1024 / 1024:>6.2f} MB ({memoria / base[0]:>4.0%})"
+                      f"   parquet {parquet / 1024:>7.0f} KB ({parquet / base[1]:>4.0%})")
+            tipos = ', '.join(f"{coluna}={tipo}" for coluna, tipo in resultado['compacto'][aba].dtypes.items())
+            print(f"    tipos: {tipos}")
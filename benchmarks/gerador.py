@@ -0,0 +1,107 @@
+"""
+Gera planilhas sintéticas com as abas 'Estoque' e 'Tabela' no layout real
+(as colunas do alias em main.py), para os benchmarks.
+
+As proporções imitam a planilha real: ~300 fornecedores, duas categorias
+(MED/PER), EANs na maioria com 13 dígitos, ~3,5% das linhas do estoque
+repetindo o EAN de outra (os EANs substituídos ficam sem estoque na tabela) e
+a coluna 'Estoque' da tabela vazia. A mesma semente gera sempre o mesmo arquivo.
+
+Uso: python -m benchmarks.gerador arquivo.xlsx [linhas] [semente]
+"""
+import os
+import sys
+from time import perf_counter
+
+import numpy as np
+import openpyxl
+
+CABECALHO_ESTOQUE = ['Cód. Fornecedor', 'Fornecedor', 'Cód. Produto', 'Produto', 'EAN', 'Categoria',
+                     'Estoque em Andamento', 'Estoque Existente', 'Estoque Disponivel']
+CABECALHO_TABELA = ['Codigo', 'EAN', 'Descrição', 'Categoria', 'Preço Base', 'Desconto', 'ST',
+                    'Preço Final', 'Estoque']
+CATEGORIAS = ['MED', 'PER']
+FORNECEDORES = 300
+FORMAS = ['CPR', 'CPS', 'ML', 'GR', 'MG', 'UN']
+# Fração de linhas do estoque que repetem o EAN da linha anterior
+REPETIDOS = 0.035
+
+
+def gerar_eans(rng, quantidade):
+    """EANs distintos: ~99% com 13 dígitos (prefixo 789) e o resto com 8, 12 ou 14"""
+    eans = 7890000000000 + rng.choice(10 * quantidade, size=quantidade, replace=False)
+    curtos = rng.random(quantidade) < 0.01
+    tamanhos = rng.choice([8, 12, 14], size=quantidade)
+    eans[curtos] = np.where(tamanhos[curtos] == 8, 78900000 + np.arange(curtos.sum()),
+                            np.where(tamanhos[curtos] == 12, 789000000000, 17890000000000) + eans[curtos] % 10 ** 9)
+    return eans
+
+
+def gerar_planilha(caminho, linhas, semente=0, fornecedores=FORNECEDORES):
+    """
+    Grava a planilha em modo write-only, com `linhas` linhas em cada aba
+
+    Args:
+        caminho (str): Arquivo .xlsx de destino
+        linhas (int): Linhas de cada aba
+        semente (int): Semente do gerador aleatório
+        fornecedores (int): Quantidade de fornecedores distintos
+    """
+    rng = np.random.default_rng(semente)
+    eans = gerar_eans(rng, linhas)
+    workbook = openpyxl.Workbook(write_only=True)
+
+    estoque = workbook.create_sheet('Estoque')
+    estoque.append(CABECALHO_ESTOQUE)
+    codigos = 5000 + rng.choice(5000, size=fornecedores, replace=False)
+    # Poucos fornecedores concentram a maior parte dos produtos, como na planilha real
+    pesos = 1 / np.arange(1, fornecedores + 1)
+    fornecedor = codigos[rng.choice(fornecedores, size=linhas, p=pesos / pesos.sum())]
+    categoria = np.where(rng.random(linhas) < 0.7, 0, 1)
+    existentes = np.where(rng.random(linhas) < 0.3, 0, rng.integers(1, 7000, size=linhas))
+    andamento = np.minimum(np.where(rng.random(linhas) < 0.8, 0, rng.integers(1, 200, size=linhas)), existentes)
+    eans_estoque = np.where(rng.random(linhas) < REPETIDOS, np.roll(eans, 1), eans)
+    for i in range(linhas):
+        estoque.append([int(fornecedor[i]), f"FORNECEDOR {fornecedor[i]}", 50000 + i,
+                        f"PRODUTO {i} {i % 50 * 10 + 10}{FORMAS[i % len(FORMAS)]}", int(eans_estoque[i]),
+                        CATEGORIAS[categoria[i]], int(andamento[i]), int(existentes[i]),
+                        int(existentes[i] - andamento[i])])
+
+    tabela = workbook.create_sheet('Tabela')
+    tabela.append(CABECALHO_TABELA)
+    ordem = rng.permutation(linhas)
+    precos = np.round(rng.lognormal(3.7, 0.9, size=linhas) + 1, 2)
+    descontos = np.where(rng.random(linhas) < 0.4, 0, rng.integers(1, 40, size=linhas)).astype(float)
+    descontos[rng.random(linhas) < 0.1] += 0.5
+    for i in range(linhas):
+        preco = float(precos[i])
+        st = round(preco * 0.03, 2) if i % 3 else 0.0
+        # Descrição com largura fixa, como a planilha real exporta
+        tabela.append([10000 + i, int(eans[ordem[i]]), f"PRODUTO {ordem[i]} {ordem[i] % 50 * 10 + 10}MG".ljust(40),
+                       CATEGORIAS[categoria[ordem[i]]], preco, float(descontos[i]), st,
+                       round(preco * (1 - descontos[i] / 100) + st, 2), None])
+    workbook.save(caminho)
+
+
+def planilha_em_cache(diretorio, linhas, semente=0):
+    """Caminho da planilha sintética de `linhas` linhas em `diretorio`, gerando-a só na primeira vez"""
+    caminho = os.path.join(diretorio, f"sintetica_{linhas}_{semente}.xlsx")
+    if not os.path.exists(caminho):
+        os.makedirs(diretorio, exist_ok=True)
+        temporario = f"{caminho}.{os.getpid()}.tmp"
+        gerar_planilha(temporario, linhas, semente)
+        os.replace(temporario, caminho)
+    return caminho
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit("Uso: python -m benchmarks.gerador arquivo.xlsx [linhas] [semente]")
+    arquivo = sys.argv[1]
+    linhas = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    semente = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+
+    inicio = perf_counter()
+    gerar_planilha(arquivo, linhas, semente)
+    print(f"{arquivo}: {linhas} linhas por aba, {os.path.getsize(arquivo) / 1024 / 1024:.1f} MB, "
+          f"{perf_counter() - inicio:.1f}s")
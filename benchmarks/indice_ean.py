@@ -0,0 +1,53 @@
+"""
+Compara a consulta de estoque por EAN pelo índice (GET /estoque/<ean> e
+POST /estoque/lookup) com o caminho da tabela completa (GET /estoque e
+busca no cliente).
+
+Uso: python -m benchmarks.indice_ean [quantidade_eans]
+"""
+import json
+import sys
+from time import perf_counter
+
+import numpy as np
+
+from indice_ean import carregar_indice
+from servidor import app, armazem
+
+
+def cronometrar(funcao, repeticoes):
+    inicio = perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (perf_counter() - inicio) / repeticoes
+
+
+if __name__ == "__main__":
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    versao = armazem.versao_atual()
+    if versao is None:
+        sys.exit("Nenhuma versão publicada; rode uma importação antes.")
+
+    indice = carregar_indice(armazem, versao)
+    rng = np.random.default_rng(0)
+    eans = rng.choice(np.asarray(indice.chaves), size=quantidade).tolist()
+    cliente = app.test_client()
+
+    def tabela_completa():
+        dados = json.loads(cliente.get('/estoque').data)
+        mapa = {linha['EAN']: linha['Estoque Disponivel'] for linha in dados}
+        return mapa[eans[0]]
+
+    tempo_tabela = cronometrar(tabela_completa, 5)
+    tempo_unitario_http = cronometrar(lambda: cliente.get(f'/estoque/{eans[0]}'), 200)
+    tempo_unitario = cronometrar(lambda: indice.buscar(eans[0]), 10000)
+    tempo_lote_http = cronometrar(lambda: cliente.post('/estoque/lookup', json={'eans': eans}), 10)
+    tempo_lote = cronometrar(lambda: indice.buscar_lote(eans), 100)
+
+    print(f"Versão {versao}, {len(indice)} EANs no índice, lote de {quantidade} EANs")
+    print(f"  GET /estoque + busca no cliente    : {tempo_tabela * 1000:9.2f} ms por consulta")
+    print(f"  GET /estoque/<ean>                 : {tempo_unitario_http * 1000:9.3f} ms por consulta")
+    print(f"  IndiceEAN.buscar                   : {tempo_unitario * 1e6:9.2f} µs por consulta")
+    print(f"  POST /estoque/lookup               : {tempo_lote_http * 1e6 / quantidade:9.2f} µs por EAN")
+    print(f"  IndiceEAN.buscar_lote              : {tempo_lote * 1e6 / quantidade:9.3f} µs por EAN")
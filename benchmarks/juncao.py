@@ -0,0 +1,59 @@
+"""
+Compara a junção EAN -> estoque antiga (to_dict + Series.map) com a
+vetorizada (juncao.juntar_estoque) em abas sintéticas de tamanhos crescentes,
+conferindo que os resultados são iguais.
+
+Uso: python -m benchmarks.juncao [linhas ...]
+"""
+import logging
+import sys
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from juncao import juntar_estoque
+
+
+def abas_sinteticas(linhas, semente=0):
+    """Tabela e estoque com EANs em comum, alguns repetidos no estoque e alguns sem estoque"""
+    rng = np.random.default_rng(semente)
+    inteiro = pd.ArrowDtype(pa.int64())
+    eans = 7890000000000 + rng.choice(10 * linhas, size=linhas, replace=False)
+    estoque = pd.DataFrame({
+        'EAN': pd.array(np.where(rng.random(linhas) < 0.03, np.roll(eans, 1), eans), dtype=inteiro),
+        'Estoque Disponivel': pd.array(rng.integers(0, 5000, size=linhas), dtype=inteiro),
+    })
+    tabela = pd.DataFrame({'EAN': pd.array(rng.permutation(eans), dtype=inteiro)})
+    return tabela, estoque
+
+
+def juncao_antiga(tabela, estoque):
+    mapeamento = estoque.set_index('EAN')['Estoque Disponivel'].to_dict()
+    return tabela['EAN'].map(mapeamento).fillna(0).astype(int).to_numpy()
+
+
+def juncao_nova(tabela, estoque):
+    return juntar_estoque(tabela['EAN'], estoque['EAN'], estoque['Estoque Disponivel'])[0]
+
+
+def medir(funcao, *args):
+    inicio = perf_counter()
+    resultado = funcao(*args)
+    return resultado, perf_counter() - inicio
+
+
+if __name__ == "__main__":
+    tamanhos = [int(argumento) for argumento in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    # Os avisos do diagnóstico são esperados aqui (EANs repetidos e sem estoque)
+    logging.getLogger().setLevel(logging.ERROR)
+
+    for linhas in tamanhos:
+        tabela, estoque = abas_sinteticas(linhas)
+        antes, tempo_antes = medir(juncao_antiga, tabela, estoque)
+        depois, tempo_depois = medir(juncao_nova, tabela, estoque)
+        if not np.array_equal(antes, depois):
+            sys.exit(f"FALHOU: resultados diferentes com {linhas} linhas")
+        print(f"{linhas:>10} linhas   to_dict + map {tempo_antes:7.3f}s   juntar_estoque {tempo_depois:7.3f}s"
+              f"   ganho {tempo_antes / tempo_depois:5.1f}x")
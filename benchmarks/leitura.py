@@ -0,0 +1,47 @@
+"""
+Compara o tempo de leitura das abas 'Tabela' e 'Estoque':
+pd.read_excel chamado uma vez por aba (antes) x leitor.ler_planilhas (depois).
+
+Uso: python -m benchmarks.leitura [arquivo.xlsx] [repeticoes]
+"""
+import sys
+from statistics import median
+from time import perf_counter
+
+import pandas as pd
+
+from conversor import COLUNAS_LEITURA
+from leitor import ler_planilhas
+
+
+def leitura_antiga(arquivo):
+    df_tabela = pd.read_excel(arquivo, sheet_name='Tabela', engine='openpyxl')
+    df_estoque = pd.read_excel(arquivo, sheet_name='Estoque', engine='openpyxl')
+    return df_tabela, df_estoque
+
+
+def leitura_nova(arquivo):
+    planilhas = ler_planilhas(arquivo, COLUNAS_LEITURA)
+    return planilhas['Tabela'], planilhas['Estoque']
+
+
+def medir(funcao, arquivo, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = perf_counter()
+        funcao(arquivo)
+        tempos.append(perf_counter() - inicio)
+    return tempos
+
+
+if __name__ == "__main__":
+    arquivo = sys.argv[1] if len(sys.argv) > 1 else "tabela.xlsx"
+    repeticoes = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    antes = medir(leitura_antiga, arquivo, repeticoes)
+    depois = medir(leitura_nova, arquivo, repeticoes)
+
+    print(f"Arquivo: {arquivo} ({repeticoes} repetições)")
+    print(f"  pd.read_excel x2     : mediana {median(antes):.3f}s, mínimo {min(antes):.3f}s")
+    print(f"  leitor.ler_planilhas : mediana {median(depois):.3f}s, mínimo {min(depois):.3f}s")
+    print(f"  Ganho: {median(antes) / median(depois):.2f}x")
@@ -0,0 +1,64 @@
+"""
+Confere o pico de memória (RSS) da importação em blocos (blocos.run_blocos)
+em uma planilha sintética grande: sai com erro se o pico passar do orçamento.
+
+Uso: python -m benchmarks.memoria [linhas] [orcamento_mb] [arquivo.xlsx] [--comparar]
+
+A planilha tem `linhas` linhas (padrão 1.000.000) em cada aba e é gerada em
+`arquivo.xlsx` se ainda não existir (padrão: diretório temporário, apagado
+no fim). Cada importação roda em um subprocesso com um armazém vazio; com
+--comparar, conversor.run também é medido na mesma planilha.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+
+from benchmarks.gerador import gerar_planilha
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def medir_importacao(codigo, arquivo, dados, orcamento_mb):
+    """Roda `codigo` em um subprocesso e retorna (pico de RSS em MB, segundos)"""
+    ambiente = dict(os.environ, RESTOQUE_DADOS=dados, RESTOQUE_MEMORIA_MB=str(orcamento_mb), RESTOQUE_BANCO='')
+    ambiente.pop('RESTOQUE_ESQUEMAS', None)
+    inicio = perf_counter()
+    processo = subprocess.Popen([sys.executable, '-c', codigo, arquivo], cwd=RAIZ, env=ambiente,
+                                stdout=subprocess.DEVNULL)
+    # wait4 devolve o uso de recursos só deste filho (RUSAGE_CHILDREN acumularia todos)
+    _, status, uso = os.wait4(processo.pid, 0)
+    processo.returncode = os.waitstatus_to_exitcode(status)
+    if processo.returncode != 0:
+        sys.exit(f"A importação terminou com código {processo.returncode}")
+    pico = uso.ru_maxrss / 1024 if sys.platform != 'darwin' else uso.ru_maxrss / 1024 / 1024
+    return pico, perf_counter() - inicio
+
+
+if __name__ == "__main__":
+    argumentos = [argumento for argumento in sys.argv[1:] if not argumento.startswith('--')]
+    linhas = int(argumentos[0]) if len(argumentos) > 0 else 1_000_000
+    orcamento_mb = int(argumentos[1]) if len(argumentos) > 1 else 512
+    comparar = '--comparar' in sys.argv
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        arquivo = argumentos[2] if len(argumentos) > 2 else os.path.join(diretorio, 'sintetica.xlsx')
+        if not os.path.exists(arquivo):
+            print(f"Gerando {arquivo} com {linhas} linhas por aba...")
+            inicio = perf_counter()
+            gerar_planilha(arquivo, linhas)
+            print(f"  {perf_counter() - inicio:.1f}s, {os.path.getsize(arquivo) / 1024 / 1024:.1f} MB")
+
+        print(f"Arquivo: {arquivo}, orçamento: {orcamento_mb} MB")
+        pico, duracao = medir_importacao("import sys, blocos; blocos.run_blocos(sys.argv[1])",
+                                         arquivo, os.path.join(diretorio, 'blocos'), orcamento_mb)
+        print(f"  {'run_blocos':<14}pico {pico:>8.0f} MB {duracao:>8.1f}s")
+        if comparar:
+            pico_conversor, duracao = medir_importacao("import sys, conversor; conversor.run(sys.argv[1])",
+                                                       arquivo, os.path.join(diretorio, 'conversor'), orcamento_mb)
+            print(f"  {'conversor.run':<14}pico {pico_conversor:>8.0f} MB {duracao:>8.1f}s")
+
+    if pico > orcamento_mb:
+        sys.exit(f"FALHOU: pico de {pico:.0f} MB acima do orçamento de {orcamento_mb} MB")
+    print(f"OK: pico de {pico:.0f} MB dentro do orçamento de {orcamento_mb} MB")
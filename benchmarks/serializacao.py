@@ -0,0 +1,100 @@
+"""
+Compara os caminhos de serialização dos endpoints de leitura:
+vazão (bytes/s) e pico de memória (RSS) de cada um.
+
+Cada caminho roda em um subprocesso próprio, para que o pico de RSS de um
+não contamine a medição do outro.
+
+Uso: python -m benchmarks.serializacao [arquivo.parquet] [repeticoes]
+"""
+import json
+import resource
+import subprocess
+import sys
+from time import perf_counter
+
+import pandas as pd
+import pyarrow.parquet as pq
+from flask import Flask, jsonify
+
+from serializacao import resposta_arrow, tabela_para_json
+
+app = Flask(__name__)
+
+
+def dict_jsonify(caminho):
+    """Caminho antigo de /estoque e /tabela"""
+    df = pd.read_parquet(caminho, engine='pyarrow')
+    return jsonify(df.to_dict(orient='records')).get_data()
+
+
+def to_json_jsonify(caminho):
+    """Caminho antigo de /dados-parquet (JSON codificado duas vezes)"""
+    df = pd.read_parquet(caminho)
+    return jsonify(df.to_json(orient='records', date_format='iso')).get_data()
+
+
+def json_colunar(caminho):
+    return tabela_para_json(pq.read_table(caminho))
+
+
+def arrow_stream(caminho):
+    return b''.join(resposta_arrow(caminho).response)
+
+
+CAMINHOS = {
+    'dict_jsonify': dict_jsonify,
+    'to_json_jsonify': to_json_jsonify,
+    'json_colunar': json_colunar,
+    'arrow_stream': arrow_stream,
+}
+
+
+def pico_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def medir(nome, caminho, repeticoes):
+    funcao = CAMINHOS[nome]
+    rss_inicial = pico_rss_kb()
+    total_bytes = 0
+    with app.app_context():
+        inicio = perf_counter()
+        for _ in range(repeticoes):
+            total_bytes += len(funcao(caminho))
+        duracao = perf_counter() - inicio
+    return {
+        'caminho': nome,
+        'bytes_resposta': total_bytes // repeticoes,
+        'segundos_por_requisicao': duracao / repeticoes,
+        'bytes_por_segundo': total_bytes / duracao,
+        'pico_rss_mb': pico_rss_kb() / 1024,
+        'acrescimo_rss_mb': (pico_rss_kb() - rss_inicial) / 1024,
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--caminho':
+        _, _, nome, caminho, repeticoes = sys.argv
+        print(json.dumps(medir(nome, caminho, int(repeticoes))))
+        sys.exit(0)
+
+    from snapshots import armazem
+
+    versao = armazem.versao_atual()
+    padrao = armazem.caminho(versao, 'estoque.parquet') if versao is not None else 'estoque.parquet'
+    caminho = sys.argv[1] if len(sys.argv) > 1 else padrao
+    repeticoes = sys.argv[2] if len(sys.argv) > 2 else '10'
+
+    print(f"Arquivo: {caminho} ({repeticoes} repetições)")
+    print(f"{'caminho':<18}{'bytes':>12}{'ms/req':>10}{'MB/s':>10}{'pico RSS':>12}{'+RSS':>10}")
+    for nome in CAMINHOS:
+        saida = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.serializacao', '--caminho', nome, caminho, repeticoes],
+            capture_output=True, text=True, check=True
+        )
+        r = json.loads(saida.stdout.strip().splitlines()[-1])
+        print(f"{r['caminho']:<18}{r['bytes_resposta']:>12}"
+              f"{r['segundos_por_requisicao'] * 1000:>10.1f}"
+              f"{r['bytes_por_segundo'] / 1e6:>10.1f}"
+              f"{r['pico_rss_mb']:>10.1f}MB{r['acrescimo_rss_mb']:>8.1f}MB")
@@ -0,0 +1,66 @@
+"""
+Compara a carga da aba 'Tabela' no SQLite: SQLiteCRUD.insert linha a linha
+(um commit por linha, sem PRAGMAs) x bulk_insert / bulk_upsert.
+
+Uso: python -m benchmarks.sqlite [arquivo.xlsx] [linhas_baseline]
+
+O caminho linha a linha é medido em apenas `linhas_baseline` linhas (padrão
+2000), porque cada commit faz fsync; a vazão é extrapolada a partir delas.
+"""
+import os
+import sys
+import tempfile
+from time import perf_counter
+
+from leitor import ler_planilhas
+from main import SQLiteCRUD, alias
+
+COLUNAS = {
+    'codigo': 'INTEGER',
+    'ean': 'INTEGER PRIMARY KEY',
+    'descricao': 'TEXT',
+    'categoria': 'TEXT',
+    'preco_base': 'REAL',
+    'desconto': 'REAL',
+    'st': 'REAL',
+    'preco_final': 'REAL',
+    'estoque': 'INTEGER',
+}
+
+
+def banco_novo(diretorio, nome, pragmas=None):
+    db = SQLiteCRUD(os.path.join(diretorio, nome), pragmas=pragmas)
+    db.create_table('tabela', COLUNAS)
+    return db
+
+
+def medir(rotulo, linhas, funcao):
+    inicio = perf_counter()
+    ok = funcao()
+    duracao = perf_counter() - inicio
+    print(f"  {rotulo:<34}{linhas:>8} linhas {duracao:>8.3f}s {linhas / duracao:>12.0f} linhas/s"
+          f"{'' if ok else '  (ERRO)'}")
+
+
+if __name__ == "__main__":
+    arquivo = sys.argv[1] if len(sys.argv) > 1 else "tabela.xlsx"
+    linhas_baseline = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    df = ler_planilhas(arquivo, {'Tabela': None})['Tabela'].rename(columns=alias)
+    df = df.drop_duplicates('ean', keep='last')
+    registros = df.astype(object).where(df.notna(), None).to_dict(orient='records')
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        print(f"Arquivo: {arquivo}, {len(df)} linhas")
+
+        with banco_novo(diretorio, 'linha_a_linha.db', pragmas={}) as db:
+            amostra = registros[:linhas_baseline]
+            medir('insert (linha a linha)', len(amostra),
+                  lambda: all(db.insert('tabela', registro) for registro in amostra))
+
+        with banco_novo(diretorio, 'bulk_insert.db') as db:
+            medir('bulk_insert', len(df), lambda: db.bulk_insert('tabela', df))
+
+        with banco_novo(diretorio, 'bulk_upsert.db') as db:
+            medir('bulk_upsert (tabela vazia)', len(df), lambda: db.bulk_upsert('tabela', df))
+            medir('bulk_upsert (todas em conflito)', len(df), lambda: db.bulk_upsert('tabela', df))
@@ -0,0 +1,245 @@
+"""
+Suíte de benchmarks reprodutível sobre planilhas sintéticas (benchmarks.gerador):
+etapas do conversor.run, detector, separador, carga no SQLite e rotas HTTP
+(servidor.py e microservico.py, pelo test client do Flask).
+
+Os resultados são gravados em JSON e, com --baseline, comparados com uma
+execução anterior: o comando sai com erro se alguma medida ficar mais lenta
+que a baseline além da tolerância.
+
+Uso: python -m benchmarks.suite [linhas ...] [--suites=conversor,detector,separador,sqlite,http]
+         [--repeticoes=3] [--saida=resultados.json] [--baseline=baseline.json] [--tolerancia=0.25]
+         [--cache=diretório das planilhas geradas]
+
+Sem `linhas`, usa 10000. Cada tamanho roda com um armazém, registro de esquemas
+e banco novos, em um diretório temporário.
+"""
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from statistics import median
+from time import perf_counter
+
+from benchmarks.gerador import planilha_em_cache
+
+SUITES = ['conversor', 'detector', 'separador', 'sqlite', 'http']
+TOLERANCIA = 0.25
+# Diferenças menores que isso (rotas de menos de 1 ms) são ruído, não regressão
+DIFERENCA_MINIMA = 0.001
+CACHE_PLANILHAS = os.path.join(tempfile.gettempdir(), 'restoque-benchmarks')
+
+
+def cronometrar(funcao, repeticoes):
+    """Mediana, em segundos, de `repeticoes` chamadas de `funcao`"""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = perf_counter()
+        funcao()
+        tempos.append(perf_counter() - inicio)
+    return median(tempos)
+
+
+def suite_conversor(arquivo, linhas, diretorio, repeticoes):
+    """Etapas da primeira importação e tempo total das reimportações (registro e partições reaproveitados)"""
+    import conversor
+
+    tempos = {}
+    conversor.run(arquivo, tempos)
+    resultados = {f"conversor.{etapa}": segundos for etapa, segundos in tempos.items()}
+    resultados['conversor.total'] = sum(tempos.values())
+    resultados['conversor.reimportacao'] = cronometrar(lambda: conversor.run(arquivo), repeticoes)
+    return resultados
+
+
+def suite_detector(arquivo, linhas, diretorio, repeticoes):
+    from detector import analisar_excel, analisar_excel_completo
+
+    # analisar_excel imprime o relatório de cada coluna
+    with contextlib.redirect_stdout(io.StringIO()):
+        return {
+            'detector.analisar_excel': cronometrar(lambda: analisar_excel(arquivo, 'Estoque'), repeticoes),
+            'detector.analisar_excel_completo': cronometrar(lambda: analisar_excel_completo(arquivo, processos=1),
+                                                            repeticoes),
+        }
+
+
+def suite_separador(arquivo, linhas, diretorio, repeticoes):
+    from separador import FORMATOS, separar_abas_para_arquivos
+
+    resultados = {}
+    for formato in FORMATOS:
+        destino = os.path.join(diretorio, f"separadas_{formato}")
+        resultados[f"separador.{formato}"] = cronometrar(
+            lambda: separar_abas_para_arquivos(arquivo, destino, formato), repeticoes)
+    return resultados
+
+
+def suite_sqlite(arquivo, linhas, diretorio, repeticoes):
+    from benchmarks.sqlite import banco_novo
+    from leitor import ler_planilhas
+    from main import alias
+
+    df = ler_planilhas(arquivo, {'Tabela': None})['Tabela'].rename(columns=alias)
+    df = df.drop_duplicates('ean', keep='last')
+    registros = df.astype(object).where(df.notna(), None).to_dict(orient='records')
+
+    resultados = {}
+    contador = iter(range(repeticoes * 2))
+
+    def carga(operacao):
+        with banco_novo(diretorio, f"suite_{next(contador)}.db") as db:
+            inicio = perf_counter()
+            getattr(db, operacao)('tabela', registros)
+            if operacao == 'bulk_upsert':
+                # Segunda passada: todas as linhas já existem e viram UPDATE
+                inicio = perf_counter()
+                db.bulk_upsert('tabela', registros)
+            return perf_counter() - inicio
+
+    resultados['sqlite.bulk_insert'] = median(carga('bulk_insert') for _ in range(repeticoes))
+    resultados['sqlite.bulk_upsert'] = median(carga('bulk_upsert') for _ in range(repeticoes))
+    return resultados
+
+
+def suite_http(arquivo, linhas, diretorio, repeticoes, requisicoes=20):
+    """Latência mediana por rota; usa a versão publicada pela suíte do conversor (importa se não houver)"""
+    import conversor
+    import microservico
+    import servidor
+
+    if servidor.armazem.versao_atual() is None:
+        conversor.run(arquivo)
+    indice = servidor.carregar_indice(servidor.armazem, servidor.armazem.versao_atual())
+    ean = int(indice.chaves[len(indice) // 2])
+    eans = [int(chave) for chave in indice.chaves[:1000]]
+
+    cliente = servidor.app.test_client()
+    cliente_banco = microservico.app.test_client()
+    rotas = {
+        'servidor.GET /estoque': lambda: cliente.get('/estoque'),
+        'servidor.GET /estoque (arrow)': lambda: cliente.get(
+            '/estoque', headers={'Accept': 'application/vnd.apache.arrow.stream'}),
+        'servidor.GET /tabela?categoria': lambda: cliente.get('/tabela?categoria=MED&limit=500'),
+        'servidor.GET /estoque/<ean>': lambda: cliente.get(f'/estoque/{ean}'),
+        'servidor.POST /estoque/lookup': lambda: cliente.post('/estoque/lookup', json={'eans': eans}),
+        'microservico.GET /banco/estoque': lambda: cliente_banco.get('/banco/estoque?limit=500'),
+        'microservico.GET /banco/estoque/<ean>': lambda: cliente_banco.get(f'/banco/estoque/{ean}'),
+        'microservico.GET /dados-parquet-arrow': lambda: cliente_banco.get('/dados-parquet-arrow'),
+    }
+    resultados = {}
+    for nome, requisicao in rotas.items():
+        resposta = requisicao()
+        if resposta.status_code != 200:
+            raise RuntimeError(f"{nome} respondeu {resposta.status_code}: {resposta.data[:200]}")
+        resultados[f"http.{nome}"] = cronometrar(requisicao, requisicoes)
+    return resultados
+
+
+def executar(arquivo, linhas, diretorio, suites, repeticoes):
+    """
+    Roda as suítes pedidas, na ordem de SUITES (a de HTTP reaproveita a versão
+    publicada pela do conversor). Chamada no subprocesso de cada tamanho.
+
+    Returns:
+        dict: medida: segundos
+    """
+    # Os avisos da importação (EANs repetidos, sem estoque) são esperados aqui
+    logging.getLogger().setLevel(logging.ERROR)
+    funcoes = {'conversor': suite_conversor, 'detector': suite_detector, 'separador': suite_separador,
+               'sqlite': suite_sqlite, 'http': suite_http}
+    resultados = {}
+    for nome in SUITES:
+        if nome in suites:
+            resultados.update(funcoes[nome](arquivo, linhas, diretorio, repeticoes))
+    return resultados
+
+
+def comparar(resultados, baseline, tolerancia):
+    """
+    Compara as medidas presentes nas duas execuções
+
+    Returns:
+        list: Medidas que ficaram mais lentas que a baseline além da tolerância
+    """
+    regressoes = []
+    for chave, atual in sorted(resultados.items()):
+        anterior = baseline.get(chave)
+        if not anterior:
+            continue
+        razao = atual / anterior
+        marca = ''
+        if razao > 1 + tolerancia and atual - anterior > DIFERENCA_MINIMA:
+            marca = '  REGRESSÃO'
+            regressoes.append(chave)
+        print(f"  {chave:<58}{anterior:>10.4f}s -> {atual:>10.4f}s  {razao:>6.2f}x{marca}")
+    return regressoes
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    opcoes = dict(argumento[2:].split('=', 1) for argumento in sys.argv[1:] if argumento.startswith('--'))
+    tamanhos = [int(argumento) for argumento in sys.argv[1:] if not argumento.startswith('--')] or [10_000]
+    suites = opcoes.get('suites', ','.join(SUITES)).split(',')
+    repeticoes = int(opcoes.get('repeticoes', 3))
+    tolerancia = float(opcoes.get('tolerancia', TOLERANCIA))
+    saida = opcoes.get('saida', f"benchmark_{datetime.now():%Y%m%d-%H%M%S}.json")
+    desconhecidas = set(suites) - set(SUITES)
+    if desconhecidas:
+        sys.exit(f"Suítes desconhecidas: {sorted(desconhecidas)}; disponíveis: {SUITES}")
+
+    resultados = {}
+    for linhas in tamanhos:
+        arquivo = planilha_em_cache(opcoes.get('cache', CACHE_PLANILHAS), linhas)
+        print(f"Planilha com {linhas} linhas por aba: {arquivo}")
+        # Os módulos leem o diretório de dados e o banco na importação, então
+        # cada tamanho roda em um subprocesso com o ambiente próprio
+        with tempfile.TemporaryDirectory() as diretorio:
+            ambiente = dict(os.environ, RESTOQUE_DADOS=os.path.join(diretorio, 'dados'),
+                            RESTOQUE_BANCO=os.path.join(diretorio, 'restoque.db'))
+            ambiente.pop('RESTOQUE_ESQUEMAS', None)
+            codigo = ("import json, sys; from benchmarks import suite; "
+                      "print(json.dumps(suite.executar(*json.loads(sys.argv[1]))))")
+            processo = subprocess.run(
+                [sys.executable, '-c', codigo, json.dumps([arquivo, linhas, diretorio, suites, repeticoes])],
+                env=ambiente, capture_output=True, text=True)
+            if processo.returncode != 0:
+                sys.exit(f"A suíte falhou com {linhas} linhas:\n{processo.stderr[-4000:]}")
+            medidas = json.loads(processo.stdout.strip().splitlines()[-1])
+        for chave, segundos in medidas.items():
+            resultados[f"{chave}[{linhas}]"] = round(segundos, 6)
+            print(f"  {chave:<50}{segundos:>10.4f}s")
+
+    with open(saida, 'w', encoding='utf-8') as arquivo_saida:
+        json.dump({
+            'executado_em': datetime.now().isoformat(),
+            'commit': _commit(),
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'cpus': os.cpu_count(),
+            'repeticoes': repeticoes,
+            'resultados': resultados,
+        }, arquivo_saida, ensure_ascii=False, indent=2)
+    print(f"Resultados gravados em {saida}")
+
+    if 'baseline' in opcoes:
+        with open(opcoes['baseline'], encoding='utf-8') as arquivo_baseline:
+            baseline = json.load(arquivo_baseline)
+        print(f"Comparação com {opcoes['baseline']} (commit {baseline.get('commit')}, tolerância {tolerancia:.0%}):")
+        regressoes = comparar(resultados, baseline['resultados'], tolerancia)
+        if regressoes:
+            sys.exit(f"FALHOU: {len(regressoes)} medidas mais lentas que a baseline: {regressoes}")
+        print("OK: nenhuma regressão")
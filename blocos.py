@@ -0,0 +1,607 @@
+import hashlib
+import logging
+import os
+import shutil
+import sys
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+import mudancas
+from conversor import (BANCO_SQLITE, COLUNAS_LEITURA, LIMITES_INT32, ORDENACAO, PARTICOES, SEM_PARTICAO,
+                       TAMANHO_ROW_GROUP, TIPO_EAN, TIPO_INTEIRO, _nomes_particoes, atualizar_banco, compactar_tipos,
+                       dicionarios_por_row_group, etapa, tipos_compactos, validar_dataframe)
+from esquemas import registro_esquemas
+from indice_ean import IndiceEAN, gravar_indice
+from juncao import DiagnosticoJuncao, estoques_numericos
+from metricas import tamanho_arquivos
+from leitor import ler_aba_em_blocos
+from snapshots import armazem
+
+# Pico de memória (RSS) do processo durante a importação em blocos
+ORCAMENTO_MEMORIA_MB = int(os.environ.get('RESTOQUE_MEMORIA_MB', 512))
+
+# Estimativas usadas no tamanho dos blocos, medidas com planilhas no layout
+# real (benchmarks/memoria.py), com folga.
+# Memória por linha de um bloco em processamento: valores lidos pelo openpyxl,
+# listas por coluna, tabela Arrow, DataFrame e hashes
+BYTES_POR_LINHA_BLOCO = 1024
+# Memória por linha da planilha que fica retida até o fim (posição, EAN e hash
+# de cada linha, EAN e estoque para o mapa, grupo e hash da linha inteira para
+# a ordenação) somada às cópias feitas no cálculo do delta
+BYTES_RETIDOS_POR_LINHA = 112
+# Independente do tamanho do bloco e da planilha: buffers do ParquetWriter e
+# memória que o pool do Arrow mantém depois de liberada
+MEMORIA_FIXA_MB = 48
+# Sem a dimensão das abas no XML (comum em planilhas geradas por sistemas), as
+# linhas são estimadas pelo tamanho do arquivo compactado
+BYTES_ARQUIVO_POR_LINHA = 48
+TAMANHO_BLOCO_MIN = 1000
+TAMANHO_BLOCO_MAX = 200000
+
+# Parquet de cada aba na ordem da planilha, regravado ordenado no fim da importação
+ARQUIVO_BLOCOS = '{}.blocos.parquet'
+
+OBRIGATORIAS = {
+    'Tabela': ['EAN'],
+    'Estoque': ['EAN', 'Estoque Disponivel'],
+}
+
+
+def memoria_residente() -> int:
+    """RSS atual do processo em bytes (no Linux; em outros sistemas, o pico até agora)"""
+    try:
+        with open('/proc/self/statm') as arquivo:
+            return int(arquivo.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return pico if sys.platform == 'darwin' else pico * 1024
+
+
+def linhas_estimadas(arquivo, workbook) -> int:
+    """Linhas das abas lidas, pela dimensão gravada no XML ou, sem ela, pelo tamanho do arquivo"""
+    dimensoes = [workbook[aba].max_row for aba in COLUNAS_LEITURA]
+    if all(dimensoes):
+        return sum(dimensoes)
+    if isinstance(arquivo, (str, os.PathLike)):
+        tamanho = os.path.getsize(arquivo)
+    else:
+        tamanho = arquivo.seek(0, os.SEEK_END)
+    return tamanho // BYTES_ARQUIVO_POR_LINHA
+
+
+def tamanho_bloco(orcamento_mb: int, linhas_estimadas: int) -> int:
+    """
+    Linhas por bloco para o pico de memória caber no orçamento, descontando o
+    que o processo já ocupa (inclusive o workbook aberto), a parte fixa e o
+    que fica retido por linha
+    """
+    disponivel = ((orcamento_mb - MEMORIA_FIXA_MB) * 1024 * 1024 - memoria_residente()
+                  - linhas_estimadas * BYTES_RETIDOS_POR_LINHA)
+    tamanho = disponivel // BYTES_POR_LINHA_BLOCO
+    if tamanho < TAMANHO_BLOCO_MIN:
+        logging.warning(f"Orçamento de {orcamento_mb} MB insuficiente para {linhas_estimadas} linhas; "
+                        f"usando blocos de {TAMANHO_BLOCO_MIN} linhas.")
+    return int(min(TAMANHO_BLOCO_MAX, max(TAMANHO_BLOCO_MIN, tamanho)))
+
+
+def _alargar_tipos(df, tipos):
+    """
+    Tipos compactos sem os inteiros que não cabem nos valores deste bloco
+    (int32 estourado, ou EAN uint64 com valor negativo); essas colunas ficam
+    como int64, o tipo em que foram lidas
+    """
+    alargados = dict(tipos)
+    for nome, tipo in tipos.items():
+        if tipo not in (TIPO_INTEIRO, TIPO_EAN):
+            continue
+        minimo, maximo = df[nome].min(), df[nome].max()
+        if pd.isna(minimo):
+            continue
+        limites = LIMITES_INT32 if tipo == TIPO_INTEIRO else np.iinfo(np.uint64)
+        if minimo < limites.min or maximo > limites.max:
+            logging.info(f"Coluna '{nome}' não cabe em {tipo}; gravada como int64")
+            del alargados[nome]
+    return alargados
+
+
+def _juntar_segmentos(segmentos, destino, esquema):
+    """Regrava os segmentos, em ordem, como um único parquet com o esquema alargado"""
+    with pq.ParquetWriter(destino, esquema, compression='snappy') as writer:
+        for segmento in segmentos:
+            arquivo = pq.ParquetFile(segmento)
+            for i in range(arquivo.num_row_groups):
+                writer.write_table(arquivo.read_row_group(i).cast(esquema), row_group_size=TAMANHO_ROW_GROUP)
+            arquivo.close()
+            os.remove(segmento)
+
+
+def _gravar_aba(planilha, destino, tamanho, esquemas, ao_ler=None):
+    """
+    Lê a aba em blocos e grava cada bloco, com os tipos compactados (veja
+    conversor.tipos_compactos), como row groups do parquet `destino`
+
+    Args:
+        planilha: Aba do openpyxl (ReadOnlyWorksheet)
+        destino (str): Caminho do parquet
+        tamanho (int): Linhas por bloco
+        esquemas (dict): Recebe aba: esquema registrado
+        ao_ler (callable): Chamado com o DataFrame de cada bloco antes da gravação
+            (pode alterá-lo)
+
+    Returns:
+        dict: {'linhas', 'posicoes', 'chaves', 'hashes'} com a posição, o EAN e o
+        hash de cada linha com EAN numérico, para o delta, e {'linhas_todas',
+        'tipos'} com o hash de todas as linhas e os dtypes, para o hash das partições
+    """
+    aba = planilha.title
+    writer = None
+    tipos = None
+    linhas = 0
+    posicoes, chaves, hashes, hashes_todas = [], [], [], []
+    # Partes do parquet gravadas antes de algum inteiro ser alargado para int64
+    segmentos = []
+    try:
+        for tabela in ler_aba_em_blocos(planilha, COLUNAS_LEITURA[aba], tamanho, registro_esquemas, esquemas):
+            df = tabela.to_pandas(types_mapper=pd.ArrowDtype)
+            if writer is None:
+                validar_dataframe(df, OBRIGATORIAS[aba], aba)
+            if ao_ler is not None:
+                ao_ler(df)
+            # Os tipos compactos são escolhidos no primeiro bloco; um bloco
+            # seguinte com inteiros fora da faixa alarga a coluna para int64
+            if tipos is None:
+                tipos = tipos_compactos(df, esquemas.get(aba))
+            alargados = _alargar_tipos(df, tipos)
+            if alargados != tipos:
+                tipos = alargados
+                if writer is not None:
+                    writer.close()
+                    writer = None
+                    segmentos.append(f"{destino}.{len(segmentos)}")
+                    os.replace(destino, segmentos[-1])
+            df = compactar_tipos(df, tipos)
+
+            validas = mudancas.com_chave_inteira(df)
+            posicoes.append(linhas + validas.index.to_numpy(dtype=np.int64))
+            chaves.append(validas[mudancas.CHAVE].to_numpy())
+            hashes.append(mudancas.hashes_linhas(validas))
+            hashes_todas.append(mudancas.hashes_linhas(df))
+
+            bloco = pa.Table.from_pandas(df, preserve_index=False)
+            if writer is None:
+                # As categorias mudam de bloco para bloco: os índices dos dicionários ficam em int32
+                esquema = pa.schema([
+                    campo.with_type(pa.dictionary(pa.int32(), campo.type.value_type))
+                    if pa.types.is_dictionary(campo.type) else campo for campo in bloco.schema
+                ], metadata=bloco.schema.metadata)
+                writer = pq.ParquetWriter(destino, esquema, compression='snappy')
+            writer.write_table(dicionarios_por_row_group(bloco.cast(writer.schema)),
+                               row_group_size=TAMANHO_ROW_GROUP)
+            linhas += len(df)
+            logging.info(f"Aba '{aba}': {linhas} linhas gravadas...")
+    finally:
+        if writer is not None:
+            writer.close()
+    if segmentos:
+        segmentos.append(f"{destino}.{len(segmentos)}")
+        os.replace(destino, segmentos[-1])
+        _juntar_segmentos(segmentos, destino, writer.schema)
+    return {
+        'linhas': linhas,
+        'posicoes': np.concatenate(posicoes),
+        'chaves': np.concatenate(chaves),
+        'hashes': np.concatenate(hashes),
+        'linhas_todas': np.concatenate(hashes_todas) if hashes_todas else np.array([], dtype=np.uint64),
+        'tipos': str(df.dtypes.astype(str).to_dict()).encode('utf-8') if linhas else b'',
+    }
+
+
+def _ler_blocos(caminho, tamanho):
+    """
+    DataFrames (dtypes Arrow) com os row groups de um parquet, `tamanho` linhas
+    por vez; um parquet particionado é lido partição a partição, na ordem dos nomes
+    """
+    arquivos = [caminho]
+    if os.path.isdir(caminho):
+        arquivos = [os.path.join(caminho, nome) for nome in sorted(os.listdir(caminho)) if nome.endswith('.parquet')]
+    for arquivo in arquivos:
+        for lote in pq.ParquetFile(arquivo).iter_batches(batch_size=tamanho):
+            yield pa.Table.from_batches([lote]).to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def _gravar_mudancas(caminho_aba, resumo, anteriores, destino, tamanho):
+    """
+    Grava o delta da aba em relação aos hashes da versão anterior, como em
+    mudancas.calcular_mudancas, relendo do parquet só as linhas alteradas
+
+    Returns:
+        tuple: (hashes por chave, contagem de operações ou None sem versão anterior)
+    """
+    ultimas = mudancas.ultimas_ocorrencias(resumo['chaves'])
+    chaves = resumo['chaves'][ultimas]
+    hashes = pd.Series(resumo['hashes'][ultimas], index=pd.Index(chaves, name=mudancas.CHAVE))
+    if anteriores is None:
+        return hashes, None
+
+    existiam = hashes.index.isin(anteriores.index)
+    alteradas = existiam & (hashes.to_numpy() != anteriores.reindex(hashes.index).to_numpy())
+    removidas = anteriores.index[~anteriores.index.isin(hashes.index)].to_numpy(dtype=np.int64)
+
+    selecionadas = ~existiam | alteradas
+    posicoes = resumo['posicoes'][ultimas][selecionadas]
+    ordem = np.argsort(posicoes, kind='stable')
+    posicoes = posicoes[ordem]
+    chaves_selecionadas = chaves[selecionadas][ordem]
+    operacoes = np.where(existiam[selecionadas], mudancas.ATUALIZACAO, mudancas.INSERCAO)[ordem]
+
+    # Mesmo esquema do delta gravado pelo conversor: 'operacao' seguida das colunas da aba
+    vazio = pq.read_schema(caminho_aba).empty_table().to_pandas(types_mapper=pd.ArrowDtype)
+    vazio = vazio.assign(**{mudancas.CHAVE: vazio[mudancas.CHAVE].astype(np.int64)})
+    esquema = pa.Schema.from_pandas(vazio, preserve_index=False).insert(0, pa.field('operacao', pa.string()))
+    colunas = ['operacao'] + list(vazio.columns)
+
+    with pq.ParquetWriter(destino, esquema, compression='snappy') as writer:
+        inicio = 0
+        for df in _ler_blocos(caminho_aba, tamanho):
+            fim = inicio + len(df)
+            de, ate = np.searchsorted(posicoes, [inicio, fim])
+            if ate > de:
+                alteradas_bloco = df.iloc[posicoes[de:ate] - inicio].assign(**{
+                    mudancas.CHAVE: chaves_selecionadas[de:ate],
+                    'operacao': operacoes[de:ate],
+                })[colunas]
+                writer.write_table(pa.Table.from_pandas(alteradas_bloco, schema=esquema, preserve_index=False))
+            inicio = fim
+
+        # Remoções levam só a chave; as demais colunas ficam nulas, com os mesmos tipos
+        for de in range(0, len(removidas), tamanho):
+            remocoes = vazio.reindex(pd.RangeIndex(len(removidas[de:de + tamanho])))
+            remocoes[mudancas.CHAVE] = removidas[de:de + tamanho]
+            remocoes['operacao'] = mudancas.REMOCAO
+            writer.write_table(pa.Table.from_pandas(remocoes[colunas], schema=esquema, preserve_index=False))
+
+    contagem = {
+        mudancas.INSERCAO: int((~existiam).sum()),
+        mudancas.ATUALIZACAO: int(alteradas.sum()),
+        mudancas.REMOCAO: len(removidas),
+    }
+    return hashes, contagem
+
+
+def _postos(valores: pa.ChunkedArray) -> np.ndarray:
+    """
+    Posto denso de cada valor (nulos por último); colunas de dicionário são
+    ordenadas pelos valores do dicionário, sem decodificar os textos
+    """
+    if not pa.types.is_dictionary(valores.type):
+        return pc.rank(valores.combine_chunks(), sort_keys='ascending', null_placement='at_end',
+                       tiebreaker='dense').to_numpy().astype(np.uint32)
+    valores = valores.unify_dictionaries()
+    if not valores.num_chunks:
+        return np.array([], dtype=np.uint32)
+    dicionario = valores.chunk(0).dictionary
+    postos_dicionario = np.append(pc.rank(dicionario, sort_keys='ascending', tiebreaker='dense').to_numpy(),
+                                  len(dicionario) + 1).astype(np.uint32)
+    # Índice nulo aponta para o último posto
+    return np.concatenate([
+        postos_dicionario[pc.fill_null(parte.indices, len(dicionario)).to_numpy()] for parte in valores.chunks
+    ])
+
+
+def _ordem_linhas(origem, chaves, particao):
+    """
+    Posição de origem das linhas na ordem final e partição de cada posição
+
+    A ordem é calculada só com as colunas das chaves, lidas uma por vez: cada
+    chave vira o posto denso do valor (nulos por último, como no sort_values
+    do pandas) e as linhas são ordenadas com np.lexsort, que é estável. A
+    partição (o nome do arquivo, veja conversor._nomes_particoes) vem antes
+    das chaves, como em conversor.gravar_particionado.
+
+    Returns:
+        tuple: (posições de origem em ordem, código da partição de cada posição
+        da ordem ou None sem partição, nomes das partições por código)
+    """
+    # Uma coluna por vez, para só os postos (uint32) ficarem em memória
+    postos = []
+    for coluna in reversed(chaves):
+        postos.append(_postos(pq.read_table(origem, columns=[coluna]).column(0)))
+
+    codigos, nomes = None, []
+    if particao:
+        valores = pq.read_table(origem, columns=[particao]).column(0)
+        codigos, unicos = pd.factorize(pd.Series(valores.to_numpy()))
+        del valores
+        nomes_unicos = _nomes_particoes(pd.Series(unicos)).tolist()
+        nomes = sorted(set(nomes_unicos) | ({SEM_PARTICAO} if (codigos < 0).any() else set()))
+        # O código -1 (valor nulo) pega o último elemento do mapa
+        mapa = np.array([nomes.index(nome) for nome in nomes_unicos] + [nomes.index(SEM_PARTICAO)
+                        if SEM_PARTICAO in nomes else -1], dtype=np.int32)
+        codigos = mapa[codigos]
+        postos.append(codigos)
+
+    ordem = np.lexsort(postos) if postos else np.arange(0)
+    return ordem, None if codigos is None else codigos[ordem], nomes
+
+
+def _ler_linhas(arquivo, linhas):
+    """Linhas (posições de origem) do parquet, na ordem pedida, lendo só os row groups que as contêm"""
+    ordem = np.argsort(linhas, kind='stable')
+    crescentes = linhas[ordem]
+    partes = []
+    inicio = 0
+    for i in range(arquivo.num_row_groups):
+        fim = inicio + arquivo.metadata.row_group(i).num_rows
+        de, ate = np.searchsorted(crescentes, [inicio, fim])
+        if ate > de:
+            partes.append(arquivo.read_row_group(i).take(crescentes[de:ate] - inicio))
+        inicio = fim
+    tabela = pa.concat_tables(partes) if partes else arquivo.schema_arrow.empty_table()
+    # Volta da ordem do arquivo para a ordem pedida
+    inversa = np.empty_like(ordem)
+    inversa[ordem] = np.arange(len(ordem))
+    return tabela.take(inversa)
+
+
+def _ordenar_aba(origem, destino, nome, resumo, tamanho, anterior=None):
+    """
+    Regrava o parquet gravado em blocos na ordem de conversor.ORDENACAO e, se
+    o arquivo é particionado (conversor.PARTICOES), como um diretório com um
+    parquet por partição, com o mesmo hash de conteúdo de
+    conversor.gravar_particionado (partições iguais às da versão anterior
+    são ligadas por hardlink).
+
+    A ordem das linhas é calculada só com as colunas das chaves (veja
+    _ordem_linhas); o destino é gravado em passadas de `tamanho` linhas, cada
+    uma lendo da origem apenas os row groups com as linhas da passada.
+
+    Args:
+        origem (str): Parquet gravado por _gravar_aba, removido no final
+        destino (str): Caminho do parquet ordenado
+        nome (str): Nome do parquet, para achar a ordenação e a partição
+        resumo (dict): Resumo de _gravar_aba, com os hashes das linhas
+        tamanho (int): Linhas por passada
+        anterior (tuple): (diretório, hashes das partições) da versão anterior
+
+    Returns:
+        tuple: (dict arquivo: hash do conteúdo, quantidade de partições reaproveitadas);
+        o dict fica vazio se o arquivo não é particionado
+    """
+    # Devolve ao sistema o que o pool do Arrow reteve das etapas anteriores
+    pa.default_memory_pool().release_unused()
+    arquivo = pq.ParquetFile(origem)
+    esquema = arquivo.schema_arrow
+    chaves = [coluna for coluna in ORDENACAO.get(nome, []) if coluna in esquema.names]
+    particao = PARTICOES.get(nome)
+    if particao not in esquema.names:
+        particao = None
+    if not chaves and particao is None:
+        arquivo.close()
+        os.replace(origem, destino)
+        return {}, 0
+
+    ordem, codigos, nomes = _ordem_linhas(origem, chaves, particao)
+    # Trechos [inicio, fim) da ordem gravados em cada arquivo de destino
+    if particao is None:
+        trechos = [(destino, 0, len(ordem))]
+    else:
+        os.makedirs(destino)
+        limites = np.searchsorted(codigos, np.arange(len(nomes) + 1))
+        trechos = [(os.path.join(destino, f"{nomes[codigo]}.parquet"), limites[codigo], limites[codigo + 1])
+                   for codigo in range(len(nomes))]
+        if not trechos:
+            trechos = [(os.path.join(destino, f"{SEM_PARTICAO}.parquet"), 0, 0)]
+
+    diretorio_anterior, hashes_anteriores = anterior or (None, {})
+    particoes = {}
+    reaproveitadas = 0
+    pendentes = []
+    for caminho, inicio, fim in trechos:
+        if particao is None:
+            pendentes.append((caminho, inicio, fim))
+            continue
+        arquivo_particao = os.path.basename(caminho)
+        conteudo = hashlib.sha256(resumo['tipos'] + resumo['linhas_todas'][ordem[inicio:fim]].tobytes()).hexdigest()
+        particoes[arquivo_particao] = conteudo
+        if diretorio_anterior is not None and hashes_anteriores.get(arquivo_particao) == conteudo:
+            try:
+                os.link(os.path.join(diretorio_anterior, arquivo_particao), caminho)
+            except OSError:
+                shutil.copyfile(os.path.join(diretorio_anterior, arquivo_particao), caminho)
+            reaproveitadas += 1
+        else:
+            pendentes.append((caminho, inicio, fim))
+
+    writer = None
+    try:
+        # Cada passada lê até `tamanho` linhas dos trechos pendentes, que são
+        # gravados na ordem; um trecho maior que a passada continua na seguinte
+        while pendentes:
+            pa.default_memory_pool().release_unused()
+            passada = []
+            restante = tamanho
+            while pendentes and restante:
+                caminho, inicio, fim = pendentes[0]
+                ate = min(fim, inicio + restante)
+                passada.append((caminho, inicio, ate, ate == fim))
+                restante -= ate - inicio
+                if ate == fim:
+                    pendentes.pop(0)
+                else:
+                    pendentes[0] = (caminho, ate, fim)
+            tabela = _ler_linhas(arquivo, np.concatenate([ordem[inicio:ate] for _, inicio, ate, _ in passada]))
+            deslocamento = 0
+            for caminho, inicio, ate, ultimo in passada:
+                if writer is None:
+                    writer = pq.ParquetWriter(caminho, esquema, compression='snappy')
+                trecho = tabela.slice(deslocamento, ate - inicio)
+                deslocamento += ate - inicio
+                writer.write_table(dicionarios_por_row_group(trecho), row_group_size=TAMANHO_ROW_GROUP)
+                if ultimo:
+                    writer.close()
+                    writer = None
+            del tabela
+    finally:
+        if writer is not None:
+            writer.close()
+        arquivo.close()
+    os.remove(origem)
+    return particoes, reaproveitadas
+
+
+def run_blocos(arquivo, tempos=None, orcamento_mb: int = None, origem=None):
+    """
+    Importa a planilha em blocos, com o pico de memória limitado por `orcamento_mb`
+
+    Mesmo resultado de conversor.run sem carregar as abas inteiras: cada aba é
+    lida em blocos de tamanho fixo, gravada como row groups de um único parquet
+    (com ParquetWriter) e descartada. O estoque é lido primeiro e vira o índice
+    de EAN da versão, que faz o papel do mapa EAN -> estoque na junção de cada
+    bloco da tabela. Ficam em memória só arrays compactos por linha (posição,
+    EAN e hash), usados para o delta, que é gravado relendo apenas as linhas
+    alteradas do parquet.
+
+    Por fim os parquets são regravados na ordenação e nas partições do
+    conversor.run (veja _ordenar_aba), em passadas de um bloco de linhas; as
+    partições iguais às da versão anterior são reaproveitadas.
+
+    Args:
+        arquivo: Caminho ou objeto arquivo do Excel
+        tempos (dict): Dicionário que recebe a duração de cada etapa (opcional)
+        orcamento_mb (int): Pico de memória desejado em MB (padrão: ORCAMENTO_MEMORIA_MB)
+        origem (dict): Identificação do arquivo, gravada no manifesto (veja conversor.run)
+
+    Returns:
+        dict: Duração de cada etapa em segundos
+    """
+    if tempos is None:
+        tempos = {}
+    orcamento_mb = orcamento_mb or ORCAMENTO_MEMORIA_MB
+    try:
+        workbook = openpyxl.load_workbook(arquivo, read_only=True, data_only=True)
+        try:
+            for aba in COLUNAS_LEITURA:
+                if aba not in workbook.sheetnames:
+                    raise ValueError(f"Aba '{aba}' não encontrada na planilha.")
+            tamanho = tamanho_bloco(orcamento_mb, linhas_estimadas(arquivo, workbook))
+            logging.info(f"Importando em blocos de {tamanho} linhas (orçamento de {orcamento_mb} MB)...")
+
+            esquemas = {}
+            resumos = {}
+            with armazem.fixar() as base, armazem.nova_versao() as versao:
+                with etapa('estoque', tempos) as medida:
+                    diagnostico = DiagnosticoJuncao()
+                    blocos_ean, blocos_estoque = [], []
+
+                    def coletar_estoque(df):
+                        chaves, validos = diagnostico.chaves('Estoque', df['EAN'])
+                        blocos_ean.append(chaves[validos])
+                        blocos_estoque.append(estoques_numericos(df['Estoque Disponivel'])[validos])
+
+                    resumos['Estoque'] = _gravar_aba(workbook['Estoque'],
+                                                     versao.caminho(ARQUIVO_BLOCOS.format('estoque')),
+                                                     tamanho, esquemas, coletar_estoque)
+                    eans, estoques = np.concatenate(blocos_ean), np.concatenate(blocos_estoque)
+                    del blocos_ean[:], blocos_estoque[:]
+                    diagnostico.registrar_duplicados(eans, estoques)
+                    logging.info("Gravando índice de EAN para estoque...")
+                    gravar_indice(eans, estoques, versao)
+                    del eans, estoques
+                    indice = IndiceEAN(versao.diretorio)
+                    medida.contar(linhas=resumos['Estoque']['linhas'],
+                                  tamanho=tamanho_arquivos(versao.caminho(ARQUIVO_BLOCOS.format('estoque'))))
+
+                with etapa('tabela', tempos) as medida:
+                    def mapear_bloco(df):
+                        chaves, validos = diagnostico.chaves('Tabela', df['EAN'])
+                        valores, encontrados = indice.buscar_lote(chaves)
+                        encontrados &= validos
+                        diagnostico.registrar_busca(chaves, validos, encontrados)
+                        df['Estoque'] = np.where(encontrados, valores, 0)
+
+                    resumos['Tabela'] = _gravar_aba(workbook['Tabela'],
+                                                    versao.caminho(ARQUIVO_BLOCOS.format('tabela')),
+                                                    tamanho, esquemas, mapear_bloco)
+                    medida.contar(linhas=resumos['Tabela']['linhas'],
+                                  tamanho=tamanho_arquivos(versao.caminho(ARQUIVO_BLOCOS.format('tabela'))))
+
+                with etapa('mudancas', tempos) as medida:
+                    logging.info(f"Calculando mudanças em relação à versão {base}...")
+                    medida.contar(linhas=resumos['Estoque']['linhas'] + resumos['Tabela']['linhas'])
+                    contagens = {}
+                    for nome, aba in mudancas.ABAS.items():
+                        anteriores = None
+                        if base is not None:
+                            anteriores = mudancas.ler_hashes(armazem.caminho(base, mudancas.ARQUIVO_HASHES.format(nome)))
+                        hashes, contagem = _gravar_mudancas(
+                            versao.caminho(ARQUIVO_BLOCOS.format(nome)), resumos[aba], anteriores,
+                            versao.caminho(mudancas.ARQUIVO_MUDANCAS.format(nome)), tamanho)
+                        mudancas.gravar_hashes(hashes, versao.caminho(mudancas.ARQUIVO_HASHES.format(nome)))
+                        if contagem is not None:
+                            contagens[nome] = contagem
+                            logging.info(f"Aba '{aba}': {contagem}")
+                    # A ordenação só precisa dos hashes das linhas inteiras e dos dtypes
+                    for resumo in resumos.values():
+                        del resumo['posicoes'], resumo['chaves'], resumo['hashes']
+
+                with etapa('ordenacao', tempos) as medida:
+                    logging.info("Ordenando e particionando os parquets...")
+                    medida.contar(linhas=resumos['Estoque']['linhas'] + resumos['Tabela']['linhas'])
+                    manifesto_base = armazem.manifesto(base) if base is not None else {}
+                    particoes = {}
+                    for nome, aba in mudancas.ABAS.items():
+                        arquivo_parquet = f"{nome}.parquet"
+                        anterior = None
+                        if base is not None and arquivo_parquet in PARTICOES:
+                            anterior = (armazem.caminho(base, arquivo_parquet),
+                                        manifesto_base.get('particoes', {}).get(arquivo_parquet, {}))
+                        gravadas, reaproveitadas = _ordenar_aba(
+                            versao.caminho(ARQUIVO_BLOCOS.format(nome)), versao.caminho(arquivo_parquet),
+                            arquivo_parquet, resumos[aba], tamanho, anterior)
+                        if gravadas:
+                            particoes[arquivo_parquet] = gravadas
+                            logging.info(f"{arquivo_parquet}: {len(gravadas)} partições, "
+                                         f"{reaproveitadas} reaproveitadas")
+                    resumos.clear()
+
+                versao.metadados.update({'base': base, 'particoes': particoes, 'mudancas': contagens,
+                                         'juncao': diagnostico.registrar_log(), 'origem': origem,
+                                         'blocos': {'tamanho': tamanho, 'orcamento_mb': orcamento_mb}})
+        finally:
+            workbook.close()
+
+        if BANCO_SQLITE:
+            with etapa('banco', tempos) as medida, armazem.fixar(versao.versao):
+                blocos = {aba: _ler_blocos(armazem.caminho(versao.versao, f"{nome}.parquet"), tamanho)
+                          for nome, aba in mudancas.ABAS.items()}
+                deltas = {nome: _ler_blocos(armazem.caminho(versao.versao, mudancas.ARQUIVO_MUDANCAS.format(nome)),
+                                            tamanho) if nome in contagens else None
+                          for nome in mudancas.ABAS}
+                medida.contar(linhas=atualizar_banco(blocos, esquemas, deltas, versao.versao, base))
+
+        logging.info(f"Processamento em blocos concluído! Versão {versao.versao} publicada. Tempos: {tempos}")
+        return tempos
+    except FileNotFoundError as e:
+        logging.error(f"Arquivo não encontrado: {e.filename}")
+        raise
+    except ValueError as e:
+        logging.error(f"Erro de valor: {e}")
+        raise
+    except TypeError as e:
+        logging.error(f"Erro de tipo: {e}")
+        raise
+    except Exception as e:
+        logging.error(f"Erro inesperado: {e}", exc_info=True)
+        raise
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit("Uso: python blocos.py <arquivo.xlsx> [orcamento_mb]")
+    run_blocos(sys.argv[1], orcamento_mb=int(sys.argv[2]) if len(sys.argv) > 2 else None)
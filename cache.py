@@ -0,0 +1,88 @@
+import threading
+from collections import OrderedDict
+
+import pyarrow.parquet as pq
+
+
+class EntradaCache:
+    def __init__(self, tabela, json: bytes):
+        """
+        Tabela Arrow decodificada e o JSON já serializado de um parquet
+        """
+        self.tabela = tabela
+        self.json = json
+        self.tamanho = tabela.nbytes + len(json)
+
+
+class CacheTabelas:
+    def __init__(self, serializar, max_bytes: int = 256 * 1024 * 1024):
+        """
+        Cache em memória dos parquets publicados, com descarte LRU
+
+        As versões do armazém de snapshots são imutáveis, então a chave
+        (nome do arquivo, versão) identifica o conteúdo sem precisar olhar o disco.
+
+        Args:
+            serializar (callable): Função que recebe a tabela Arrow e retorna o JSON em bytes
+            max_bytes (int): Limite de memória ocupada pelas entradas
+        """
+        self.serializar = serializar
+        self.max_bytes = max_bytes
+        self.entradas = OrderedDict()
+        self.bytes = 0
+        self.acertos = 0
+        self.falhas = 0
+        self.descartes = 0
+        self.lock = threading.Lock()
+
+    def obter(self, caminho: str, versao: int) -> EntradaCache:
+        """
+        Retorna a entrada do parquet, lendo e serializando apenas na primeira vez
+
+        Args:
+            caminho (str): Caminho do parquet dentro da versão
+            versao (int): Versão publicada a que o arquivo pertence
+        """
+        chave = (caminho, versao)
+        with self.lock:
+            entrada = self.entradas.get(chave)
+            if entrada is not None:
+                self.entradas.move_to_end(chave)
+                self.acertos += 1
+                return entrada
+            self.falhas += 1
+
+        tabela = pq.read_table(caminho)
+        entrada = EntradaCache(tabela, self.serializar(tabela))
+
+        with self.lock:
+            if chave not in self.entradas and entrada.tamanho <= self.max_bytes:
+                self.entradas[chave] = entrada
+                self.bytes += entrada.tamanho
+                self._descartar_excesso()
+        return entrada
+
+    def invalidar(self, *args) -> None:
+        """Remove todas as entradas (chamado quando uma nova versão é publicada)"""
+        with self.lock:
+            self.descartes += len(self.entradas)
+            self.entradas.clear()
+            self.bytes = 0
+
+    def estatisticas(self) -> dict:
+        """Contadores de acertos, falhas e ocupação do cache"""
+        with self.lock:
+            return {
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'descartes': self.descartes,
+                'entradas': len(self.entradas),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    def _descartar_excesso(self):
+        while self.bytes > self.max_bytes and self.entradas:
+            _, antiga = self.entradas.popitem(last=False)
+            self.bytes -= antiga.tamanho
+            self.descartes += 1
@@ -0,0 +1,193 @@
+"""
+Cache em disco dos resultados do detector, endereçado pelo conteúdo.
+
+Duas granularidades, cada uma em um arquivo JSON cujo nome é o SHA-256 da chave:
+- relatório: SHA-256 do arquivo Excel (+ margem de erro) -> relatório completo,
+  devolvido sem nem abrir a planilha;
+- coluna: aba + coluna + hash dos valores da coluna (+ margem de erro) ->
+  tipo detectado, então numa planilha alterada só as colunas que mudaram
+  são classificadas de novo.
+
+O descarte é LRU pela data de modificação dos arquivos (renovada a cada
+acerto) quando o total passa de `max_bytes`. Vários processos podem usar a
+mesma pasta: as gravações são atômicas e a ocupação é recontada no descarte.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import pandas as pd
+
+from snapshots import armazem
+
+TAMANHO_PEDACO = 1024 * 1024
+
+
+def hash_arquivo(arquivo) -> str:
+    """SHA-256 de um caminho ou objeto arquivo (lido do início e rebobinado)"""
+    resumo = hashlib.sha256()
+    if isinstance(arquivo, (str, os.PathLike)):
+        with open(arquivo, 'rb') as origem:
+            for pedaco in iter(lambda: origem.read(TAMANHO_PEDACO), b''):
+                resumo.update(pedaco)
+    else:
+        arquivo.seek(0)
+        for pedaco in iter(lambda: arquivo.read(TAMANHO_PEDACO), b''):
+            resumo.update(pedaco)
+        arquivo.seek(0)
+    return resumo.hexdigest()
+
+
+def hash_coluna(serie: pd.Series) -> str:
+    """
+    SHA-256 dos valores de uma coluna, na ordem, com o dtype. Em colunas
+    object os tipos dos valores também entram, já que o hash do pandas
+    converte valores mistos para texto (1 e '1' teriam o mesmo hash).
+    """
+    resumo = hashlib.sha256(str(serie.dtype).encode('utf-8'))
+    resumo.update(pd.util.hash_pandas_object(serie, index=False).to_numpy().tobytes())
+    if serie.dtype == object:
+        tipos = serie.map(lambda valor: type(valor).__name__)
+        resumo.update(pd.util.hash_pandas_object(tipos, index=False).to_numpy().tobytes())
+    return resumo.hexdigest()
+
+
+class CacheAnalises:
+    def __init__(self, diretorio: str, max_bytes: int = 64 * 1024 * 1024):
+        """
+        Cache em disco dos resultados do detector, com descarte LRU
+
+        Args:
+            diretorio (str): Pasta dos arquivos do cache, criada no primeiro uso
+            max_bytes (int): Limite do espaço ocupado pelos arquivos
+        """
+        self.diretorio = diretorio
+        self.max_bytes = max_bytes
+        self.bytes = None
+        self.entradas = None
+        self.acertos = 0
+        self.falhas = 0
+        self.descartes = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def chave(*partes) -> str:
+        """Chave (hexadecimal) de partes serializáveis em JSON"""
+        return hashlib.sha256(json.dumps(partes, default=str).encode('utf-8')).hexdigest()
+
+    def chave_relatorio(self, arquivo, margem_erro=None, sha256: str = None) -> str:
+        """Chave do relatório de um arquivo; `sha256` evita ler o arquivo se o hash já é conhecido"""
+        return self.chave('relatorio', sha256 or hash_arquivo(arquivo), margem_erro)
+
+    def chave_coluna(self, aba, coluna, serie: pd.Series, margem_erro=None) -> str:
+        """Chave do resultado de uma coluna"""
+        return self.chave('coluna', aba, coluna, hash_coluna(serie), margem_erro)
+
+    def _caminho(self, chave: str) -> str:
+        return os.path.join(self.diretorio, chave[:2], f"{chave}.json")
+
+    def obter(self, chave: str):
+        """Valor gravado com a chave ou None; um acerto renova a entrada no LRU"""
+        caminho = self._caminho(chave)
+        try:
+            with open(caminho, encoding='utf-8') as arquivo:
+                valor = json.load(arquivo)
+            os.utime(caminho)
+        except (FileNotFoundError, ValueError):
+            with self.lock:
+                self.falhas += 1
+            return None
+        with self.lock:
+            self.acertos += 1
+        return valor
+
+    def gravar(self, chave: str, valor) -> None:
+        """Grava o valor (serializável em JSON; escalares do numpy são convertidos)"""
+        caminho = self._caminho(chave)
+        dados = json.dumps(valor, ensure_ascii=False, default=lambda v: v.item()).encode('utf-8')
+        if len(dados) > self.max_bytes:
+            return
+        try:
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            try:
+                anterior = os.path.getsize(caminho)
+            except FileNotFoundError:
+                anterior = None
+            temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temporario, 'wb') as arquivo:
+                arquivo.write(dados)
+            os.replace(temporario, caminho)
+        except OSError as e:
+            logging.error(f"Erro ao gravar no cache de análises: {e}")
+            return
+        with self.lock:
+            if self.bytes is None:
+                self._recontar()
+            elif anterior is None:
+                self.bytes += len(dados)
+                self.entradas += 1
+            else:
+                # Chave regravada: a entrada antiga foi substituída
+                self.bytes += len(dados) - anterior
+            if self.bytes > self.max_bytes:
+                self._descartar_excesso()
+
+    def estatisticas(self) -> dict:
+        """Contadores de acertos, falhas e ocupação do cache (mesmas chaves de CacheTabelas)"""
+        with self.lock:
+            if self.bytes is None:
+                self._recontar()
+            return {
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'descartes': self.descartes,
+                'entradas': self.entradas,
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    def _arquivos(self):
+        """(data de modificação, tamanho, caminho) de cada entrada"""
+        arquivos = []
+        if not os.path.isdir(self.diretorio):
+            return arquivos
+        for subdiretorio in os.scandir(self.diretorio):
+            if not subdiretorio.is_dir():
+                continue
+            for entrada in os.scandir(subdiretorio.path):
+                if entrada.name.endswith('.json'):
+                    try:
+                        informacoes = entrada.stat()
+                    except FileNotFoundError:
+                        continue
+                    arquivos.append((informacoes.st_mtime, informacoes.st_size, entrada.path))
+        return arquivos
+
+    def _recontar(self):
+        arquivos = self._arquivos()
+        self.bytes = sum(tamanho for _, tamanho, _ in arquivos)
+        self.entradas = len(arquivos)
+
+    def _descartar_excesso(self):
+        # Recontado do disco, que pode ter entradas gravadas por outros processos
+        arquivos = sorted(self._arquivos())
+        self.bytes = sum(tamanho for _, tamanho, _ in arquivos)
+        self.entradas = len(arquivos)
+        for _, tamanho, caminho in arquivos:
+            if self.bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(caminho)
+            except FileNotFoundError:
+                pass
+            self.bytes -= tamanho
+            self.entradas -= 1
+            self.descartes += 1
+
+
+cache_analises = CacheAnalises(
+    diretorio=os.environ.get('RESTOQUE_CACHE_ANALISES', os.path.join(armazem.diretorio, 'analises')),
+    max_bytes=int(os.environ.get('RESTOQUE_CACHE_ANALISES_MB', 64)) * 1024 * 1024,
+)
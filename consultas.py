@@ -0,0 +1,270 @@
+import base64
+import binascii
+import json
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from conversor import ORDENACAO
+from main import alias
+
+# Nome da coluna no parquet a partir do nome snake_case usado na URL
+COLUNAS_POR_ALIAS = {nome: coluna for coluna, nome in alias.items()}
+
+# Colunas que aceitam filtro por igualdade, lista (a,b,c) e intervalo (_min/_max)
+FILTROS = ['ean', 'categoria', 'cod_fornecedor', 'cod_produto']
+
+# Coluna de estoque usada por `com_estoque=1` em cada arquivo
+COLUNA_ESTOQUE = {
+    'estoque.parquet': 'Estoque Disponivel',
+    'tabela.parquet': 'Estoque',
+}
+
+PARAMETROS = {'columns', 'limit', 'cursor', 'com_estoque'}
+PARAMETROS.update(FILTROS)
+PARAMETROS.update(f"{nome}_min" for nome in FILTROS)
+PARAMETROS.update(f"{nome}_max" for nome in FILTROS)
+
+
+class ConsultaInvalida(ValueError):
+    """Parâmetro de consulta inválido (resposta 400)"""
+
+
+class Consulta:
+    def __init__(self, colunas=None, filtro=None, limite=None, chaves=None, apos=None, repetidos=0, versao=None):
+        """
+        Projeção, filtro e paginação pedidos na URL
+
+        Args:
+            colunas (list): Colunas projetadas (None para todas)
+            filtro (pc.Expression): Filtro empurrado para o scanner do parquet
+            limite (int): Quantidade máxima de linhas da página
+            chaves (list): Colunas da ordenação do parquet, que o cursor segue
+            apos (list): Valores das chaves na última linha entregue pelo cursor
+            repetidos (int): Linhas com exatamente esses valores já entregues
+            versao (int): Versão fixada pelo cursor, se houver
+        """
+        self.colunas = colunas
+        self.filtro = filtro
+        self.limite = limite
+        self.chaves = chaves or []
+        self.apos = apos
+        self.repetidos = repetidos
+        self.versao = versao
+
+
+def tem_consulta(args) -> bool:
+    """Indica se a requisição usa algum parâmetro de consulta"""
+    return any(nome in PARAMETROS for nome in args)
+
+
+def codificar_cursor(versao: int, chave: list, repetidos: int) -> str:
+    texto = json.dumps({'v': versao, 'k': chave, 'n': repetidos})
+    return base64.urlsafe_b64encode(texto.encode('utf-8')).decode('ascii')
+
+
+def decodificar_cursor(cursor: str):
+    """
+    Returns:
+        tuple: (versao, valores das chaves da última linha entregue, linhas
+            entregues com esses mesmos valores)
+    """
+    try:
+        dados = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        chave = dados['k']
+        if not isinstance(chave, list):
+            raise TypeError(chave)
+        return int(dados['v']), chave, int(dados['n'])
+    except (binascii.Error, ValueError, KeyError, TypeError, UnicodeError):
+        raise ConsultaInvalida("Cursor inválido")
+
+
+def _coluna(nome: str, schema: pa.Schema) -> str:
+    coluna = COLUNAS_POR_ALIAS.get(nome, nome)
+    if coluna not in schema.names:
+        raise ConsultaInvalida(f"Coluna '{nome}' não existe neste arquivo")
+    return coluna
+
+
+def _cabe_no_tipo(valor: int, tipo: pa.DataType) -> bool:
+    """Se o inteiro cabe no tipo inteiro do Arrow (senão não vira escalar do filtro)"""
+    if pa.types.is_signed_integer(tipo):
+        return -2 ** (tipo.bit_width - 1) <= valor < 2 ** (tipo.bit_width - 1)
+    return 0 <= valor < 2 ** tipo.bit_width
+
+
+def _valor(texto: str, tipo: pa.DataType):
+    try:
+        if pa.types.is_integer(tipo):
+            valor = int(texto)
+            if not _cabe_no_tipo(valor, tipo):
+                raise ValueError(texto)
+            return valor
+        if pa.types.is_floating(tipo):
+            return float(texto)
+    except ValueError:
+        raise ConsultaInvalida(f"Valor '{texto}' inválido para o tipo {tipo}")
+    return texto
+
+
+def _inteiro(args, nome: str, minimo: int = 0):
+    texto = args.get(nome)
+    if texto is None:
+        return None
+    try:
+        valor = int(texto)
+    except ValueError:
+        raise ConsultaInvalida(f"Parâmetro '{nome}' deve ser inteiro")
+    if valor < minimo:
+        raise ConsultaInvalida(f"Parâmetro '{nome}' deve ser no mínimo {minimo}")
+    return valor
+
+
+def _a_partir_de(chaves: list, valores: list):
+    """
+    Filtro das linhas cujas chaves vêm na mesma posição ou depois de
+    `valores` na ordenação do parquet (lexicográfica, nulos por último como
+    no sort_values do pandas). Por ser um filtro nas colunas da ordenação, o
+    scanner descarta pelas estatísticas os row groups já entregues.
+    """
+    if len(valores) != len(chaves):
+        raise ConsultaInvalida("Cursor inválido")
+    filtro = None
+    for coluna, valor in reversed(list(zip(chaves, valores))):
+        campo = pc.field(coluna)
+        if valor is None:
+            igual = campo.is_null()
+            filtro = igual if filtro is None else igual & filtro
+        else:
+            igual = campo == valor
+            filtro = (campo > valor) | campo.is_null() | (igual if filtro is None else igual & filtro)
+    return filtro
+
+
+def montar_consulta(args, schema: pa.Schema, nome_arquivo: str) -> Consulta:
+    """
+    Converte os parâmetros da URL em projeção e filtro do pyarrow.dataset
+
+    Args:
+        args: Parâmetros da requisição (request.args)
+        schema (pa.Schema): Schema do parquet consultado
+        nome_arquivo (str): Nome do parquet, para achar a coluna de estoque
+
+    Raises:
+        ConsultaInvalida: Se algum parâmetro for inválido
+    """
+    consulta = Consulta(limite=_inteiro(args, 'limit', minimo=1),
+                        chaves=[coluna for coluna in ORDENACAO.get(nome_arquivo, []) if coluna in schema.names])
+
+    if args.get('columns'):
+        consulta.colunas = [_coluna(nome.strip(), schema) for nome in args['columns'].split(',')]
+
+    condicoes = []
+    for nome in FILTROS:
+        texto = args.get(nome)
+        minimo = args.get(f"{nome}_min")
+        maximo = args.get(f"{nome}_max")
+        if texto is None and minimo is None and maximo is None:
+            continue
+
+        coluna = _coluna(nome, schema)
+        tipo = schema.field(coluna).type
+        campo = pc.field(coluna)
+        if texto is not None:
+            valores = [_valor(v.strip(), tipo) for v in texto.split(',')]
+            condicoes.append(campo == valores[0] if len(valores) == 1 else campo.isin(valores))
+        if minimo is not None:
+            condicoes.append(campo >= _valor(minimo, tipo))
+        if maximo is not None:
+            condicoes.append(campo <= _valor(maximo, tipo))
+
+    if args.get('com_estoque') in ('1', 'true', 'sim'):
+        coluna_estoque = COLUNA_ESTOQUE.get(nome_arquivo)
+        if coluna_estoque is None or coluna_estoque not in schema.names:
+            raise ConsultaInvalida("Filtro 'com_estoque' não se aplica a este arquivo")
+        condicoes.append(pc.field(coluna_estoque) > 0)
+
+    if args.get('cursor'):
+        consulta.versao, consulta.apos, consulta.repetidos = decodificar_cursor(args['cursor'])
+        if consulta.chaves:
+            for coluna, valor in zip(consulta.chaves, consulta.apos):
+                tipo = schema.field(coluna).type
+                if valor is not None and pa.types.is_integer(tipo) and \
+                        (not isinstance(valor, int) or isinstance(valor, bool) or not _cabe_no_tipo(valor, tipo)):
+                    raise ConsultaInvalida("Cursor inválido")
+            condicoes.append(_a_partir_de(consulta.chaves, consulta.apos))
+
+    for condicao in condicoes:
+        consulta.filtro = condicao if consulta.filtro is None else consulta.filtro & condicao
+
+    return consulta
+
+
+def executar(caminho: str, consulta: Consulta):
+    """
+    Lê do parquet apenas as colunas e row groups necessários para a página
+
+    Os filtros são avaliados pelo scanner do pyarrow.dataset, que descarta
+    row groups pelas estatísticas de mínimo/máximo antes de decodificá-los.
+    O cursor continua a partir dos valores das chaves de ORDENACAO na última
+    linha entregue, na ordem em que o conversor grava os parquets; só as
+    linhas com exatamente esses valores (EANs repetidos) são puladas.
+
+    Returns:
+        tuple: (pa.Table com a página, (chave, repetidos) para o próximo
+            cursor ou None se não há mais linhas)
+    """
+    dataset = ds.dataset(caminho, format='parquet')
+    colunas = consulta.colunas
+    if colunas is not None:
+        # As chaves do cursor são lidas mesmo fora da projeção
+        colunas = colunas + [coluna for coluna in consulta.chaves if coluna not in colunas]
+    scanner = dataset.scanner(columns=colunas, filter=consulta.filtro)
+
+    pular = consulta.repetidos
+    restante = consulta.limite
+    lotes = []
+    ha_mais = False
+    for lote in scanner.to_batches():
+        if not lote.num_rows:
+            continue
+        if pular:
+            if pular >= lote.num_rows:
+                pular -= lote.num_rows
+                continue
+            lote = lote.slice(pular)
+            pular = 0
+        if restante is not None:
+            if lote.num_rows > restante:
+                lotes.append(lote.slice(0, restante))
+                ha_mais = True
+                break
+            restante -= lote.num_rows
+        lotes.append(lote)
+
+    tabela = pa.Table.from_batches(lotes, schema=scanner.projected_schema)
+    proximo = None
+    if ha_mais:
+        proximo = _proximo_cursor(tabela, consulta)
+    if consulta.colunas is not None:
+        tabela = tabela.select(consulta.colunas)
+    return tabela, proximo
+
+
+def _proximo_cursor(tabela: pa.Table, consulta: Consulta):
+    """(valores das chaves na última linha da página, linhas entregues com esses valores)"""
+    def chave(linha):
+        return [tabela.column(coluna)[linha].as_py() for coluna in consulta.chaves]
+
+    ultima = chave(tabela.num_rows - 1)
+    repetidos = 0
+    for linha in range(tabela.num_rows - 1, -1, -1):
+        if chave(linha) != ultima:
+            break
+        repetidos += 1
+    else:
+        # A página inteira continua o grupo de linhas iguais da página anterior
+        if ultima == consulta.apos:
+            repetidos += consulta.repetidos
+    return ultima, repetidos
@@ -1,8 +1,23 @@
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import hashlib
 import logging
+import os
+import shutil
 import sys
-from time import time
+
+from leitor import ler_planilhas
+from main import BANCO_PADRAO, DatabaseError, SQLiteCRUD, alias, sincronizar_lotes
+from snapshots import armazem
+from indice_ean import gravar_indice
+from juncao import juntar_estoque
+from esquemas import registro_esquemas
+from metricas import etapa, tamanho_arquivos
+import mudancas
 
 logging.basicConfig(
     level=logging.INFO,
@@ -17,36 +32,366 @@ def validar_dataframe(df, colunas_obrigatorias, nome):
         if coluna not in df.columns:
             raise ValueError(f"Coluna obrigatória '{coluna}' ausente em '{nome}'.")
 
-def run(arquivo):
+# Apenas as colunas conhecidas (alias em main.py) são lidas de cada aba
+COLUNAS_LEITURA = {
+    'Tabela': list(alias),
+    'Estoque': list(alias),
+}
+
+# Ordenação e tamanho dos row groups dos parquets: com os dados agrupados
+# por essas chaves, os filtros de /estoque e /tabela descartam row groups
+# inteiros pelas estatísticas de mínimo/máximo
+ORDENACAO = {
+    'estoque.parquet': ['Cód. Fornecedor', 'Categoria', 'EAN'],
+    'tabela.parquet': ['Categoria', 'EAN'],
+}
+TAMANHO_ROW_GROUP = 2048
+
+# O estoque é gravado como um diretório com um parquet por fornecedor; a
+# ordem dos arquivos segue a ordenação acima. Partições sem mudança em
+# relação à versão anterior são reaproveitadas com hardlink.
+PARTICOES = {
+    'estoque.parquet': 'Cód. Fornecedor',
+}
+SEM_PARTICAO = 'sem_valor'
+
+# Tipos compactos (veja tipos_compactos): textos com até esta fração de valores
+# distintos viram categoria
+LIMITE_CATEGORIA = 0.5
+TIPO_EAN = pd.ArrowDtype(pa.uint64())
+TIPO_INTEIRO = pd.ArrowDtype(pa.int32())
+TIPO_TEXTO = pd.ArrowDtype(pa.string())
+LIMITES_INT32 = np.iinfo(np.int32)
+
+# Banco SQLite atualizado a cada importação (com o delta quando possível), o
+# mesmo lido pelo microservico; vazio desativa
+BANCO_SQLITE = os.environ.get('RESTOQUE_BANCO', BANCO_PADRAO)
+
+# Reclassifica uma amostra das colunas mesmo quando o layout já está no registro de esquemas
+VERIFICAR_DERIVA = os.environ.get('RESTOQUE_VERIFICAR_DERIVA', '0') == '1'
+
+def dicionarios_por_row_group(tabela, tamanho=TAMANHO_ROW_GROUP):
+    """
+    Quebra as colunas de dicionário (categorias) em pedaços de `tamanho`
+    linhas, cada um só com os valores que usa. O pyarrow grava o dicionário
+    inteiro em todos os row groups (e em todos os arquivos de partição), o que
+    em dados ordenados deixaria o parquet maior do que com texto simples.
+    """
+    for i, coluna in enumerate(tabela.columns):
+        if not pa.types.is_dictionary(coluna.type):
+            continue
+        pedacos = [
+            pc.dictionary_encode(coluna.slice(inicio, tamanho).cast(coluna.type.value_type).combine_chunks())
+            .cast(coluna.type)
+            for inicio in range(0, len(coluna), tamanho)
+        ]
+        tabela = tabela.set_column(i, tabela.field(i), pa.chunked_array(pedacos, type=coluna.type))
+    return tabela
+
+def gravar_parquet(df, caminho, nome):
+    chaves = [coluna for coluna in ORDENACAO.get(nome, []) if coluna in df.columns]
+    if chaves:
+        df = df.sort_values(chaves, kind='stable')
+    tabela = dicionarios_por_row_group(pa.Table.from_pandas(df, preserve_index=False))
+    pq.write_table(tabela, caminho, compression='snappy', row_group_size=TAMANHO_ROW_GROUP)
+
+def _nomes_particoes(valores):
+    """Nome do arquivo de cada linha: código com zeros à esquerda, para a ordem dos arquivos ser a numérica"""
+    codigos = pd.to_numeric(valores, errors='coerce')
+    nomes = pd.Series(SEM_PARTICAO, index=valores.index)
+    validos = codigos.notna().to_numpy()
+    nomes[validos] = [f"{int(codigo):010d}" for codigo in codigos[validos]]
+    return nomes
+
+def gravar_particionado(df, diretorio, nome, anterior=None):
+    """
+    Grava o DataFrame como um diretório com um parquet por valor da coluna de
+    partição (PARTICOES[nome]).
+
+    Args:
+        df (pd.DataFrame): Dados a gravar
+        diretorio (str): Diretório de destino (criado aqui)
+        nome (str): Nome do parquet, para achar a ordenação e a partição
+        anterior (tuple): (diretório, hashes das partições) da versão anterior;
+            partições com o mesmo hash são ligadas por hardlink em vez de regravadas
+
+    Returns:
+        tuple: (dict arquivo: hash do conteúdo, quantidade de partições reaproveitadas)
+    """
+    os.makedirs(diretorio)
+    chaves = [coluna for coluna in ORDENACAO.get(nome, []) if coluna in df.columns]
+    if chaves:
+        df = df.sort_values(chaves, kind='stable')
+    diretorio_anterior, hashes_anteriores = anterior or (None, {})
+
+    # O hash da partição cobre os tipos das colunas e o hash de cada linha, em ordem
+    tipos = str(df.dtypes.astype(str).to_dict()).encode('utf-8')
+    hashes_linhas = mudancas.hashes_linhas(df)
+    grupos = pd.Series(range(len(df))).groupby(_nomes_particoes(df[PARTICOES[nome]]).to_numpy(), sort=True)
+    posicoes_por_particao = grupos.indices if len(df) else {SEM_PARTICAO: []}
+
+    # Convertida uma única vez, e só se alguma partição precisar ser gravada
+    tabela = None
+    particoes = {}
+    reaproveitadas = 0
+    for particao, posicoes in posicoes_por_particao.items():
+        arquivo = f"{particao}.parquet"
+        destino = os.path.join(diretorio, arquivo)
+        conteudo = hashlib.sha256(tipos + hashes_linhas[posicoes].tobytes()).hexdigest()
+        particoes[arquivo] = conteudo
+
+        if diretorio_anterior is not None and hashes_anteriores.get(arquivo) == conteudo:
+            origem = os.path.join(diretorio_anterior, arquivo)
+            try:
+                os.link(origem, destino)
+            except OSError:
+                shutil.copyfile(origem, destino)
+            reaproveitadas += 1
+            continue
+        if tabela is None:
+            tabela = pa.Table.from_pandas(df, preserve_index=False)
+        pq.write_table(dicionarios_por_row_group(tabela.take(posicoes)), destino, compression='snappy',
+                       row_group_size=TAMANHO_ROW_GROUP)
+    return particoes, reaproveitadas
+
+def atualizar_banco(planilhas, esquemas, deltas, versao, base):
+    """
+    Leva a versão publicada para o banco SQLite, aplicando só o delta nas
+    tabelas que estavam na versão `base`. A versão já foi publicada, então uma
+    falha aqui é apenas registrada: a próxima importação regrava as tabelas inteiras.
+
+    Args:
+        planilhas (dict): Dicionário aba: blocos (DataFrames) com as linhas da aba
+        esquemas (dict): Esquemas registrados das abas
+        deltas (dict): Dicionário nome: blocos com as mudanças, ou None sem delta
+        versao (int): Versão publicada
+        base (int): Versão a partir da qual os deltas foram calculados
+
+    Returns:
+        int: Linhas gravadas e removidas nas tabelas sincronizadas
+    """
+    logging.info(f"Atualizando o banco {BANCO_SQLITE}...")
+    linhas = 0
+    try:
+        with SQLiteCRUD(BANCO_SQLITE) as db:
+            for nome, aba in mudancas.ABAS.items():
+                resumo = sincronizar_lotes(db, aba, planilhas[aba], esquemas.get(aba),
+                                           deltas[nome], versao, base)
+                logging.info(f"Tabela {resumo['tabela']}: {resumo['linhas']} linhas gravadas, "
+                             f"{resumo['removidas']} removidas{' (delta)' if resumo['delta'] else ''}")
+                linhas += resumo['linhas'] + resumo['removidas']
+    except DatabaseError as e:
+        logging.error(f"Erro ao atualizar o banco {BANCO_SQLITE}: {e}")
+    return linhas
+
+def ler(arquivo, esquemas=None, ignorar_ausentes=False):
+    """
+    Lê as colunas conhecidas das abas 'Tabela' e 'Estoque'
+
+    Args:
+        arquivo: Caminho ou objeto arquivo do Excel
+        esquemas (dict): Recebe aba: esquema registrado (veja leitor.ler_planilhas)
+        ignorar_ausentes (bool): Abas ausentes são ignoradas em vez de gerar erro
+
+    Returns:
+        dict: Dicionário aba: DataFrame
+    """
+    logging.info("Lendo as colunas necessárias das planilhas...")
+    return ler_planilhas(arquivo, COLUNAS_LEITURA, registro=registro_esquemas,
+                         verificar_deriva=VERIFICAR_DERIVA, esquemas=esquemas,
+                         ignorar_ausentes=ignorar_ausentes)
+
+def validar(planilhas):
+    logging.info("Validando DataFrames...")
+    validar_dataframe(planilhas.get('Tabela'), ['EAN'], 'Tabela')
+    validar_dataframe(planilhas.get('Estoque'), ['EAN', 'Estoque Disponivel'], 'Estoque')
+
+def mapear_estoque(df_tabela, df_estoque):
+    """
+    Preenche a coluna 'Estoque' da tabela com o estoque disponível de cada EAN
+    (junção vetorizada, veja juncao.juntar_estoque)
+
+    Returns:
+        dict: Diagnóstico da junção (EANs repetidos, sem estoque e tipos divergentes)
+    """
+    logging.info("Cruzando os EANs da tabela com o estoque...")
+    df_tabela['Estoque'], diagnostico = juntar_estoque(df_tabela['EAN'], df_estoque['EAN'],
+                                                       df_estoque['Estoque Disponivel'])
+    return diagnostico
+
+def tipos_compactos(df, esquema=None):
+    """
+    Escolhe tipos compactos para as colunas, guiado pelo tipo que o detector
+    registrou no esquema da aba (sem esquema, pelo dtype):
+
+    - textos (STRING) com poucos valores distintos, como Fornecedor e Categoria,
+      viram categoria (dicionário no parquet); os demais ficam como string Arrow
+    - inteiros viram int32 quando os valores cabem, e o EAN vira uint64
+    - decimais, datas e textos que o detector classificou como outro tipo não mudam
+
+    Returns:
+        dict: Dicionário coluna: dtype, só com as colunas que mudam
+    """
+    registradas = esquema['colunas'] if esquema else {}
+    tipos = {}
+    for nome in df.columns:
+        serie = df[nome]
+        detectado = registradas.get(nome, {}).get('tipo')
+        if pd.api.types.is_integer_dtype(serie):
+            minimo, maximo = serie.min(), serie.max()
+            if nome == 'EAN':
+                if pd.isna(minimo) or minimo >= 0:
+                    tipos[nome] = TIPO_EAN
+            elif pd.isna(minimo) or (LIMITES_INT32.min <= minimo and maximo <= LIMITES_INT32.max):
+                tipos[nome] = TIPO_INTEIRO
+        elif pd.api.types.is_string_dtype(serie) and detectado in (None, 'STRING'):
+            validos = serie.count()
+            if validos and serie.nunique() <= validos * LIMITE_CATEGORIA:
+                tipos[nome] = 'category'
+            elif serie.dtype != TIPO_TEXTO:
+                tipos[nome] = TIPO_TEXTO
+    return tipos
+
+def compactar_tipos(df, tipos):
+    """
+    Converte as colunas para os tipos escolhidos por tipos_compactos
+
+    Raises:
+        ValueError: Se os valores não couberem nos tipos (ex.: um bloco lido
+            depois de os tipos terem sido escolhidos)
+    """
+    try:
+        return df.astype(tipos)
+    except (pa.ArrowInvalid, TypeError, ValueError, OverflowError) as e:
+        raise ValueError(f"Valores não cabem nos tipos compactos {tipos}: {e}")
+
+def compactar(planilhas, esquemas):
+    """Compacta os tipos de cada aba (veja tipos_compactos), no lugar"""
+    logging.info("Compactando os tipos das colunas...")
+    for aba, df in planilhas.items():
+        antes = df.memory_usage(deep=True).sum()
+        planilhas[aba] = compactar_tipos(df, tipos_compactos(df, esquemas.get(aba)))
+        depois = planilhas[aba].memory_usage(deep=True).sum()
+        logging.info(f"Aba '{aba}': {antes / 1024 / 1024:.1f} MB -> {depois / 1024 / 1024:.1f} MB")
+
+def publicar(planilhas, esquemas, tempos, metadados=None):
+    """
+    Calcula as mudanças em relação à versão atual, grava os parquets, o índice
+    de EAN e os arquivos de delta em uma nova versão e atualiza o banco SQLite.
+
+    Args:
+        planilhas (dict): Abas 'Tabela' (com o estoque mapeado) e 'Estoque'
+        esquemas (dict): Esquemas registrados das abas
+        tempos (dict): Recebe a duração das etapas 'mudancas', 'gravacao' e 'banco'
+        metadados (dict): Gravados no manifesto da versão (opcional)
+
+    Returns:
+        int: Versão publicada
+    """
+    df_tabela = planilhas['Tabela']
+    df_estoque = planilhas['Estoque']
+
+    # A versão atual fica fixada enquanto serve de base para o delta
+    with armazem.fixar() as base:
+        with etapa('mudancas', tempos) as medida:
+            logging.info(f"Calculando mudanças em relação à versão {base}...")
+            medida.contar(planilhas)
+            hashes = {}
+            deltas = {}
+            for nome, aba in mudancas.ABAS.items():
+                anteriores = None
+                if base is not None:
+                    anteriores = mudancas.ler_hashes(armazem.caminho(base, mudancas.ARQUIVO_HASHES.format(nome)))
+                hashes[nome], deltas[nome] = mudancas.calcular_mudancas(planilhas[aba], anteriores)
+                if deltas[nome] is not None:
+                    logging.info(f"Aba '{aba}': {mudancas.contar_operacoes(deltas[nome])}")
+
+        with etapa('gravacao', tempos) as medida:
+            logging.info("Salvando resultado em parquets...")
+            with armazem.nova_versao() as versao:
+                manifesto_base = armazem.manifesto(base) if base is not None else {}
+                particoes = {}
+                for nome, df in (('estoque.parquet', df_estoque), ('tabela.parquet', df_tabela)):
+                    if nome not in PARTICOES:
+                        gravar_parquet(df, versao.caminho(nome), nome)
+                        continue
+                    anterior = None
+                    if base is not None:
+                        anterior = (armazem.caminho(base, nome), manifesto_base.get('particoes', {}).get(nome, {}))
+                    particoes[nome], reaproveitadas = gravar_particionado(df, versao.caminho(nome), nome, anterior)
+                    logging.info(f"{nome}: {len(particoes[nome])} partições, {reaproveitadas} reaproveitadas")
+
+                logging.info("Gravando índice de EAN para estoque...")
+                gravar_indice(df_estoque['EAN'], df_estoque['Estoque Disponivel'], versao)
+
+                for nome in mudancas.ABAS:
+                    mudancas.gravar_hashes(hashes[nome], versao.caminho(mudancas.ARQUIVO_HASHES.format(nome)))
+                    if deltas[nome] is not None:
+                        mudancas.gravar_mudancas(deltas[nome], versao.caminho(mudancas.ARQUIVO_MUDANCAS.format(nome)))
+                versao.metadados.update({
+                    **(metadados or {}),
+                    'base': base,
+                    'particoes': particoes,
+                    'mudancas': {nome: mudancas.contar_operacoes(delta)
+                                 for nome, delta in deltas.items() if delta is not None},
+                })
+                medida.contar(linhas=len(df_estoque) + len(df_tabela), tamanho=tamanho_arquivos(versao.diretorio))
+
+    if BANCO_SQLITE:
+        with etapa('banco', tempos) as medida:
+            linhas = atualizar_banco({aba: [df] for aba, df in planilhas.items()}, esquemas,
+                                     {nome: None if delta is None else [delta] for nome, delta in deltas.items()},
+                                     versao.versao, base)
+            medida.contar(linhas=linhas)
+    return versao.versao
+
+def run(arquivo, tempos=None, origem=None):
+    """
+    Lê a planilha, atualiza o estoque da aba 'Tabela' e publica os parquets
+    em uma nova versão do armazém de snapshots.
+
+    Args:
+        arquivo: Caminho ou objeto arquivo do Excel
+        tempos (dict): Dicionário que recebe a duração de cada etapa (opcional)
+        origem (dict): Identificação do arquivo (veja uploads.Upload.origem),
+            gravada no manifesto da versão (opcional)
+
+    Returns:
+        dict: Duração de cada etapa em segundos
+    """
+    if tempos is None:
+        tempos = {}
     try:
-        logging.info("Lendo as colunas necessárias das planilhas...")
+        with etapa('leitura', tempos) as medida:
+            esquemas = {}
+            planilhas = ler(arquivo, esquemas)
+            medida.contar(planilhas)
 
-        df_tabela = pd.read_excel(arquivo, sheet_name='Tabela', engine='openpyxl')
-        df_estoque = pd.read_excel(arquivo, sheet_name='Estoque', engine='openpyxl')
+        with etapa('validacao', tempos) as medida:
+            validar(planilhas)
+            medida.contar(planilhas)
 
-        logging.info("Validando DataFrames...")
-        validar_dataframe(df_tabela, ['EAN'], 'Tabela')
-        validar_dataframe(df_estoque, ['EAN', 'Estoque Disponivel'], 'Estoque')
+        with etapa('mapeamento', tempos) as medida:
+            diagnostico = mapear_estoque(planilhas['Tabela'], planilhas['Estoque'])
+            medida.contar(linhas=len(planilhas['Tabela']) + len(planilhas['Estoque']))
 
-        logging.info("Criando mapeamento de EAN para estoque...")
-        mapeamento_estoque = df_estoque.set_index('EAN')['Estoque Disponivel'].to_dict()
+        with etapa('compactacao', tempos) as medida:
+            compactar(planilhas, esquemas)
+            medida.contar(planilhas)
 
-        logging.info("Atualizando coluna 'Estoque' na tabela principal...")
-        df_tabela['Estoque'] = df_tabela['EAN'].map(mapeamento_estoque).fillna(0)
-        if not pd.api.types.is_numeric_dtype(df_tabela['Estoque']):
-            logging.warning("Coluna 'Estoque' não é numérica. Convertendo para inteiro.")
-        df_tabela['Estoque'] = df_tabela['Estoque'].astype(int)
-        
-        logging.info("Salvando resultado em parquets...")
-        df_estoque.to_parquet('estoque.parquet', engine='pyarrow', compression='snappy')
-        df_tabela.to_parquet('tabela.parquet', engine='pyarrow', compression='snappy')
+        versao = publicar(planilhas, esquemas, tempos, metadados={'juncao': diagnostico, 'origem': origem})
 
-        logging.info("Processamento concluído! Arquivos criado.")
+        logging.info(f"Processamento concluído! Versão {versao} publicada. Tempos: {tempos}")
+        return tempos
     except FileNotFoundError as e:
         logging.error(f"Arquivo não encontrado: {e.filename}")
+        raise
     except ValueError as e:
         logging.error(f"Erro de valor: {e}")
+        raise
     except TypeError as e:
         logging.error(f"Erro de tipo: {e}")
+        raise
     except Exception as e:
         logging.error(f"Erro inesperado: {e}", exc_info=True)
+        raise
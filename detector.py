@@ -1,107 +1,289 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime, date
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from statistics import NormalDist
+from time import perf_counter
+import math
 import re
 
-def analisar_tipo_coluna(serie):
+# Valores aceitos como booleano (comparados em minúsculas)
+VALORES_BOOLEANOS = ['true', 'false', 'verdadeiro', 'falso', 'sim', 'não', 'yes', 'no', '1', '0']
+
+PADRAO_INTEIRO = re.compile(r'^-?\d+$')
+PADRAO_DECIMAL = re.compile(r'^-?\d+[,.]\d+$')
+
+# Padrões comuns de data: DD/MM/AAAA, AAAA-MM-DD, DD-MM-AAAA, DD.MM.AAAA
+PADRAO_DATA = re.compile(
+    r'^(?:\d{1,2}/\d{1,2}/\d{4}|\d{4}-\d{1,2}-\d{1,2}|\d{1,2}-\d{1,2}-\d{4}|\d{1,2}\.\d{1,2}\.\d{4})$'
+)
+# Padrões comuns de hora: HH:MM, HH:MM:SS e HH:MM AM/PM
+PADRAO_HORA = re.compile(r'^(?:\d{1,2}:\d{2}(?::\d{2})?|\d{1,2}:\d{2}(?::\d{2})?[AP]M)$')
+# Padrões combinados data+hora
+PADRAO_DATA_HORA = re.compile(r'^(?:\d{1,2}/\d{1,2}/\d{4} \d{1,2}:\d{2}|\d{4}-\d{1,2}-\d{1,2} \d{1,2}:\d{2})')
+
+TIPOS = ['INTEIRO', 'DECIMAL', 'DATA', 'HORA', 'BOOLEANO', 'STRING']
+
+# Colunas do relatório de analisar_excel_completo
+COLUNAS_RELATORIO = ['Coluna', 'Tipo_Detectado', 'Confiança (%)', 'Valores_Únicos', 'Valores_Nulos',
+                     '%_Nulos', 'Tipo_Pandas', 'Tempo_ms']
+
+
+def _contar_tipos(serie_sem_nulos):
+    """
+    Conta quantos valores (não nulos) da série se encaixam em cada tipo
+
+    Colunas numéricas e de data usam o dtype direto; as demais são
+    classificadas com operações vetorizadas do pandas sobre os valores
+    distintos, ponderados pela frequência.
+    """
+    contadores = dict.fromkeys(TIPOS, 0)
+
+    # Verificar se já é datetime do pandas
+    if pd.api.types.is_datetime64_any_dtype(serie_sem_nulos):
+        so_data = int((serie_sem_nulos == serie_sem_nulos.dt.normalize()).sum())
+        contadores['DATA'] = so_data
+        contadores['HORA'] = len(serie_sem_nulos) - so_data
+        return contadores
+
+    if pd.api.types.is_bool_dtype(serie_sem_nulos):
+        contadores['BOOLEANO'] = len(serie_sem_nulos)
+        return contadores
+
+    # Inteiros: apenas 0 e 1 contam como booleano
+    if pd.api.types.is_integer_dtype(serie_sem_nulos):
+        booleanos = int(serie_sem_nulos.isin([0, 1]).sum())
+        contadores['BOOLEANO'] = booleanos
+        contadores['INTEIRO'] = len(serie_sem_nulos) - booleanos
+        return contadores
+
+    # Floats: str(valor) só sai sem notação científica entre 1e-4 e 1e16
+    if pd.api.types.is_float_dtype(serie_sem_nulos):
+        valores = np.abs(serie_sem_nulos.to_numpy(dtype='float64'))
+        decimais = int(((valores == 0) | ((valores >= 1e-4) & (valores < 1e16))).sum())
+        contadores['DECIMAL'] = decimais
+        contadores['STRING'] = len(serie_sem_nulos) - decimais
+        return contadores
+
+    # Converter para string para análise
+    frequencias = serie_sem_nulos.astype(str).str.strip().value_counts(sort=False)
+    textos = frequencias.index.to_series(index=range(len(frequencias)))
+    pesos = frequencias.to_numpy()
+
+    # A ordem das verificações segue a prioridade: booleano, inteiro, decimal, data/hora
+    restantes = np.ones(len(textos), dtype=bool)
+
+    booleano = textos.str.lower().isin(VALORES_BOOLEANOS).to_numpy()
+    contadores['BOOLEANO'] = int(pesos[booleano].sum())
+    restantes &= ~booleano
+
+    inteiro = restantes & textos.str.match(PADRAO_INTEIRO).to_numpy(dtype=bool)
+    contadores['INTEIRO'] = int(pesos[inteiro].sum())
+    restantes &= ~inteiro
+
+    decimal = restantes & textos.str.replace(',', '.', regex=False).str.match(PADRAO_DECIMAL).to_numpy(dtype=bool)
+    contadores['DECIMAL'] = int(pesos[decimal].sum())
+    restantes &= ~decimal
+
+    data_hora = restantes & textos.str.match(PADRAO_DATA_HORA).to_numpy(dtype=bool)
+    restantes &= ~data_hora
+    data = restantes & textos.str.match(PADRAO_DATA).to_numpy(dtype=bool)
+    restantes &= ~data
+    hora = restantes & textos.str.match(PADRAO_HORA).to_numpy(dtype=bool)
+    restantes &= ~hora
+
+    contadores['DATA'] = int(pesos[data].sum())
+    contadores['HORA'] = int(pesos[data_hora].sum() + pesos[hora].sum())
+    contadores['STRING'] = int(pesos[restantes].sum())
+    return contadores
+
+
+def amostra_estratificada(serie, tamanho, estratos=10, semente=0):
+    """
+    Sorteia `tamanho` valores distribuídos igualmente entre blocos contíguos
+    da série, para que fornecedores agrupados no arquivo apareçam na amostra
+    """
+    rng = np.random.default_rng(semente)
+    posicoes = []
+    for bloco in np.array_split(np.arange(len(serie)), estratos):
+        quantidade = min(len(bloco), -(-tamanho // estratos))
+        posicoes.append(rng.choice(bloco, size=quantidade, replace=False))
+    return serie.iloc[np.sort(np.concatenate(posicoes))]
+
+
+def tamanho_amostra(margem_erro, confianca=0.95):
+    """
+    Tamanho de amostra para estimar uma proporção com a margem de erro e a
+    confiança pedidas (pior caso, p = 0,5)
+    """
+    z = NormalDist().inv_cdf((1 + confianca) / 2)
+    return math.ceil(z * z * 0.25 / (margem_erro * margem_erro))
+
+
+def analisar_tipo_coluna(serie, margem_erro=None, confianca=0.95):
     """
     Analisa uma série do pandas e retorna o tipo mais apropriado
+
+    Args:
+        serie (pd.Series): Coluna a analisar
+        margem_erro (float): Se informado, colunas grandes são classificadas a
+            partir de uma amostra estratificada cujo percentual tem essa margem
+            de erro (ex.: 0.01 = ±1 ponto percentual)
+        confianca (float): Nível de confiança da margem de erro
+
+    Returns:
+        tuple: (tipo, percentual de valores do tipo)
     """
     # Remove valores nulos para análise
     serie_sem_nulos = serie.dropna()
     
     if len(serie_sem_nulos) == 0:
         return "VAZIO", 0
-    
+
+    if margem_erro is not None:
+        tamanho = tamanho_amostra(margem_erro, confianca)
+        if len(serie_sem_nulos) > tamanho:
+            serie_sem_nulos = amostra_estratificada(serie_sem_nulos, tamanho)
+
     # Contador para estatísticas
-    total_valores = len(serie_sem_nulos)
-    
-    # Tentar identificar datas
-    contador_data = 0
-    contador_hora = 0
-    contador_inteiro = 0
-    contador_decimal = 0
-    contador_string = 0
-    contador_booleano = 0
-    
-    for valor in serie_sem_nulos:
-        # Verificar se já é datetime do pandas
-        if pd.api.types.is_datetime64_any_dtype(serie_sem_nulos):
-            if pd.notna(valor):
-                if valor.time() == datetime.min.time():
-                    contador_data += 1
-                else:
-                    contador_hora += 1
-            continue
-        
-        # Converter para string para análise
-        str_valor = str(valor).strip()
-        
-        # Verificar booleano
-        if str_valor.lower() in ['true', 'false', 'verdadeiro', 'falso', 'sim', 'não', 'yes', 'no', '1', '0']:
-            contador_booleano += 1
-        
-        # Verificar inteiro
-        elif re.match(r'^-?\d+$', str_valor):
-            contador_inteiro += 1
-        
-        # Verificar decimal
-        elif re.match(r'^-?\d+[,.]\d+$', str_valor.replace(',', '.')):
-            contador_decimal += 1
-        
-        # Verificar datas e horas
-        else:
-            # Padrões comuns de data
-            padroes_data = [
-                r'^\d{1,2}/\d{1,2}/\d{4}$',  # DD/MM/AAAA
-                r'^\d{4}-\d{1,2}-\d{1,2}$',  # AAAA-MM-DD
-                r'^\d{1,2}-\d{1,2}-\d{4}$',  # DD-MM-AAAA
-                r'^\d{1,2}\.\d{1,2}\.\d{4}$', # DD.MM.AAAA
-            ]
-            
-            # Padrões comuns de hora
-            padroes_hora = [
-                r'^\d{1,2}:\d{2}(:\d{2})?$',  # HH:MM ou HH:MM:SS
-                r'^\d{1,2}:\d{2}(:\d{2})?[AP]M$',  # HH:MM AM/PM
-            ]
-            
-            # Padrões combinados data+hora
-            padroes_data_hora = [
-                r'^\d{1,2}/\d{1,2}/\d{4} \d{1,2}:\d{2}',
-                r'^\d{4}-\d{1,2}-\d{1,2} \d{1,2}:\d{2}',
-            ]
-            
-            eh_data = any(re.match(padrao, str_valor) for padrao in padroes_data)
-            eh_hora = any(re.match(padrao, str_valor) for padrao in padroes_hora)
-            eh_data_hora = any(re.match(padrao, str_valor) for padrao in padroes_data_hora)
-            
-            if eh_data_hora:
-                contador_hora += 1
-            elif eh_data:
-                contador_data += 1
-            elif eh_hora:
-                contador_hora += 1
-            else:
-                contador_string += 1
-    
+    return _tipo_predominante(_contar_tipos(serie_sem_nulos), len(serie_sem_nulos))
+
+def _tipo_predominante(contadores, total_valores):
     # Determinar o tipo predominante
-    tipos = {
-        'INTEIRO': contador_inteiro / total_valores,
-        'DECIMAL': contador_decimal / total_valores,
-        'DATA': contador_data / total_valores,
-        'HORA': contador_hora / total_valores,
-        'BOOLEANO': contador_booleano / total_valores,
-        'STRING': contador_string / total_valores
-    }
+    tipos = {tipo: contadores[tipo] / total_valores for tipo in TIPOS}
     
     tipo_principal = max(tipos, key=tipos.get)
     percentual = tipos[tipo_principal] * 100
     
     return tipo_principal, percentual
 
-def analisar_excel(arquivo_excel, planilha=0):
+def _analisar_bloco(aba, coluna, bloco):
+    """Conta os tipos de um bloco de valores (executado no pool de processos)"""
+    inicio = perf_counter()
+    contadores = _contar_tipos(bloco)
+    return aba, coluna, contadores, perf_counter() - inicio
+
+def analisar_excel_completo(arquivo_excel, processos=None, tamanho_bloco=20000,
+                            margem_erro=None, limiar_paralelo=200000, cache=None, sha256=None,
+                            estatisticas=None):
+    """
+    Analisa todas as abas de um arquivo Excel sem imprimir nada
+
+    O arquivo é lido uma única vez. Cada coluna é dividida em blocos de até
+    `tamanho_bloco` valores, que formam uma fila de trabalho distribuída em um
+    pool de processos; os blocos maiores são enviados primeiro, para que as
+    colunas de texto largas não deixem processos ociosos no final.
+
+    Args:
+        arquivo_excel: Caminho ou objeto arquivo do Excel
+        processos (int): Tamanho do pool (padrão: número de CPUs); 1 roda no próprio processo
+        tamanho_bloco (int): Quantidade máxima de valores por tarefa
+        margem_erro (float): Ativa a amostragem (veja analisar_tipo_coluna)
+        limiar_paralelo (int): Abaixo desta quantidade total de valores a análise
+            roda no próprio processo, pois o custo do pool seria maior que o ganho
+        cache (CacheAnalises): Se informado, um arquivo já analisado devolve o
+            relatório gravado sem ser lido, e as colunas com os mesmos valores
+            de uma análise anterior não são classificadas de novo (veja cache_analises.py)
+        sha256 (str): Hash do arquivo, se já calculado (evita lê-lo para a chave do cache)
+        estatisticas (dict): Se informado, recebe 'relatorio_em_cache',
+            'colunas_em_cache' e 'colunas_calculadas'
+
+    Returns:
+        dict: Dicionário aba: DataFrame com as colunas de analisar_excel mais
+        'Tempo_ms' (tempo de classificação somado dos blocos da coluna; 0 nas
+        colunas que vieram do cache)
+    """
+    if estatisticas is None:
+        estatisticas = {}
+    estatisticas.update({'relatorio_em_cache': False, 'colunas_em_cache': 0, 'colunas_calculadas': 0})
+    if cache is not None:
+        chave_relatorio = cache.chave_relatorio(arquivo_excel, margem_erro, sha256)
+        relatorio = cache.obter(chave_relatorio)
+        if relatorio is not None:
+            estatisticas['relatorio_em_cache'] = True
+            return {aba: pd.DataFrame(linhas, columns=COLUNAS_RELATORIO) for aba, linhas in relatorio.items()}
+
+    planilhas = pd.read_excel(arquivo_excel, sheet_name=None)
+
+    blocos = []
+    totais = {}
+    chaves = {}
+    detectados = {}
+    for aba, df in planilhas.items():
+        for coluna in df.columns:
+            if cache is not None:
+                chaves[(aba, coluna)] = cache.chave_coluna(aba, coluna, df[coluna], margem_erro)
+                detectado = cache.obter(chaves[(aba, coluna)])
+                if detectado is not None:
+                    detectados[(aba, coluna)] = detectado
+                    continue
+            serie_sem_nulos = df[coluna].dropna()
+            if margem_erro is not None:
+                tamanho = tamanho_amostra(margem_erro)
+                if len(serie_sem_nulos) > tamanho:
+                    serie_sem_nulos = amostra_estratificada(serie_sem_nulos, tamanho)
+            totais[(aba, coluna)] = len(serie_sem_nulos)
+            for inicio in range(0, len(serie_sem_nulos), tamanho_bloco):
+                blocos.append((aba, coluna, serie_sem_nulos.iloc[inicio:inicio + tamanho_bloco]))
+    blocos.sort(key=lambda bloco: len(bloco[2]), reverse=True)
+
+    contadores = {chave: dict.fromkeys(TIPOS, 0) for chave in totais}
+    tempos = dict.fromkeys(totais, 0.0)
+
+    def acumular(aba, coluna, contagem, tempo):
+        for tipo, quantidade in contagem.items():
+            contadores[(aba, coluna)][tipo] += quantidade
+        tempos[(aba, coluna)] += tempo
+
+    if processos == 1 or sum(totais.values()) < limiar_paralelo:
+        for bloco in blocos:
+            acumular(*_analisar_bloco(*bloco))
+    else:
+        with ProcessPoolExecutor(max_workers=processos) as executor:
+            futuros = [executor.submit(_analisar_bloco, *bloco) for bloco in blocos]
+            for futuro in as_completed(futuros):
+                acumular(*futuro.result())
+
+    resultados = {}
+    for aba, df in planilhas.items():
+        linhas = []
+        for coluna in df.columns:
+            serie = df[coluna]
+            if (aba, coluna) in detectados:
+                tipo_detectado, confianca = detectados[(aba, coluna)]
+                estatisticas['colunas_em_cache'] += 1
+            else:
+                total = totais[(aba, coluna)]
+                if total:
+                    tipo_detectado, confianca = _tipo_predominante(contadores[(aba, coluna)], total)
+                else:
+                    tipo_detectado, confianca = "VAZIO", 0
+                estatisticas['colunas_calculadas'] += 1
+                if cache is not None:
+                    cache.gravar(chaves[(aba, coluna)], [tipo_detectado, confianca])
+            nulos = serie.isna().sum()
+            linhas.append({
+                'Coluna': coluna,
+                'Tipo_Detectado': tipo_detectado,
+                'Confiança (%)': round(confianca, 2),
+                'Valores_Únicos': serie.nunique(),
+                'Valores_Nulos': nulos,
+                '%_Nulos': round((nulos / len(serie)) * 100, 2) if len(serie) else 0.0,
+                'Tipo_Pandas': str(serie.dtype),
+                'Tempo_ms': round(tempos.get((aba, coluna), 0.0) * 1000, 3),
+            })
+        resultados[aba] = pd.DataFrame(linhas, columns=COLUNAS_RELATORIO)
+    if cache is not None:
+        cache.gravar(chave_relatorio, {aba: df.to_dict(orient='records') for aba, df in resultados.items()})
+    return resultados
+
+def analisar_excel(arquivo_excel, planilha=0, margem_erro=None, cache=None):
     """
     Analisa um arquivo Excel e retorna os tipos de dados de cada coluna
+
+    Com `margem_erro` as colunas grandes são classificadas por amostragem
+    (veja analisar_tipo_coluna). Com `cache` (CacheAnalises), colunas com os
+    mesmos valores de uma análise anterior não são classificadas de novo.
     """
     try:
         # Ler o arquivo Excel
@@ -117,7 +299,15 @@ def analisar_excel(arquivo_excel, planilha=0):
         
         for coluna in df.columns:
             serie = df[coluna]
-            tipo_detectado, confianca = analisar_tipo_coluna(serie)
+            detectado = None
+            if cache is not None:
+                chave = cache.chave_coluna(planilha, coluna, serie, margem_erro)
+                detectado = cache.obter(chave)
+            if detectado is None:
+                detectado = analisar_tipo_coluna(serie, margem_erro)
+                if cache is not None:
+                    cache.gravar(chave, list(detectado))
+            tipo_detectado, confianca = detectado
             
             # Estatísticas da coluna
             nulos = serie.isna().sum()
@@ -182,8 +372,9 @@ if __name__ == "__main__":
     # Substitua pelo caminho do seu arquivo Excel
     arquivo_excel = "tabela.xlsx"  # Altere para o caminho do seu arquivo
     
-    # Analisar o arquivo
-    resultados = analisar_excel(arquivo_excel)
+    # Analisar o arquivo; colunas que não mudaram desde a última execução vêm do cache
+    from cache_analises import cache_analises
+    resultados = analisar_excel(arquivo_excel, cache=cache_analises)
     
     # Gerar relatório
     if resultados is not None:
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+import pyarrow as pa
+
+from main import alias
+
+# Tipos Arrow que podem ser gravados no registro e passados explicitamente ao leitor
+TIPOS_ARROW = {
+    'int64': pa.int64(),
+    'double': pa.float64(),
+    'string': pa.string(),
+    'bool': pa.bool_(),
+    'null': pa.null(),
+    'timestamp[us]': pa.timestamp('us'),
+    'date32[day]': pa.date32(),
+    'time64[us]': pa.time64('us'),
+}
+
+
+def impressao_digital(aba: str, cabecalho) -> str:
+    """
+    Identifica o layout de uma aba pelo nome e pela sequência de colunas do cabeçalho
+    """
+    texto = json.dumps([aba, [None if c is None else str(c) for c in cabecalho]], ensure_ascii=False)
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+
+def tipo_arrow(texto: str):
+    """Tipo Arrow gravado no registro, ou None se não for suportado"""
+    return TIPOS_ARROW.get(texto)
+
+
+class RegistroEsquemas:
+    def __init__(self, caminho: str):
+        """
+        Registro dos tipos inferidos para cada layout de aba já visto
+
+        Args:
+            caminho (str): Arquivo JSON onde o registro é persistido
+        """
+        self.caminho = caminho
+        self.lock = threading.Lock()
+        self.esquemas = None
+
+    def _carregar(self):
+        if self.esquemas is None:
+            try:
+                with open(self.caminho, encoding='utf-8') as arquivo:
+                    self.esquemas = json.load(arquivo)
+            except FileNotFoundError:
+                self.esquemas = {}
+            except ValueError as e:
+                logging.warning(f"Registro de esquemas inválido em {self.caminho}, recriando: {e}")
+                self.esquemas = {}
+        return self.esquemas
+
+    def obter(self, impressao: str):
+        """
+        Returns:
+            dict: Esquema registrado para a impressão digital, ou None
+        """
+        with self.lock:
+            return self._carregar().get(impressao)
+
+    def registrar(self, impressao: str, aba: str, cabecalho, colunas: dict) -> dict:
+        """
+        Grava (ou atualiza) o esquema de um layout
+
+        Args:
+            impressao (str): Impressão digital da aba
+            aba (str): Nome da aba
+            cabecalho (list): Colunas do cabeçalho, na ordem
+            colunas (dict): coluna: {'tipo', 'confianca', 'arrow'}; o alias é completado aqui
+
+        Returns:
+            dict: Esquema gravado
+        """
+        with self.lock:
+            esquemas = self._carregar()
+            anterior = esquemas.get(impressao, {}).get('colunas', {})
+            esquema = {
+                'aba': aba,
+                'cabecalho': list(cabecalho),
+                'colunas': {
+                    **anterior,
+                    **{coluna: {**info, 'alias': alias.get(coluna)} for coluna, info in colunas.items()},
+                },
+                'registrado_em': datetime.now().isoformat(),
+            }
+            esquemas[impressao] = esquema
+
+            os.makedirs(os.path.dirname(self.caminho) or '.', exist_ok=True)
+            temporario = f"{self.caminho}.{os.getpid()}.tmp"
+            with open(temporario, 'w', encoding='utf-8') as arquivo:
+                json.dump(esquemas, arquivo, ensure_ascii=False, indent=2)
+            os.replace(temporario, self.caminho)
+        logging.info(f"Esquema da aba '{aba}' registrado ({impressao[:12]})")
+        return esquema
+
+
+registro_esquemas = RegistroEsquemas(
+    os.environ.get('RESTOQUE_ESQUEMAS', os.path.join(os.environ.get('RESTOQUE_DADOS', 'dados'), 'esquemas.json'))
+)
@@ -0,0 +1,186 @@
+import asyncio
+import json
+import logging
+import os
+import sys
+from urllib.parse import parse_qs, urlsplit
+
+import mudancas
+from snapshots import armazem
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler(sys.stdout)]
+)
+
+CAMINHO = '/estoque/stream'
+COLUNAS_EVENTO = [mudancas.CHAVE, 'Estoque Disponivel', 'operacao']
+
+
+def formatar_evento(dados: str, tipo: str = None, id_evento=None) -> bytes:
+    """Monta um evento no formato text/event-stream"""
+    linhas = []
+    if id_evento is not None:
+        linhas.append(f"id: {id_evento}")
+    if tipo is not None:
+        linhas.append(f"event: {tipo}")
+    linhas.extend(f"data: {linha}" for linha in dados.split('\n'))
+    return ('\n'.join(linhas) + '\n\n').encode('utf-8')
+
+
+def evento_mudancas(desde: int, ate: int) -> bytes:
+    """
+    Evento com o estoque de cada EAN alterado entre as versões `desde` e `ate`
+
+    Se as mudanças do intervalo não estiverem mais disponíveis, o evento é
+    'recarregar': o cliente deve buscar o /estoque completo.
+    """
+    with armazem.fixar(ate) as versao:
+        try:
+            if versao is None:
+                raise mudancas.VersaoIndisponivel(f"A versão {ate} não está mais disponível")
+            df = mudancas.mudancas_desde(armazem, desde, 'estoque', ate)
+        except mudancas.VersaoIndisponivel as e:
+            return formatar_evento(json.dumps({'versao': ate, 'motivo': str(e)}, ensure_ascii=False),
+                                   'recarregar', ate)
+    df = df[[coluna for coluna in COLUNAS_EVENTO if coluna in df.columns]]
+    registros = df.to_json(orient='records', force_ascii=False)
+    return formatar_evento(f'{{"versao": {ate}, "desde": {desde}, "mudancas": {registros}}}', 'estoque', ate)
+
+
+class ServidorEventos:
+    def __init__(self, tamanho_fila: int = 16, intervalo: float = 1.0, heartbeat: float = 15.0):
+        """
+        Servidor Server-Sent Events com as mudanças de estoque de cada importação
+
+        Roda em um único event loop asyncio: cada assinante ocupa apenas uma
+        corrotina e uma fila, não uma thread. O armazém de snapshots é
+        verificado a cada `intervalo` segundos, então importações feitas por
+        qualquer processo são notificadas.
+
+        Args:
+            tamanho_fila (int): Eventos pendentes por assinante; um assinante que
+                não acompanha é desconectado e retoma pelo Last-Event-ID
+            intervalo (float): Segundos entre as verificações de nova versão
+            heartbeat (float): Segundos sem eventos até enviar um comentário de keep-alive
+        """
+        self.tamanho_fila = tamanho_fila
+        self.intervalo = intervalo
+        self.heartbeat = heartbeat
+        self.assinantes = set()
+        self.versao = None
+
+    def publicar(self, evento: bytes) -> None:
+        for fila in list(self.assinantes):
+            try:
+                fila.put_nowait(evento)
+            except asyncio.QueueFull:
+                # Assinante lento: a fila é descartada e a conexão encerrada
+                logging.warning("Assinante de eventos lento desconectado")
+                self.assinantes.discard(fila)
+                while not fila.empty():
+                    fila.get_nowait()
+                fila.put_nowait(None)
+
+    async def vigiar(self) -> None:
+        """Publica as mudanças de cada nova versão do armazém"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.intervalo)
+            try:
+                atual = await loop.run_in_executor(None, armazem.versao_atual)
+                if atual is None or atual == self.versao:
+                    continue
+                if self.versao is None:
+                    self.versao = atual
+                    continue
+                evento = await loop.run_in_executor(None, evento_mudancas, self.versao, atual)
+                # Sem await entre as duas linhas: quem assinar depois já parte de `atual`
+                self.versao = atual
+                self.publicar(evento)
+                logging.info(f"Versão {atual} notificada a {len(self.assinantes)} assinantes")
+            except Exception as e:
+                logging.error(f"Erro ao verificar novas versões: {e}", exc_info=True)
+
+    async def _ler_requisicao(self, reader):
+        linha = (await reader.readline()).decode('latin-1').split()
+        cabecalhos = {}
+        while True:
+            cabecalho = (await reader.readline()).decode('latin-1').strip()
+            if not cabecalho:
+                break
+            nome, _, valor = cabecalho.partition(':')
+            cabecalhos[nome.strip().lower()] = valor.strip()
+        return linha, cabecalhos
+
+    async def atender(self, reader, writer) -> None:
+        fila = None
+        try:
+            linha, cabecalhos = await asyncio.wait_for(self._ler_requisicao(reader), 10)
+            url = urlsplit(linha[1]) if len(linha) >= 2 else None
+            if url is None or linha[0] != 'GET' or url.path != CAMINHO:
+                writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                return
+
+            # Retomada: Last-Event-ID enviado pelo EventSource ao reconectar, ou ?desde=
+            desde = cabecalhos.get('last-event-id') or parse_qs(url.query).get('desde', [None])[0]
+            try:
+                desde = int(desde) if desde else None
+            except ValueError:
+                desde = None
+
+            fila = asyncio.Queue(self.tamanho_fila)
+            self.assinantes.add(fila)
+            atual = self.versao
+
+            writer.write(b"HTTP/1.1 200 OK\r\n"
+                         b"Content-Type: text/event-stream; charset=utf-8\r\n"
+                         b"Cache-Control: no-cache\r\n"
+                         b"Connection: keep-alive\r\n"
+                         b"Access-Control-Allow-Origin: *\r\n"
+                         b"X-Accel-Buffering: no\r\n\r\n"
+                         b"retry: 3000\n\n")
+            if atual is not None:
+                if desde is not None and desde < atual:
+                    loop = asyncio.get_running_loop()
+                    writer.write(await loop.run_in_executor(None, evento_mudancas, desde, atual))
+                elif desde != atual:
+                    writer.write(formatar_evento(json.dumps({'versao': atual}), 'versao', atual))
+            await writer.drain()
+
+            while True:
+                try:
+                    evento = await asyncio.wait_for(fila.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    evento = b": keep-alive\n\n"
+                if evento is None:
+                    break
+                writer.write(evento)
+                await writer.drain()
+        except (ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            if fila is not None:
+                self.assinantes.discard(fila)
+            writer.close()
+
+    async def executar(self, host: str = '0.0.0.0', porta: int = 5001) -> None:
+        self.versao = armazem.versao_atual()
+        servidor = await asyncio.start_server(self.atender, host, porta)
+        logging.info(f"Eventos de estoque em http://{host}:{porta}{CAMINHO} (versão {self.versao})")
+        vigia = asyncio.create_task(self.vigiar())
+        try:
+            async with servidor:
+                await servidor.serve_forever()
+        finally:
+            vigia.cancel()
+
+
+if __name__ == '__main__':
+    servidor_eventos = ServidorEventos(
+        tamanho_fila=int(os.environ.get('EVENTOS_FILA_MAX', 16)),
+        intervalo=float(os.environ.get('EVENTOS_INTERVALO', 1.0)),
+        heartbeat=float(os.environ.get('EVENTOS_HEARTBEAT', 15.0)),
+    )
+    asyncio.run(servidor_eventos.executar(porta=int(os.environ.get('EVENTOS_PORTA', 5001))))
@@ -0,0 +1,112 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from juncao import chaves_ean
+
+ARQUIVO_CHAVES = 'ean_chaves.npy'
+ARQUIVO_VALORES = 'ean_estoque.npy'
+# As chaves são int64: EANs válidos ficam em [0, LIMITE_EAN)
+LIMITE_EAN = 2 ** 63
+
+
+def construir_indice(eans, estoques):
+    """
+    Monta o índice EAN -> estoque como dois arrays int64 alinhados,
+    ordenados pelo EAN. Para EANs repetidos vale o último, como em
+    juncao.juntar_estoque.
+
+    Args:
+        eans: Sequência de EANs (valores não numéricos ou com casas decimais
+            são descartados, como na junção do conversor)
+        estoques: Sequência de estoques na mesma ordem
+
+    Returns:
+        tuple: (chaves, valores) como np.ndarray int64
+    """
+    chaves, validos = chaves_ean(pd.Series(eans))
+    estoques = pd.to_numeric(pd.Series(estoques), errors='coerce').fillna(0)
+
+    chaves = chaves[validos]
+    valores = estoques.to_numpy(dtype='float64')[validos].astype(np.int64)
+
+    ordem = np.argsort(chaves, kind='stable')
+    chaves = chaves[ordem]
+    valores = valores[ordem]
+
+    # Em cada grupo de EANs iguais fica apenas a última ocorrência
+    ultimos = np.ones(len(chaves), dtype=bool)
+    ultimos[:-1] = chaves[1:] != chaves[:-1]
+    return chaves[ultimos], valores[ultimos]
+
+
+def gravar_indice(eans, estoques, escrita) -> int:
+    """
+    Grava o índice dentro de uma versão em preparação do armazém
+
+    Returns:
+        int: Quantidade de EANs no índice
+    """
+    chaves, valores = construir_indice(eans, estoques)
+    np.save(escrita.caminho(ARQUIVO_CHAVES), chaves)
+    np.save(escrita.caminho(ARQUIVO_VALORES), valores)
+    return len(chaves)
+
+
+class IndiceEAN:
+    def __init__(self, diretorio_versao: str):
+        """
+        Índice de uma versão publicada, mapeado em memória (np.load com mmap),
+        então o sistema operacional compartilha as páginas entre processos.
+        """
+        self.chaves = np.load(f"{diretorio_versao}/{ARQUIVO_CHAVES}", mmap_mode='r')
+        self.valores = np.load(f"{diretorio_versao}/{ARQUIVO_VALORES}", mmap_mode='r')
+
+    def __len__(self):
+        return len(self.chaves)
+
+    def buscar(self, ean: int):
+        """Estoque de um EAN ou None se não existir"""
+        if not 0 <= ean < LIMITE_EAN:
+            return None
+        posicao = int(np.searchsorted(self.chaves, ean))
+        if posicao < len(self.chaves) and self.chaves[posicao] == ean:
+            return int(self.valores[posicao])
+        return None
+
+    def buscar_lote(self, eans):
+        """
+        Busca vários EANs com uma única busca binária vetorizada; os EANs
+        devem estar em [0, LIMITE_EAN)
+
+        Returns:
+            tuple: (valores, encontrados) como np.ndarray; onde `encontrados`
+            é False o valor não tem significado
+        """
+        eans = np.asarray(eans, dtype=np.int64)
+        if not len(self.chaves):
+            return np.zeros(len(eans), dtype=np.int64), np.zeros(len(eans), dtype=bool)
+        posicoes = np.searchsorted(self.chaves, eans)
+        np.minimum(posicoes, len(self.chaves) - 1, out=posicoes)
+        encontrados = self.chaves[posicoes] == eans
+        return self.valores[posicoes], encontrados
+
+
+_indices = {}
+_lock = threading.Lock()
+
+
+def carregar_indice(armazem, versao: int) -> IndiceEAN:
+    """
+    Índice da versão, carregado uma vez por processo. Apenas as duas versões
+    mais recentes ficam abertas.
+    """
+    with _lock:
+        indice = _indices.get(versao)
+        if indice is None:
+            indice = IndiceEAN(armazem.diretorio_versao(versao))
+            _indices[versao] = indice
+            for antiga in sorted(_indices)[:-2]:
+                del _indices[antiga]
+        return indice
@@ -0,0 +1,166 @@
+"""
+Junção EAN -> estoque entre as abas 'Tabela' e 'Estoque'.
+
+A busca é vetorizada (tabela hash do pd.Index, sem passar por um dict
+Python) e vem com o diagnóstico das causas mais comuns de estoque errado:
+EANs repetidos no estoque, EANs da tabela sem estoque e EANs lidos com
+tipos diferentes nas duas abas (ex.: texto em uma e inteiro na outra).
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+
+import mudancas
+
+# EANs de exemplo guardados em cada item do diagnóstico
+EXEMPLOS = 10
+
+
+def tipo_ean(serie: pd.Series) -> str:
+    """Classe do tipo lido para a coluna EAN: 'inteiro', 'decimal' ou 'texto'"""
+    if pd.api.types.is_integer_dtype(serie):
+        return 'inteiro'
+    if pd.api.types.is_float_dtype(serie):
+        return 'decimal'
+    return 'texto'
+
+
+def chaves_ean(serie: pd.Series):
+    """
+    Converte a coluna EAN em chaves int64. EANs lidos como texto ou decimal
+    são aceitos quando representam um inteiro.
+
+    Returns:
+        tuple: (chaves, validos) como np.ndarray; onde `validos` é False
+        (vazio, não numérico ou com casas decimais) a chave é 0
+    """
+    numeros = pd.to_numeric(serie, errors='coerce')
+    if pd.api.types.is_integer_dtype(numeros):
+        return numeros.to_numpy(dtype=np.int64, na_value=0), numeros.notna().to_numpy()
+    valores = numeros.to_numpy(dtype='float64', na_value=np.nan)
+    validos = np.isfinite(valores)
+    validos[validos] = np.floor(valores[validos]) == valores[validos]
+    return np.where(validos, valores, 0).astype(np.int64), validos
+
+
+def estoques_numericos(serie: pd.Series) -> np.ndarray:
+    """Estoque de cada linha como int64; valores vazios ou não numéricos viram 0"""
+    numeros = pd.to_numeric(serie, errors='coerce')
+    if numeros.notna().sum() < serie.notna().sum():
+        logging.warning(f"Coluna '{serie.name}' tem valores não numéricos; eles contam como estoque 0.")
+    return numeros.to_numpy(dtype='float64', na_value=0).astype(np.int64)
+
+
+def buscar(indice: pd.Index, valores: np.ndarray, chaves: np.ndarray, validos: np.ndarray):
+    """
+    Busca as chaves no índice de EANs (sem repetições) com get_indexer
+
+    Returns:
+        tuple: (valores, encontrados) como np.ndarray; onde `encontrados` é
+        False o valor é 0
+    """
+    if not len(indice):
+        return np.zeros(len(chaves), dtype=np.int64), np.zeros(len(chaves), dtype=bool)
+    posicoes = indice.get_indexer(chaves)
+    encontrados = (posicoes >= 0) & validos
+    return np.where(encontrados, valores[posicoes], 0), encontrados
+
+
+class DiagnosticoJuncao:
+    def __init__(self):
+        """
+        Acumula o diagnóstico da junção; a aba 'Tabela' pode ser registrada
+        em vários blocos (veja blocos.run_blocos)
+        """
+        self.tipos = {}
+        self.invalidos = {}
+        self.convertidos = {}
+        self.duplicados = {'eans': 0, 'linhas': 0, 'divergentes': 0, 'exemplos': []}
+        self.sem_estoque = {'linhas': 0, 'exemplos': []}
+
+    def chaves(self, aba: str, serie: pd.Series):
+        """chaves_ean registrando o tipo lido e os EANs inválidos ou convertidos da aba"""
+        chaves, validos = chaves_ean(serie)
+        tipo = tipo_ean(serie)
+        self.tipos.setdefault(aba, set()).add(tipo)
+        self.invalidos[aba] = self.invalidos.get(aba, 0) + int(serie.notna().sum() - validos.sum())
+        if tipo != 'inteiro':
+            self.convertidos[aba] = self.convertidos.get(aba, 0) + int(validos.sum())
+        return chaves, validos
+
+    def registrar_duplicados(self, chaves: np.ndarray, estoques: np.ndarray):
+        """
+        Conta os EANs repetidos no estoque (só chaves válidas). Os que têm
+        estoques diferentes entre as repetições são os que mudam o resultado,
+        já que vale a última ocorrência.
+        """
+        repetidas = pd.Index(chaves).duplicated(keep=False)
+        if not repetidas.any():
+            return
+        distintos = pd.Series(estoques[repetidas]).groupby(chaves[repetidas]).nunique()
+        divergentes = distintos.index[distintos.to_numpy() > 1]
+        self.duplicados = {
+            'eans': len(distintos),
+            'linhas': int(repetidas.sum()) - len(distintos),
+            'divergentes': len(divergentes),
+            'exemplos': [int(ean) for ean in (divergentes if len(divergentes) else distintos.index)[:EXEMPLOS]],
+        }
+
+    def registrar_busca(self, chaves: np.ndarray, validos: np.ndarray, encontrados: np.ndarray):
+        """Conta as linhas da tabela com EAN válido que não estão no estoque"""
+        faltando = validos & ~encontrados
+        self.sem_estoque['linhas'] += int(faltando.sum())
+        restantes = EXEMPLOS - len(self.sem_estoque['exemplos'])
+        if restantes > 0:
+            self.sem_estoque['exemplos'] += [int(ean) for ean in chaves[faltando][:restantes]]
+
+    def resumo(self) -> dict:
+        """Diagnóstico serializável em JSON (vai para o manifesto da versão)"""
+        tipos = {aba: '/'.join(sorted(classes)) for aba, classes in self.tipos.items()}
+        return {
+            'tipos': tipos,
+            'tipos_divergentes': len(set(tipos.values())) > 1,
+            'invalidos': self.invalidos,
+            'convertidos': self.convertidos,
+            'duplicados_estoque': self.duplicados,
+            'sem_estoque': self.sem_estoque,
+        }
+
+    def registrar_log(self) -> dict:
+        """Registra avisos para os problemas encontrados e retorna o resumo"""
+        resumo = self.resumo()
+        if resumo['tipos_divergentes']:
+            logging.warning(f"EAN lido com tipos diferentes nas abas: {resumo['tipos']}; "
+                            f"{self.convertidos} valores convertidos para inteiro.")
+        for aba, quantidade in self.invalidos.items():
+            if quantidade:
+                logging.warning(f"Aba '{aba}': {quantidade} EANs não numéricos ou com casas decimais ignorados.")
+        if self.duplicados['eans']:
+            logging.warning(f"Estoque: {self.duplicados['eans']} EANs repetidos ({self.duplicados['linhas']} "
+                            f"linhas a mais), {self.duplicados['divergentes']} com estoques diferentes; "
+                            f"vale a última ocorrência. Ex.: {self.duplicados['exemplos']}")
+        if self.sem_estoque['linhas']:
+            logging.warning(f"Tabela: {self.sem_estoque['linhas']} linhas com EAN sem estoque (estoque 0). "
+                            f"Ex.: {self.sem_estoque['exemplos']}")
+        return resumo
+
+
+def juntar_estoque(eans_tabela: pd.Series, eans_estoque: pd.Series, estoques: pd.Series):
+    """
+    Estoque de cada linha da tabela. Para EANs repetidos no estoque vale a
+    última ocorrência; EANs sem estoque ficam com 0.
+
+    Returns:
+        tuple: (np.ndarray int64 com o estoque de cada linha da tabela, diagnóstico)
+    """
+    diagnostico = DiagnosticoJuncao()
+    chaves, validos = diagnostico.chaves('Estoque', eans_estoque)
+    chaves, valores = chaves[validos], estoques_numericos(estoques)[validos]
+    diagnostico.registrar_duplicados(chaves, valores)
+    ultimas = mudancas.ultimas_ocorrencias(chaves)
+
+    chaves_tabela, validos_tabela = diagnostico.chaves('Tabela', eans_tabela)
+    resultado, encontrados = buscar(pd.Index(chaves[ultimas]), valores[ultimas], chaves_tabela, validos_tabela)
+    diagnostico.registrar_busca(chaves_tabela, validos_tabela, encontrados)
+    return resultado, diagnostico.registrar_log()
@@ -0,0 +1,280 @@
+import itertools
+import logging
+
+import openpyxl
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from detector import amostra_estratificada, analisar_tipo_coluna
+from esquemas import impressao_digital, tipo_arrow
+
+
+def _nomes_colunas(cabecalho):
+    """
+    Normaliza a linha de cabeçalho como o pandas faz (colunas sem nome e repetidas)
+    """
+    nomes = []
+    vistos = {}
+    for i, valor in enumerate(cabecalho):
+        nome = f"Unnamed: {i}" if valor is None else str(valor)
+        if nome in vistos:
+            vistos[nome] += 1
+            nome = f"{nome}.{vistos[nome]}"
+        else:
+            vistos[nome] = 0
+        nomes.append(nome)
+    return nomes
+
+
+def _montar_array(valores, tipo=None):
+    """
+    Converte os valores de uma coluna em um array Arrow.
+
+    Com `tipo` (vindo do registro de esquemas) a inferência é pulada; se os
+    valores não couberem no tipo, retorna None. Sem `tipo`, números inteiros
+    gravados como float no Excel voltam a ser inteiros, e colunas com tipos
+    misturados caem para texto.
+    """
+    if tipo is not None:
+        try:
+            return pa.array(valores, type=tipo)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, ValueError, OverflowError):
+            return None
+
+    try:
+        array = pa.array(valores)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+        array = pa.array([None if v is None else str(v) for v in valores], type=pa.string())
+
+    if pa.types.is_floating(array.type) and array.null_count < len(array):
+        finitos = pc.is_finite(array)
+        if pc.all(finitos).as_py() and pc.all(pc.equal(pc.floor(array), array)).as_py():
+            array = array.cast(pa.int64())
+    return array
+
+
+def _detectar_tipos(tabela, nomes):
+    """Roda o detector nas colunas indicadas e monta as entradas do registro"""
+    colunas = {}
+    for nome in nomes:
+        coluna = tabela.column(nome)
+        tipo, confianca = analisar_tipo_coluna(coluna.to_pandas())
+        colunas[nome] = {'tipo': tipo, 'confianca': round(confianca, 2), 'arrow': str(coluna.type)}
+    return colunas
+
+
+def _verificar_deriva(tabela, esquema, nomes, tamanho_amostra=500):
+    """
+    Reclassifica uma amostra de cada coluna e retorna as que mudaram de tipo
+    em relação ao registro
+    """
+    mudaram = []
+    for nome in nomes:
+        serie = tabela.column(nome).to_pandas().dropna()
+        if len(serie) > tamanho_amostra:
+            serie = amostra_estratificada(serie, tamanho_amostra)
+        tipo, _ = analisar_tipo_coluna(serie)
+        registrado = esquema['colunas'][nome]['tipo']
+        if tipo != registrado and tipo != 'VAZIO':
+            logging.warning(f"Deriva na coluna '{nome}': registrado {registrado}, amostra indica {tipo}.")
+            mudaram.append(nome)
+    return mudaram
+
+
+def _indices_colunas(nomes, colunas):
+    """Posições das colunas desejadas no cabeçalho (None: todas)"""
+    if colunas is None:
+        return list(range(len(nomes)))
+    desejadas = set(colunas)
+    return [i for i, nome in enumerate(nomes) if nome in desejadas]
+
+
+def _linhas_selecionadas(linhas, indices):
+    """
+    Valores das colunas `indices` em cada linha. Linhas vazias no fim da aba
+    são descartadas, como no pd.read_excel; as do meio viram linhas nulas.
+    """
+    vazia = (None,) * len(indices)
+    vazias_pendentes = 0
+    for linha in linhas:
+        selecionados = [linha[i] if i < len(linha) else None for i in indices]
+        if all(v is None for v in selecionados):
+            vazias_pendentes += 1
+            continue
+        for _ in range(vazias_pendentes):
+            yield vazia
+        vazias_pendentes = 0
+        yield selecionados
+
+
+def _montar_tabela(planilha, cabecalho, nomes, indices, valores, registro=None, verificar_deriva=False):
+    """Monta a tabela Arrow com os valores lidos, usando e alimentando o registro de esquemas (veja ler_aba)"""
+    esquema = None
+    if registro is not None:
+        impressao = impressao_digital(planilha.title, cabecalho)
+        esquema = registro.obter(impressao)
+    registradas = esquema['colunas'] if esquema else {}
+
+    arrays = {}
+    sem_registro = []
+    for i, lista in zip(indices, valores):
+        nome = nomes[i]
+        array = None
+        if nome in registradas:
+            array = _montar_array(lista, tipo_arrow(registradas[nome]['arrow']))
+            if array is None:
+                logging.warning(f"Coluna '{nome}' não corresponde ao tipo registrado; inferindo novamente.")
+        if array is None:
+            array = _montar_array(lista)
+            sem_registro.append(nome)
+        arrays[nome] = array
+    tabela = pa.table(arrays)
+
+    if registro is not None:
+        if verificar_deriva and esquema is not None:
+            conferidas = [nome for nome in tabela.column_names if nome not in sem_registro]
+            sem_registro += _verificar_deriva(tabela, esquema, conferidas)
+        if sem_registro:
+            esquema = registro.registrar(impressao, planilha.title, nomes, _detectar_tipos(tabela, sem_registro))
+
+    return tabela, esquema
+
+
+def ler_aba(planilha, colunas=None, registro=None, verificar_deriva=False):
+    """
+    Lê uma aba de uma planilha aberta em modo read-only, linha a linha.
+
+    Args:
+        planilha: Aba do openpyxl (ReadOnlyWorksheet)
+        colunas (list): Colunas desejadas; None lê todas. Colunas ausentes são ignoradas.
+        registro (RegistroEsquemas): Se informado, o layout da aba é procurado no
+            registro; num acerto os tipos são passados explicitamente e a detecção
+            é pulada, numa falha os tipos detectados são registrados
+        verificar_deriva (bool): Num acerto, reclassifica uma amostra pequena e
+            atualiza o registro se algum tipo mudou
+
+    Returns:
+        tuple: (pa.Table com as colunas lidas, esquema registrado ou None)
+    """
+    linhas = planilha.iter_rows(values_only=True)
+    cabecalho = next(linhas, None)
+    if cabecalho is None:
+        return pa.table({}), None
+
+    nomes = _nomes_colunas(cabecalho)
+    indices = _indices_colunas(nomes, colunas)
+
+    valores = [[] for _ in indices]
+    for selecionados in _linhas_selecionadas(linhas, indices):
+        for lista, valor in zip(valores, selecionados):
+            lista.append(valor)
+
+    return _montar_tabela(planilha, cabecalho, nomes, indices, valores, registro, verificar_deriva)
+
+
+def ler_aba_em_blocos(planilha, colunas=None, tamanho_bloco=50000, registro=None, esquemas=None):
+    """
+    Lê uma aba em blocos de até `tamanho_bloco` linhas, sem materializar a aba inteira.
+
+    Os tipos das colunas são os do registro de esquemas ou, sem registro, os
+    inferidos no primeiro bloco (que alimentam o registro, como em ler_aba).
+    Todos os blocos saem com o mesmo esquema Arrow, para serem gravados em
+    sequência no mesmo parquet; colunas sem valores no primeiro bloco viram texto.
+
+    Args:
+        planilha: Aba do openpyxl (ReadOnlyWorksheet)
+        colunas (list): Colunas desejadas; None lê todas
+        tamanho_bloco (int): Linhas por bloco
+        registro (RegistroEsquemas): Registro de esquemas (veja ler_aba)
+        esquemas (dict): Se informado, recebe título da aba: esquema registrado
+
+    Yields:
+        pa.Table: Blocos da aba (ao menos um, vazio se a aba não tiver linhas)
+
+    Raises:
+        ValueError: Se um bloco tiver valores que não cabem no tipo de uma coluna
+    """
+    linhas = planilha.iter_rows(values_only=True)
+    cabecalho = next(linhas, None)
+    if cabecalho is None:
+        yield pa.table({})
+        return
+
+    nomes = _nomes_colunas(cabecalho)
+    indices = _indices_colunas(nomes, colunas)
+    selecionadas = _linhas_selecionadas(linhas, indices)
+
+    esquema_arrow = None
+    lidas = 0
+    while True:
+        bloco = list(itertools.islice(selecionadas, tamanho_bloco))
+        if not bloco and esquema_arrow is not None:
+            return
+        valores = [list(coluna) for coluna in zip(*bloco)] if bloco else [[] for _ in indices]
+
+        if esquema_arrow is None:
+            tabela, esquema = _montar_tabela(planilha, cabecalho, nomes, indices, valores, registro)
+            if esquemas is not None:
+                esquemas[planilha.title] = esquema
+            esquema_arrow = pa.schema([
+                campo.with_type(pa.string()) if pa.types.is_null(campo.type) else campo for campo in tabela.schema
+            ])
+            tabela = tabela.cast(esquema_arrow)
+        else:
+            arrays = []
+            for campo, lista in zip(esquema_arrow, valores):
+                array = _montar_array(lista, campo.type)
+                if array is None:
+                    try:
+                        array = _montar_array(lista).cast(campo.type)
+                    except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+                        raise ValueError(f"Coluna '{campo.name}' da aba '{planilha.title}' não cabe no tipo "
+                                         f"{campo.type} lido no início da aba (linhas {lidas + 2} a "
+                                         f"{lidas + len(bloco) + 1}): {e}")
+                arrays.append(array)
+            tabela = pa.Table.from_arrays(arrays, schema=esquema_arrow)
+
+        lidas += len(bloco)
+        yield tabela
+
+
+def ler_planilhas(arquivo, abas, registro=None, verificar_deriva=False, esquemas=None,
+                  ignorar_ausentes=False):
+    """
+    Lê várias abas de um arquivo Excel abrindo o workbook uma única vez.
+
+    O arquivo é aberto em modo read-only (streaming), então o openpyxl não monta
+    o modelo completo de células, e apenas as colunas pedidas são materializadas.
+
+    Args:
+        arquivo: Caminho ou objeto arquivo do Excel
+        abas (dict): Dicionário aba: lista de colunas (None para todas);
+            None lê todas as abas com todas as colunas
+        registro (RegistroEsquemas): Registro de esquemas (veja ler_aba)
+        verificar_deriva (bool): Confere uma amostra contra o registro (veja ler_aba)
+        esquemas (dict): Se informado, recebe aba: esquema registrado
+        ignorar_ausentes (bool): Abas pedidas que não existem no arquivo são
+            ignoradas em vez de gerar erro
+
+    Returns:
+        dict: Dicionário aba: DataFrame com dtypes Arrow
+    """
+    workbook = openpyxl.load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        if abas is None:
+            abas = dict.fromkeys(workbook.sheetnames)
+        resultado = {}
+        for aba, colunas in abas.items():
+            if aba not in workbook.sheetnames:
+                if ignorar_ausentes:
+                    continue
+                raise ValueError(f"Aba '{aba}' não encontrada na planilha.")
+            tabela, esquema = ler_aba(workbook[aba], colunas, registro, verificar_deriva)
+            logging.info(f"Aba '{aba}' lida: {tabela.num_rows} linhas, {tabela.num_columns} colunas.")
+            resultado[aba] = tabela.to_pandas(types_mapper=pd.ArrowDtype)
+            if esquemas is not None:
+                esquemas[aba] = esquema
+        return resultado
+    finally:
+        workbook.close()
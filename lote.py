@@ -0,0 +1,180 @@
+import io
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+import conversor
+from conversor import etapa
+
+EXTENSOES = ('.xlsx',)
+# Precedência quando o mesmo EAN aparece em mais de um arquivo do lote
+PRECEDENCIAS = ('ultimo', 'primeiro')
+
+
+def listar_diretorio(diretorio: str) -> list:
+    """Planilhas de um diretório do servidor, em ordem de nome"""
+    return [os.path.join(diretorio, nome) for nome in sorted(os.listdir(diretorio))
+            if nome.lower().endswith(EXTENSOES) and not nome.startswith('~$')]
+
+
+def _ler_arquivo(origem):
+    """
+    Lê um arquivo do lote (executado em um processo do pool)
+
+    Args:
+        origem: Caminho do arquivo ou seu conteúdo em bytes
+
+    Returns:
+        tuple: (planilhas, esquemas, segundos)
+    """
+    inicio = perf_counter()
+    arquivo = io.BytesIO(origem) if isinstance(origem, bytes) else origem
+    esquemas = {}
+    planilhas = conversor.ler(arquivo, esquemas, ignorar_ausentes=True)
+    if not planilhas:
+        raise ValueError("Nenhuma das abas 'Tabela' ou 'Estoque' encontrada.")
+    for aba, df in planilhas.items():
+        conversor.validar_dataframe(df, ['EAN'], aba)
+    return planilhas, esquemas, perf_counter() - inicio
+
+
+def mesclar(partes: list, precedencia: str = 'ultimo'):
+    """
+    Junta as linhas de uma aba vindas de vários arquivos
+
+    Para cada EAN ficam todas as linhas do arquivo de maior precedência que o
+    contém ('ultimo': o arquivo mais à frente na ordem do lote vence; 'primeiro':
+    o mais atrás). Linhas sem EAN são mantidas.
+
+    Args:
+        partes (list): DataFrames na ordem do lote
+        precedencia (str): 'ultimo' ou 'primeiro'
+
+    Returns:
+        tuple: (DataFrame mesclado, quantidade de EANs presentes em mais de um arquivo)
+    """
+    if precedencia not in PRECEDENCIAS:
+        raise ValueError(f"Precedência inválida: {precedencia}")
+    if len(partes) == 1:
+        return partes[0], 0
+
+    ordem = np.repeat(np.arange(len(partes)), [len(parte) for parte in partes])
+    df = pd.concat(partes, ignore_index=True)
+    eans = pd.to_numeric(df['EAN'], errors='coerce')
+
+    grupos = pd.Series(ordem).groupby(eans.to_numpy())
+    vencedora = grupos.transform('max' if precedencia == 'ultimo' else 'min').to_numpy()
+    conflitos = int((grupos.nunique() > 1).sum())
+
+    manter = eans.isna().to_numpy() | (ordem == vencedora)
+    return df[manter].reset_index(drop=True), conflitos
+
+
+def run_lote(origens, tempos=None, precedencia: str = 'ultimo', processos: int = None):
+    """
+    Importa vários arquivos em um único snapshot
+
+    Os arquivos são lidos em paralelo em um pool de processos, as abas são
+    mescladas por EAN (veja mesclar) e o resultado segue pelas mesmas etapas
+    de conversor.run. Arquivos que falharem são relatados e ignorados.
+
+    Args:
+        origens (list): Lista de (nome, caminho ou bytes), na ordem de precedência
+        tempos (dict): Dicionário que recebe a duração de cada etapa (opcional)
+        precedencia (str): Regra para EANs repetidos entre arquivos ('ultimo' ou 'primeiro')
+        processos (int): Processos do pool (padrão: CPUs disponíveis)
+
+    Returns:
+        dict: Relatório com versão, vazão, linhas, conflitos e falhas por arquivo
+
+    Raises:
+        ValueError: Se nenhum arquivo puder ser lido ou faltar uma das abas no lote inteiro
+    """
+    if tempos is None:
+        tempos = {}
+    if precedencia not in PRECEDENCIAS:
+        raise ValueError(f"Precedência inválida: {precedencia}")
+    inicio = perf_counter()
+    origens = list(origens)
+    lidos = {}
+    falhas = {}
+
+    with etapa('leitura', tempos) as medida:
+        logging.info(f"Lendo {len(origens)} arquivos do lote...")
+        processos = min(processos or os.cpu_count() or 1, max(1, len(origens)))
+        with ProcessPoolExecutor(max_workers=processos) as executor:
+            futuros = {executor.submit(_ler_arquivo, origem): (i, nome) for i, (nome, origem) in enumerate(origens)}
+            for futuro in as_completed(futuros):
+                i, nome = futuros[futuro]
+                try:
+                    lidos[i] = futuro.result()
+                    medida.contar(lidos[i][0])
+                    logging.info(f"Arquivo '{nome}' lido em {lidos[i][2]:.2f}s")
+                except Exception as e:
+                    logging.error(f"Arquivo '{nome}' falhou: {e}")
+                    falhas[nome] = f"{type(e).__name__}: {e}"
+    if not lidos:
+        raise ValueError("Nenhum arquivo do lote pôde ser lido.")
+
+    with etapa('mesclagem', tempos) as medida:
+        logging.info(f"Mesclando {len(lidos)} arquivos por EAN (precedência: {precedencia})...")
+        planilhas = {}
+        esquemas = {}
+        conflitos = {}
+        linhas_lidas = {}
+        for aba in conversor.COLUNAS_LEITURA:
+            partes = [lidos[i][0][aba] for i in sorted(lidos) if aba in lidos[i][0]]
+            if not partes:
+                continue
+            linhas_lidas[aba] = sum(len(parte) for parte in partes)
+            planilhas[aba], conflitos[aba] = mesclar(partes, precedencia)
+            esquemas[aba] = next((lidos[i][1][aba] for i in sorted(lidos) if aba in lidos[i][1]), None)
+        medida.contar(planilhas)
+
+    with etapa('validacao', tempos) as medida:
+        conversor.validar(planilhas)
+        medida.contar(planilhas)
+
+    with etapa('mapeamento', tempos) as medida:
+        diagnostico = conversor.mapear_estoque(planilhas['Tabela'], planilhas['Estoque'])
+        medida.contar(linhas=len(planilhas['Tabela']) + len(planilhas['Estoque']))
+
+    with etapa('compactacao', tempos) as medida:
+        conversor.compactar(planilhas, esquemas)
+        medida.contar(planilhas)
+
+    arquivos = [nome for i, (nome, _) in enumerate(origens) if i in lidos]
+    versao = conversor.publicar(planilhas, esquemas, tempos, metadados={
+        'lote': {'arquivos': arquivos, 'falhas': falhas, 'precedencia': precedencia},
+        'juncao': diagnostico,
+    })
+
+    duracao = perf_counter() - inicio
+    total_linhas = sum(linhas_lidas.values())
+    relatorio = {
+        'versao': versao,
+        'arquivos': len(origens),
+        'importados': len(lidos),
+        'falhas': falhas,
+        'linhas_lidas': linhas_lidas,
+        'linhas_publicadas': {aba: len(df) for aba, df in planilhas.items()},
+        'conflitos_ean': conflitos,
+        'juncao': diagnostico,
+        'duracao_s': round(duracao, 3),
+        'planilhas_por_s': round(len(lidos) / duracao, 2),
+        'linhas_por_s': round(total_linhas / duracao),
+    }
+    logging.info(f"Lote concluído! Versão {versao} publicada. {relatorio}")
+    return relatorio
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit("Uso: python lote.py <diretorio | arquivo.xlsx ...>")
+    caminhos = listar_diretorio(sys.argv[1]) if os.path.isdir(sys.argv[1]) else sys.argv[1:]
+    run_lote([(os.path.basename(caminho), caminho) for caminho in caminhos])
@@ -1,58 +1,223 @@
+import numpy as np
 import pandas as pd
 from time import time
 
+import itertools
+import logging
+import queue
+import re
 import sqlite3
-from typing import List, Tuple, Any, Optional, Union
+import sys
+import threading
+import unicodedata
+from contextlib import contextmanager
+from typing import List, Tuple, Any, Optional, Union, Iterable, Iterator
+
+from mudancas import REMOCAO
+
+
+class DatabaseError(Exception):
+    """Erro base do SQLiteCRUD"""
+
+
+class DatabaseConnectionError(DatabaseError):
+    """Falha ao abrir ou configurar uma conexão"""
+
+
+class SchemaError(DatabaseError):
+    """Tabela existente incompatível com o esquema da planilha"""
+
+
+class QueryError(DatabaseError):
+    def __init__(self, message: str, query: Optional[str] = None, params: Any = None):
+        """
+        Falha ao executar uma query
+        
+        Args:
+            message (str): Descrição do erro
+            query (str): Query que falhou
+            params: Parâmetros da query
+        """
+        super().__init__(message)
+        self.query = query
+        self.params = params
+
 
 class SQLiteCRUD:
-    def __init__(self, db_path: str = "database.db"):
+    # WAL permite leitores concorrentes com um escritor; synchronous=NORMAL só
+    # faz fsync no checkpoint; cache_size negativo é em KiB (64 MiB)
+    DEFAULT_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -65536,
+        'temp_store': 'MEMORY',
+    }
+    # Statements preparados mantidos em cache por conexão
+    STATEMENT_CACHE_SIZE = 256
+    # Segundos esperando o lock de escrita de outro processo antes de falhar
+    BUSY_TIMEOUT = 30.0
+
+    def __init__(self, db_path: str = "database.db", pragmas: Optional[dict] = None,
+                 pool_size: int = 8):
         """
-        Inicializa a conexão com o banco de dados SQLite
+        Gerencia as conexões com o banco de dados SQLite
+        
+        Leituras usam um pool limitado de conexões somente leitura, que rodam
+        em paralelo graças ao WAL; escritas passam por uma única conexão,
+        serializada por um lock. As conexões são abertas sob demanda e
+        reaproveitadas entre threads, com cache de statements preparados.
         
         Args:
             db_path (str): Caminho para o arquivo do banco de dados
+            pragmas (dict): PRAGMAs aplicados nas conexões (padrão: DEFAULT_PRAGMAS)
+            pool_size (int): Máximo de conexões de leitura abertas
         """
         self.db_path = db_path
-        self.connection = None
-        self.connect()
+        self.pragmas = self.DEFAULT_PRAGMAS if pragmas is None else pragmas
+        self.pool_size = pool_size
+        self._pool = queue.LifoQueue()
+        self._readers = 0
+        self._pool_lock = threading.Lock()
+        self._writer = None
+        self._write_lock = threading.RLock()
+        self._closed = False
+        # Um banco em memória só existe dentro da conexão que o criou, então
+        # leituras e escritas compartilham a conexão de escrita
+        self._shared = db_path == ":memory:" or db_path.startswith("file::memory:")
     
-    def connect(self) -> None:
-        """Estabelece conexão com o banco de dados"""
+    def connect(self, read_only: bool = False) -> sqlite3.Connection:
+        """
+        Abre uma nova conexão configurada com o banco de dados
+        
+        A conexão fica em autocommit (isolation_level=None): as transações são
+        abertas explicitamente em transaction().
+        
+        Args:
+            read_only (bool): Ativa PRAGMA query_only na conexão
+            
+        Returns:
+            sqlite3.Connection: Conexão que pode ser usada por qualquer thread,
+            uma de cada vez
+        """
         try:
-            self.connection = sqlite3.connect(self.db_path)
-            self.connection.row_factory = sqlite3.Row  # Para retornar dicionários
-            print(f"Conexão com {self.db_path} estabelecida com sucesso!")
+            connection = sqlite3.connect(self.db_path, timeout=self.BUSY_TIMEOUT, isolation_level=None,
+                                         check_same_thread=False,
+                                         cached_statements=self.STATEMENT_CACHE_SIZE)
         except sqlite3.Error as e:
-            print(f"Erro ao conectar com o banco de dados: {e}")
+            raise DatabaseConnectionError(f"Erro ao conectar com {self.db_path}: {e}") from e
+        try:
+            connection.row_factory = sqlite3.Row  # Para retornar dicionários
+            for pragma, value in self.pragmas.items():
+                connection.execute(f"PRAGMA {pragma} = {value}")
+            if read_only:
+                connection.execute("PRAGMA query_only = 1")
+        except sqlite3.Error as e:
+            connection.close()
+            raise DatabaseConnectionError(f"Erro ao configurar a conexão com {self.db_path}: {e}") from e
+        logging.info(f"Conexão {'de leitura ' if read_only else ''}com {self.db_path} estabelecida")
+        return connection
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """
+        Empresta uma conexão de leitura do pool, abrindo uma nova enquanto o
+        pool não estiver cheio; depois disso espera uma ser devolvida
+        """
+        if self._closed:
+            raise DatabaseConnectionError("Banco de dados fechado")
+        if self._shared:
+            with self.writer() as connection:
+                yield connection
+            return
+
+        try:
+            connection = self._pool.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                create = self._readers < self.pool_size
+                if create:
+                    self._readers += 1
+            if create:
+                try:
+                    connection = self.connect(read_only=True)
+                except DatabaseConnectionError:
+                    with self._pool_lock:
+                        self._readers -= 1
+                    raise
+            else:
+                connection = self._pool.get()
+
+        try:
+            yield connection
+        finally:
+            if connection.in_transaction:
+                connection.rollback()
+            if self._closed:
+                connection.close()
+            else:
+                self._pool.put(connection)
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """Conexão de escrita única; o acesso é serializado entre as threads"""
+        with self._write_lock:
+            if self._closed:
+                raise DatabaseConnectionError("Banco de dados fechado")
+            if self._writer is None:
+                self._writer = self.connect()
+            yield self._writer
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Transação de escrita (BEGIN IMMEDIATE ... COMMIT, ROLLBACK em erro)
+        
+        Chamadas aninhadas na mesma thread participam da transação externa,
+        então várias operações podem ser agrupadas em um único commit.
+        """
+        with self.writer() as connection:
+            if connection.in_transaction:
+                yield connection
+                return
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                connection.rollback()
+                raise
+            connection.commit()
     
     def execute_query(self, query: str, params: Tuple = ()) -> Optional[List[dict]]:
         """
         Executa uma query genérica no banco de dados
         
+        SELECTs usam uma conexão de leitura do pool; as demais queries rodam
+        na conexão de escrita, dentro de uma transação.
+        
         Args:
             query (str): Query SQL a ser executada
             params (Tuple): Parâmetros para a query
             
         Returns:
             Optional[List[dict]]: Resultado da consulta ou None para operações sem retorno
+            
+        Raises:
+            QueryError: Se a query falhar
         """
         try:
-            cursor = self.connection.cursor()
-            cursor.execute(query, params)
-            
             # Se for SELECT, retorna os resultados
             if query.strip().upper().startswith('SELECT'):
-                results = cursor.fetchall()
+                with self.reader() as connection:
+                    results = connection.execute(query, params).fetchall()
                 return [dict(row) for row in results]
-            else:
-                # Para INSERT, UPDATE, DELETE - faz commit
-                self.connection.commit()
-                return None
-                
-        except sqlite3.Error as e:
-            print(f"Erro ao executar query: {e}")
-            self.connection.rollback()
+
+            # Para INSERT, UPDATE, DELETE - faz commit
+            with self.transaction() as connection:
+                connection.execute(query, params)
             return None
+        # OverflowError: parâmetro inteiro fora do INTEGER de 64 bits do SQLite
+        except (sqlite3.Error, OverflowError) as e:
+            raise QueryError(f"Erro ao executar query: {e}", query, params) from e
     
     def create_table(self, table_name: str, columns: dict) -> bool:
         """
@@ -63,15 +228,54 @@ class SQLiteCRUD:
             columns (dict): Dicionário com nome: tipo das colunas
             
         Returns:
-            bool: True se sucesso, False se erro
+            bool: True se sucesso
+            
+        Raises:
+            QueryError: Se a operação falhar
         """
         columns_def = ", ".join([f"{col_name} {col_type}" 
                                for col_name, col_type in columns.items()])
         
         query = f"CREATE TABLE IF NOT EXISTS {table_name} ({columns_def})"
-        result = self.execute_query(query)
-        return result is None  # Retorna True se não houve erro
+        self.execute_query(query)
+        return True
     
+    def create_index(self, table_name: str, columns: Union[str, List[str]],
+                     unique: bool = False, index_name: Optional[str] = None) -> bool:
+        """
+        Cria um índice na tabela
+        
+        Args:
+            table_name (str): Nome da tabela
+            columns (str | list): Coluna ou colunas do índice
+            unique (bool): Cria um índice único
+            index_name (str): Nome do índice (padrão: idx_<tabela>_<colunas>)
+            
+        Returns:
+            bool: True se sucesso
+            
+        Raises:
+            QueryError: Se a operação falhar
+        """
+        if isinstance(columns, str):
+            columns = [columns]
+        index_name = index_name or f"idx_{table_name}_{'_'.join(columns)}"
+        query = (f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {index_name} "
+                 f"ON {table_name} ({', '.join(columns)})")
+        self.execute_query(query)
+        return True
+
+    def table_columns(self, table_name: str) -> List[str]:
+        """
+        Lista as colunas de uma tabela (vazia se a tabela não existir)
+        """
+        try:
+            with self.reader() as connection:
+                rows = connection.execute(f"PRAGMA table_info({table_name})").fetchall()
+        except sqlite3.Error as e:
+            raise QueryError(f"Erro ao listar colunas: {e}") from e
+        return [row["name"] for row in rows]
+
     def insert(self, table_name: str, data: dict) -> bool:
         """
         Insere um registro na tabela
@@ -81,17 +285,189 @@ class SQLiteCRUD:
             data (dict): Dicionário com coluna: valor
             
         Returns:
-            bool: True se sucesso, False se erro
+            bool: True se sucesso
+            
+        Raises:
+            QueryError: Se a operação falhar
         """
         columns = ", ".join(data.keys())
         placeholders = ", ".join(["?" for _ in data])
         query = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
         
-        result = self.execute_query(query, tuple(data.values()))
-        return result is None
+        self.execute_query(query, tuple(data.values()))
+        return True
     
+    @staticmethod
+    def _rows(data: Union[pd.DataFrame, Iterable], columns: Optional[List[str]],
+              chunk_size: int) -> Tuple[List[str], Iterator[List[tuple]]]:
+        """
+        Normaliza DataFrame, dicionários ou tuplas em colunas + blocos de tuplas
+
+        Valores do pandas/NumPy são convertidos para tipos Python e NaN vira NULL.
+        """
+        if isinstance(data, pd.DataFrame):
+            columns = list(data.columns) if columns is None else columns
+
+            def chunks():
+                for start in range(0, len(data), chunk_size):
+                    chunk = data.iloc[start:start + chunk_size][columns].astype(object)
+                    chunk = chunk.where(chunk.notna(), None)
+                    yield list(chunk.itertuples(index=False, name=None))
+            return columns, chunks()
+
+        iterator = iter(data)
+        first = next(iterator, None)
+        if first is None:
+            return columns or [], iter(())
+        if isinstance(first, dict):
+            columns = list(first.keys()) if columns is None else columns
+            iterator = (tuple(row[col] for col in columns) for row in itertools.chain([first], iterator))
+        else:
+            if columns is None:
+                raise ValueError("Informe 'columns' ao inserir tuplas")
+            iterator = itertools.chain([tuple(first)], (tuple(row) for row in iterator))
+
+        def chunks():
+            while True:
+                chunk = list(itertools.islice(iterator, chunk_size))
+                if not chunk:
+                    return
+                yield chunk
+        return columns, chunks()
+
+    def _executemany(self, query: str, chunks: Iterator[List[tuple]]) -> bool:
+        """Executa todos os blocos em uma única transação explícita"""
+        try:
+            with self.transaction() as connection:
+                for chunk in chunks:
+                    connection.executemany(query, chunk)
+            return True
+        except (sqlite3.Error, OverflowError) as e:
+            raise QueryError(f"Erro ao executar carga em lote: {e}", query) from e
+
+    def bulk_insert(self, table_name: str, data: Union[pd.DataFrame, Iterable],
+                    chunk_size: int = 5000, columns: Optional[List[str]] = None) -> bool:
+        """
+        Insere vários registros com executemany em uma única transação
+        
+        Args:
+            table_name (str): Nome da tabela
+            data: DataFrame, iterável de dicionários ou iterável de tuplas
+            chunk_size (int): Quantidade de linhas por chamada ao executemany
+            columns (list): Colunas (obrigatório para tuplas; para DataFrame e
+                dicionários, seleciona as colunas)
+            
+        Returns:
+            bool: True se sucesso
+            
+        Raises:
+            QueryError: Se a operação falhar
+        """
+        columns, chunks = self._rows(data, columns, chunk_size)
+        if not columns:
+            return True
+        placeholders = ", ".join(["?" for _ in columns])
+        query = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})"
+        return self._executemany(query, chunks)
+
+    def bulk_upsert(self, table_name: str, data: Union[pd.DataFrame, Iterable],
+                    chunk_size: int = 5000, columns: Optional[List[str]] = None,
+                    conflict_columns: Union[str, List[str]] = "ean") -> bool:
+        """
+        Insere ou atualiza vários registros (INSERT ... ON CONFLICT DO UPDATE)
+        
+        Args:
+            table_name (str): Nome da tabela
+            data: DataFrame, iterável de dicionários ou iterável de tuplas
+            chunk_size (int): Quantidade de linhas por chamada ao executemany
+            columns (list): Colunas (veja bulk_insert)
+            conflict_columns (str | list): Colunas da chave única usada no conflito
+            
+        Returns:
+            bool: True se sucesso
+            
+        Raises:
+            QueryError: Se a operação falhar
+        """
+        if isinstance(conflict_columns, str):
+            conflict_columns = [conflict_columns]
+        columns, chunks = self._rows(data, columns, chunk_size)
+        if not columns:
+            return True
+
+        placeholders = ", ".join(["?" for _ in columns])
+        updates = [f"{col} = excluded.{col}" for col in columns if col not in conflict_columns]
+        action = f"DO UPDATE SET {', '.join(updates)}" if updates else "DO NOTHING"
+        query = (f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders}) "
+                 f"ON CONFLICT({', '.join(conflict_columns)}) {action}")
+        return self._executemany(query, chunks)
+
+    def delete_missing(self, table_name: str, column: str, keys: Iterable,
+                       chunk_size: int = 5000) -> Optional[int]:
+        """
+        Remove os registros cujo valor em `column` não está em `keys`
+        
+        As chaves são carregadas em uma tabela temporária e a remoção é feita
+        com um único DELETE ... NOT IN, em uma transação.
+        
+        Args:
+            table_name (str): Nome da tabela
+            column (str): Coluna comparada (normalmente a chave primária)
+            keys: Iterável com as chaves que devem permanecer
+            chunk_size (int): Quantidade de chaves por chamada ao executemany
+            
+        Returns:
+            int: Quantidade de registros removidos
+            
+        Raises:
+            QueryError: Se a remoção falhar
+        """
+        _, chunks = self._rows(((key,) for key in keys), ["key"], chunk_size)
+        try:
+            with self.transaction() as connection:
+                connection.execute("CREATE TEMP TABLE IF NOT EXISTS _keep_keys (key PRIMARY KEY)")
+                connection.execute("DELETE FROM temp._keep_keys")
+                for chunk in chunks:
+                    connection.executemany("INSERT OR IGNORE INTO temp._keep_keys VALUES (?)", chunk)
+                cursor = connection.execute(
+                    f"DELETE FROM {table_name} WHERE {column} NOT IN (SELECT key FROM temp._keep_keys)")
+                removed = cursor.rowcount
+                connection.execute("DELETE FROM temp._keep_keys")
+            return removed
+        except (sqlite3.Error, OverflowError) as e:
+            raise QueryError(f"Erro ao remover registros ausentes: {e}") from e
+
+    def bulk_delete(self, table_name: str, keys: Iterable, column: str = "ean",
+                    chunk_size: int = 5000) -> int:
+        """
+        Remove os registros cujo valor em `column` está em `keys`
+        
+        Args:
+            table_name (str): Nome da tabela
+            keys: Iterável com as chaves a remover
+            column (str): Coluna comparada (normalmente a chave primária)
+            chunk_size (int): Quantidade de chaves por chamada ao executemany
+            
+        Returns:
+            int: Quantidade de registros removidos
+            
+        Raises:
+            QueryError: Se a remoção falhar
+        """
+        query = f"DELETE FROM {table_name} WHERE {column} = ?"
+        _, chunks = self._rows(((key,) for key in keys), [column], chunk_size)
+        removed = 0
+        try:
+            with self.transaction() as connection:
+                for chunk in chunks:
+                    removed += connection.executemany(query, chunk).rowcount
+            return removed
+        except (sqlite3.Error, OverflowError) as e:
+            raise QueryError(f"Erro ao remover registros: {e}", query) from e
+
     def select(self, table_name: str, where: str = None, 
-               params: Tuple = (), columns: str = "*") -> Optional[List[dict]]:
+               params: Tuple = (), columns: str = "*",
+               order_by: Optional[str] = None, limit: Optional[int] = None) -> List[dict]:
         """
         Seleciona registros da tabela
         
@@ -100,13 +476,20 @@ class SQLiteCRUD:
             where (str): Condição WHERE (opcional)
             params (Tuple): Parâmetros para a condição WHERE
             columns (str): Colunas a selecionar (padrão: *)
+            order_by (str): Cláusula ORDER BY (opcional)
+            limit (int): Máximo de registros (opcional)
             
         Returns:
-            Optional[List[dict]]: Lista de registros ou None se erro
+            List[dict]: Lista de registros
         """
         query = f"SELECT {columns} FROM {table_name}"
         if where:
             query += f" WHERE {where}"
+        if order_by:
+            query += f" ORDER BY {order_by}"
+        if limit is not None:
+            query += " LIMIT ?"
+            params = tuple(params) + (int(limit),)
         
         return self.execute_query(query, params)
     
@@ -124,7 +507,7 @@ class SQLiteCRUD:
         Returns:
             Optional[dict]: Um registro ou None se não encontrado
         """
-        results = self.select(table_name, where, params, columns)
+        results = self.select(table_name, where, params, columns, limit=1)
         return results[0] if results else None
     
     def update(self, table_name: str, data: dict, 
@@ -139,7 +522,10 @@ class SQLiteCRUD:
             params (Tuple): Parâmetros para a condição WHERE
             
         Returns:
-            bool: True se sucesso, False se erro
+            bool: True se sucesso
+            
+        Raises:
+            QueryError: Se a operação falhar
         """
         set_clause = ", ".join([f"{col} = ?" for col in data.keys()])
         query = f"UPDATE {table_name} SET {set_clause} WHERE {where}"
@@ -147,8 +533,8 @@ class SQLiteCRUD:
         # Combina os valores de data com os parâmetros do WHERE
         all_params = tuple(data.values()) + params
         
-        result = self.execute_query(query, all_params)
-        return result is None
+        self.execute_query(query, all_params)
+        return True
     
     def delete(self, table_name: str, where: str, params: Tuple = ()) -> bool:
         """
@@ -160,17 +546,28 @@ class SQLiteCRUD:
             params (Tuple): Parâmetros para a condição WHERE
             
         Returns:
-            bool: True se sucesso, False se erro
+            bool: True se sucesso
+            
+        Raises:
+            QueryError: Se a operação falhar
         """
         query = f"DELETE FROM {table_name} WHERE {where}"
-        result = self.execute_query(query, params)
-        return result is None
+        self.execute_query(query, params)
+        return True
     
     def close(self) -> None:
-        """Fecha a conexão com o banco de dados"""
-        if self.connection:
-            self.connection.close()
-            print("Conexão fechada!")
+        """Fecha as conexões com o banco de dados (as emprestadas fecham ao voltar)"""
+        with self._write_lock:
+            self._closed = True
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+        logging.info(f"Conexões com {self.db_path} fechadas")
     
     def __enter__(self):
         """Suporte para context manager"""
@@ -200,46 +597,267 @@ alias = {
     'Estoque': 'estoque'
 }
 
-input_file = "tabela.xlsx"
-# pd.set_option('display.max_columns', None)
+# Tipo SQLite para cada tipo do detector
+TIPOS_SQL = {
+    'INTEIRO': 'INTEGER',
+    'DECIMAL': 'REAL',
+    'BOOLEANO': 'INTEGER',
+    'DATA': 'TEXT',
+    'HORA': 'TEXT',
+    'STRING': 'TEXT',
+    'VAZIO': 'TEXT',
+}
 
-# t1 = time()
-# df = pd.read_excel(
-#     "tabela.xlsx", 
-#     engine="openpyxl",
-#     sheet_name=[0,1]
-# )
-# print(time() - t1)
+# Colunas conhecidas têm tipo fixo, independente do que o detector encontrar
+# na planilha (ex.: uma coluna de preço só com valores inteiros continua REAL)
+TIPOS_COLUNAS = {
+    'ean': 'INTEGER',
+    'codigo': 'INTEGER',
+    'cod_produto': 'INTEGER',
+    'cod_fornecedor': 'INTEGER',
+    'preco_base': 'REAL',
+    'desconto': 'REAL',
+    'st': 'REAL',
+    'preco_final': 'REAL',
+    'estoque': 'INTEGER',
+    'estoque_andamento': 'INTEGER',
+    'estoque_existente': 'INTEGER',
+    'estoque_disponivel': 'INTEGER',
+}
 
-# print(df)
+CHAVE_PRIMARIA = 'ean'
+INDICES = ['cod_produto', 'cod_fornecedor']
+# Versão do armazém de snapshots gravada em cada tabela, para aplicar só o delta
+TABELA_SINCRONIZACAO = '_sincronizacao'
+# Banco sincronizado pelas importações (conversor) e lido pelo microservico,
+# quando RESTOQUE_BANCO não é definido
+BANCO_PADRAO = 'database.db'
 
-# abas = pd.ExcelFile("tabela.xlsx", engine="openpyxl").sheet_names
 
-# df = pd.read_excel(
-#     input_file,
-#     engine="openpyxl",
-#     sheet_name=abas
-# )
+def nome_sql(nome: str) -> str:
+    """
+    Nome de tabela/coluna no banco: o alias, ou o texto sem acentos em snake_case
+    """
+    if nome in alias:
+        return alias[nome]
+    texto = unicodedata.normalize('NFKD', str(nome)).encode('ascii', 'ignore').decode()
+    texto = re.sub(r'[^0-9a-zA-Z]+', '_', texto).strip('_').lower()
+    if not texto or texto[0].isdigit():
+        texto = f"c_{texto}"
+    return texto
 
-# print(df)
 
+def esquema_sql(df: pd.DataFrame, esquema: Optional[dict] = None) -> dict:
+    """
+    Monta o dicionário coluna: tipo usado no create_table
+    
+    Args:
+        df (pd.DataFrame): Aba lida, com os cabeçalhos originais
+        esquema (dict): Esquema registrado da aba (esquemas.RegistroEsquemas);
+            sem ele o tipo sai do dtype da coluna
+            
+    Returns:
+        dict: Dicionário cabeçalho: (coluna_sql, tipo)
+    """
+    registradas = esquema['colunas'] if esquema else {}
+    colunas = {}
+    usados = set()
+    for cabecalho in df.columns:
+        nome = nome_sql(cabecalho)
+        while nome in usados:
+            nome = f"{nome}_"
+        usados.add(nome)
+
+        if nome in TIPOS_COLUNAS:
+            tipo = TIPOS_COLUNAS[nome]
+        elif cabecalho in registradas:
+            tipo = TIPOS_SQL.get(registradas[cabecalho]['tipo'], 'TEXT')
+        elif pd.api.types.is_integer_dtype(df[cabecalho]) or pd.api.types.is_bool_dtype(df[cabecalho]):
+            tipo = 'INTEGER'
+        elif pd.api.types.is_float_dtype(df[cabecalho]):
+            tipo = 'REAL'
+        else:
+            tipo = 'TEXT'
+
+        if nome == CHAVE_PRIMARIA:
+            # INTEGER PRIMARY KEY vira o rowid: a busca por EAN não precisa de índice extra
+            tipo = 'INTEGER PRIMARY KEY'
+        colunas[cabecalho] = (nome, tipo)
+    return colunas
 
 
-arquivo = "seuarquivo.xlsx"
-xls = pd.ExcelFile(input_file)
+def versao_sincronizada(db: SQLiteCRUD, tabela: str) -> Optional[int]:
+    """Versão do armazém de snapshots da última gravação da tabela (None se não veio de um snapshot)"""
+    db.create_table(TABELA_SINCRONIZACAO, {'tabela': 'TEXT PRIMARY KEY', 'versao': 'INTEGER'})
+    registro = db.select_one(TABELA_SINCRONIZACAO, "tabela = ?", (tabela,))
+    return registro['versao'] if registro else None
 
 
-print("Abas encontradas:", xls.sheet_names)
-colunas_encontradas = []
+def sincronizar_dataframe(db: SQLiteCRUD, aba: str, df: pd.DataFrame, esquema: Optional[dict] = None,
+                          mudancas: Optional[pd.DataFrame] = None, versao: Optional[int] = None,
+                          base: Optional[int] = None, chunk_size: int = 5000,
+                          remover_ausentes: bool = True) -> dict:
+    """
+    Grava uma aba já lida no banco SQLite
+    
+    A aba vira uma tabela (nome da aba em snake_case) com as colunas do
+    cabeçalho, tipadas pelo registro de esquemas, chave primária no EAN e
+    índices em cod_produto/cod_fornecedor. As linhas entram com bulk_upsert,
+    em blocos; EANs repetidos ficam com a última linha, como no conversor.
+    
+    Se a tabela já estiver na versão `base` do armazém, só as `mudancas`
+    (veja mudancas.calcular_mudancas) são aplicadas; senão a aba inteira é gravada.
+    
+    Args:
+        db (SQLiteCRUD): Banco de destino
+        aba (str): Nome da aba
+        df (pd.DataFrame): Linhas da aba, com os cabeçalhos originais
+        esquema (dict): Esquema registrado da aba (veja esquema_sql)
+        mudancas (pd.DataFrame): Delta da aba em relação à versão `base`
+        versao (int): Versão do armazém gravada (None se não veio de um snapshot)
+        base (int): Versão a partir da qual o delta foi calculado
+        chunk_size (int): Linhas por bloco no bulk_upsert
+        remover_ausentes (bool): Na carga completa, remove os EANs que não estão mais na aba
+        
+    Returns:
+        dict: {'tabela', 'linhas', 'removidas', 'delta'}
+        
+    Raises:
+        QueryError: Se a gravação falhar (a tabela fica como estava)
+    """
+    return sincronizar_lotes(db, aba, [df], esquema, None if mudancas is None else [mudancas],
+                             versao, base, chunk_size, remover_ausentes)
+
 
-for aba in xls.sheet_names:
-    df = pd.read_excel(input_file, sheet_name=aba, nrows=0)
-    #print(f"\nAba: {aba}")
-    #print(df.columns.tolist())
-    colunas_encontradas.extend(df.columns.tolist())
+def sincronizar_lotes(db: SQLiteCRUD, aba: str, lotes: Iterable[pd.DataFrame], esquema: Optional[dict] = None,
+                      mudancas: Optional[Iterable[pd.DataFrame]] = None, versao: Optional[int] = None,
+                      base: Optional[int] = None, chunk_size: int = 5000,
+                      remover_ausentes: bool = True) -> dict:
+    """
+    Grava uma aba no banco SQLite a partir de blocos de linhas (veja sincronizar_dataframe)
+    
+    Só um bloco fica em memória por vez; da carga completa sobram apenas os
+    EANs gravados, para remover os ausentes no fim.
     
+    Args:
+        lotes: Iterável de DataFrames com as linhas da aba, em ordem (ao menos um)
+        mudancas: Iterável de DataFrames com o delta em relação à versão `base`
+        (os demais como em sincronizar_dataframe)
+        
+    Returns:
+        dict: {'tabela', 'linhas', 'removidas', 'delta'}
+        
+    Raises:
+        SchemaError: Se a tabela já existe sem a chave primária da planilha
+        QueryError: Se a gravação falhar (a tabela fica como estava)
+    """
+    lotes = iter(lotes)
+    primeiro = next(lotes)
+    tabela = nome_sql(aba)
+    colunas = esquema_sql(primeiro, esquema)
+    definicao = dict(colunas.values())
+    nomes = {cabecalho: nome for cabecalho, (nome, _) in colunas.items()}
+
+    existentes = db.table_columns(tabela)
+    if not existentes:
+        db.create_table(tabela, definicao)
+    else:
+        for nome, tipo in definicao.items():
+            if nome not in existentes:
+                if tipo.endswith('PRIMARY KEY'):
+                    raise SchemaError(f"A tabela '{tabela}' já existe sem a chave primária '{nome}'")
+                db.execute_query(f"ALTER TABLE {tabela} ADD COLUMN {nome} {tipo}")
+
+    for coluna in INDICES:
+        if coluna in definicao:
+            db.create_index(tabela, coluna)
+
+    sincronizada = versao_sincronizada(db, tabela)
+    usar_delta = (mudancas is not None and base is not None and CHAVE_PRIMARIA in definicao
+                  and sincronizada == base)
+
+    linhas = 0
+    removidas = 0
+    # Carga e remoção no mesmo commit: leitores nunca veem a tabela pela metade
+    with db.transaction():
+        if usar_delta:
+            remover = []
+            for bloco in mudancas:
+                bloco = bloco.rename(columns=nomes)
+                remocao = (bloco['operacao'] == REMOCAO).to_numpy()
+                df = bloco[~remocao].drop(columns='operacao')
+                db.bulk_upsert(tabela, df, chunk_size, conflict_columns=CHAVE_PRIMARIA)
+                linhas += len(df)
+                remover.extend(bloco.loc[remocao, CHAVE_PRIMARIA].tolist())
+            removidas = db.bulk_delete(tabela, remover, CHAVE_PRIMARIA, chunk_size)
+        elif CHAVE_PRIMARIA in definicao:
+            gravadas = []
+            ignoradas = 0
+            for df in itertools.chain([primeiro], lotes):
+                df = df.rename(columns=nomes)
+                chaves = pd.to_numeric(df[CHAVE_PRIMARIA], errors='coerce')
+                validas = chaves.notna()
+                ignoradas += int((~validas).sum())
+                df = df[validas].assign(**{CHAVE_PRIMARIA: chaves[validas].astype('int64')})
+                db.bulk_upsert(tabela, df, chunk_size, conflict_columns=CHAVE_PRIMARIA)
+                linhas += len(df)
+                gravadas.append(df[CHAVE_PRIMARIA].to_numpy())
+            if ignoradas:
+                logging.warning(f"Aba '{aba}': {ignoradas} linhas sem EAN numérico ignoradas")
+            if remover_ausentes:
+                removidas = db.delete_missing(tabela, CHAVE_PRIMARIA, map(int, np.concatenate(gravadas)),
+                                              chunk_size)
+        else:
+            # Sem chave não há como casar as linhas: a tabela é recarregada
+            db.delete(tabela, "1 = 1")
+            for df in itertools.chain([primeiro], lotes):
+                df = df.rename(columns=nomes)
+                db.bulk_insert(tabela, df, chunk_size)
+                linhas += len(df)
+        db.bulk_upsert(TABELA_SINCRONIZACAO, [{'tabela': tabela, 'versao': versao}],
+                       conflict_columns='tabela')
 
-    # criar as colunas na tabela
-    # with SQLiteCRUD("meubanco.db") as db:
+    return {'tabela': tabela, 'linhas': linhas, 'removidas': removidas, 'delta': usar_delta}
+
+
+def sincronizar_excel(db: SQLiteCRUD, arquivo, abas: Optional[dict] = None,
+                      chunk_size: int = 5000, remover_ausentes: bool = True) -> dict:
+    """
+    Sincroniza as abas de um Excel com o banco SQLite (veja sincronizar_dataframe)
+    
+    Args:
+        db (SQLiteCRUD): Banco de destino
+        arquivo: Caminho ou objeto arquivo do Excel
+        abas (dict): Abas e colunas a sincronizar (veja leitor.ler_planilhas); None para todas
+        chunk_size (int): Linhas por bloco no bulk_upsert
+        remover_ausentes (bool): Remove da tabela os EANs que não estão mais na aba
+        
+    Returns:
+        dict: Dicionário aba: {'tabela', 'linhas', 'removidas', 'delta'}
         
-print(colunas_encontradas)
+    Raises:
+        QueryError: Se a gravação de alguma aba falhar (a aba fica como estava)
+    """
+    # Importados aqui porque leitor/esquemas importam o alias deste módulo
+    from esquemas import registro_esquemas
+    from leitor import ler_planilhas
+
+    esquemas = {}
+    planilhas = ler_planilhas(arquivo, abas, registro=registro_esquemas, esquemas=esquemas)
+    return {
+        aba: sincronizar_dataframe(db, aba, df, esquemas.get(aba), chunk_size=chunk_size,
+                                   remover_ausentes=remover_ausentes)
+        for aba, df in planilhas.items()
+    }
+
+
+if __name__ == "__main__":
+    input_file = sys.argv[1] if len(sys.argv) > 1 else "tabela.xlsx"
+    db_path = sys.argv[2] if len(sys.argv) > 2 else BANCO_PADRAO
+
+    t1 = time()
+    with SQLiteCRUD(db_path) as db:
+        resumo = sincronizar_excel(db, input_file)
+    for aba, info in resumo.items():
+        print(f"Aba '{aba}' -> tabela {info['tabela']}: {info['linhas']} linhas, {info['removidas']} removidas")
+    print(f"Sincronização concluída em {time() - t1:.2f}s")
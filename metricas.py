@@ -0,0 +1,309 @@
+"""
+Métricas do processo no formato texto do Prometheus: duração, linhas e
+bytes de cada etapa da importação, latência das rotas HTTP e contadores dos
+caches. Inclui o perfilador por amostragem ativado por requisição.
+"""
+import logging
+import os
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from time import perf_counter, time
+
+import pandas as pd
+import pyarrow as pa
+
+# Limites (em segundos) dos buckets dos histogramas
+BUCKETS_HTTP = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_ETAPA = (0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+# Cabeçalho que pede o perfil da requisição e onde os perfis são gravados
+CABECALHO_PERFIL = 'X-Perfil'
+PERFIS_DIRETORIO = os.environ.get('RESTOQUE_PERFIS',
+                                  os.path.join(os.environ.get('RESTOQUE_DADOS', 'dados'), 'perfis'))
+# Perfis por requisição ficam desligados se esta variável não for 1
+PERFIL_HABILITADO = os.environ.get('RESTOQUE_PERFIL', '0') == '1'
+INTERVALO_PERFIL = float(os.environ.get('RESTOQUE_PERFIL_INTERVALO_MS', 5)) / 1000
+
+MIME_METRICAS = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _rotulos(rotulos) -> str:
+    """Pares (nome, valor) no formato {nome="valor",...} do Prometheus"""
+    if not rotulos:
+        return ''
+    return '{' + ','.join(f'{nome}="{_escapar(valor)}"' for nome, valor in rotulos) + '}'
+
+
+def _numero(valor) -> str:
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class RegistroMetricas:
+    def __init__(self):
+        """
+        Contadores, medidores e histogramas em memória, identificados pelo
+        nome e pelos rótulos. Cada processo tem os seus; o Prometheus soma os
+        processos pelo rótulo `instance`.
+        """
+        self.lock = threading.Lock()
+        self.definicoes = {}
+        self.valores = {}
+        self.coletores = []
+
+    def definir(self, nome: str, tipo: str, ajuda: str, buckets=None) -> None:
+        """
+        Declara uma métrica
+
+        Args:
+            nome (str): Nome da métrica
+            tipo (str): 'counter', 'gauge' ou 'histogram'
+            ajuda (str): Descrição exibida no # HELP
+            buckets (tuple): Limites dos buckets, para histogramas
+        """
+        self.definicoes[nome] = (tipo, ajuda, tuple(buckets or ()))
+
+    def incrementar(self, nome: str, valor=1, **rotulos) -> None:
+        chave = (nome, tuple(sorted(rotulos.items())))
+        with self.lock:
+            self.valores[chave] = self.valores.get(chave, 0) + valor
+
+    def observar(self, nome: str, valor: float, **rotulos) -> None:
+        """Registra uma observação em um histograma"""
+        buckets = self.definicoes[nome][2]
+        chave = (nome, tuple(sorted(rotulos.items())))
+        with self.lock:
+            contagens, soma, total = self.valores.get(chave, ([0] * len(buckets), 0.0, 0))
+            contagens = [contagem + (valor <= limite) for contagem, limite in zip(contagens, buckets)]
+            self.valores[chave] = (contagens, soma + valor, total + 1)
+
+    def ao_coletar(self, funcao) -> None:
+        """
+        Registra uma função chamada a cada coleta, que retorna pares
+        ((nome, rótulos), valor) lidos na hora (ex.: contadores do cache)
+        """
+        self.coletores.append(funcao)
+
+    def texto(self) -> str:
+        """Todas as métricas no formato texto de exposição do Prometheus"""
+        with self.lock:
+            valores = dict(self.valores)
+        for funcao in self.coletores:
+            for (nome, rotulos), valor in funcao():
+                valores[(nome, tuple(sorted(rotulos.items())))] = valor
+
+        por_nome = {}
+        for (nome, rotulos), valor in sorted(valores.items(), key=lambda item: (item[0][0], item[0][1])):
+            por_nome.setdefault(nome, []).append((rotulos, valor))
+
+        linhas = []
+        for nome, (tipo, ajuda, buckets) in sorted(self.definicoes.items()):
+            linhas.append(f"# HELP {nome} {ajuda}")
+            linhas.append(f"# TYPE {nome} {tipo}")
+            for rotulos, valor in por_nome.get(nome, []):
+                if tipo != 'histogram':
+                    linhas.append(f"{nome}{_rotulos(rotulos)} {_numero(valor)}")
+                    continue
+                contagens, soma, total = valor
+                for limite, contagem in zip(buckets + (float('inf'),), contagens + [total]):
+                    linhas.append(f"{nome}_bucket{_rotulos(rotulos + (('le', _numero(float(limite))),))} {contagem}")
+                linhas.append(f"{nome}_sum{_rotulos(rotulos)} {_numero(soma)}")
+                linhas.append(f"{nome}_count{_rotulos(rotulos)} {total}")
+        return '\n'.join(linhas) + '\n'
+
+
+metricas = RegistroMetricas()
+metricas.definir('restoque_etapa_duracao_segundos', 'histogram',
+                 'Duração de cada etapa da importação', BUCKETS_ETAPA)
+metricas.definir('restoque_etapa_linhas_total', 'counter', 'Linhas processadas por etapa da importação')
+metricas.definir('restoque_etapa_bytes_total', 'counter', 'Bytes processados por etapa da importação')
+metricas.definir('restoque_http_duracao_segundos', 'histogram',
+                 'Latência das requisições HTTP por rota', BUCKETS_HTTP)
+metricas.definir('restoque_cache_acertos_total', 'counter', 'Acertos do cache')
+metricas.definir('restoque_cache_falhas_total', 'counter', 'Falhas do cache')
+metricas.definir('restoque_cache_descartes_total', 'counter', 'Entradas descartadas do cache')
+metricas.definir('restoque_cache_entradas', 'gauge', 'Entradas no cache')
+metricas.definir('restoque_cache_bytes', 'gauge', 'Bytes ocupados pelo cache')
+
+
+def volume(dados):
+    """
+    Linhas e bytes em memória de um DataFrame, tabela Arrow ou dicionário
+    deles (ex.: as abas lidas)
+
+    Returns:
+        tuple: (linhas, bytes)
+    """
+    if isinstance(dados, dict):
+        volumes = [volume(valor) for valor in dados.values()]
+        return sum(linhas for linhas, _ in volumes), sum(tamanho for _, tamanho in volumes)
+    if isinstance(dados, pd.DataFrame):
+        return len(dados), int(dados.memory_usage(deep=True).sum())
+    if isinstance(dados, pa.Table):
+        return dados.num_rows, dados.nbytes
+    return 0, 0
+
+
+class Etapa:
+    def __init__(self, nome: str):
+        """Linhas e bytes processados por uma etapa, informados pelo código da etapa"""
+        self.nome = nome
+        self.linhas = 0
+        self.bytes = 0
+
+    def contar(self, dados=None, linhas: int = 0, tamanho: int = 0) -> None:
+        """Soma o volume de `dados` (veja volume) e/ou as linhas e bytes informados"""
+        if dados is not None:
+            linhas_dados, tamanho_dados = volume(dados)
+            linhas += linhas_dados
+            tamanho += tamanho_dados
+        self.linhas += linhas
+        self.bytes += tamanho
+
+
+@contextmanager
+def etapa(nome, tempos):
+    """
+    Registra em `tempos` a duração (em segundos) da etapa `nome` e, nas
+    métricas, a duração, as linhas e os bytes informados com Etapa.contar
+
+    Uso:
+        with etapa('leitura', tempos) as medida:
+            planilhas = ler(arquivo)
+            medida.contar(planilhas)
+    """
+    medida = Etapa(nome)
+    inicio = time()
+    try:
+        yield medida
+    finally:
+        duracao = time() - inicio
+        tempos[nome] = round(duracao, 4)
+        metricas.observar('restoque_etapa_duracao_segundos', duracao, etapa=nome)
+        metricas.incrementar('restoque_etapa_linhas_total', medida.linhas, etapa=nome)
+        metricas.incrementar('restoque_etapa_bytes_total', medida.bytes, etapa=nome)
+        logging.info(f"Etapa '{nome}': {duracao:.3f}s, {medida.linhas} linhas, "
+                     f"{medida.bytes / 1024 / 1024:.1f} MB")
+
+
+def tamanho_arquivos(caminho: str) -> int:
+    """Bytes de um arquivo ou da soma dos arquivos de um diretório"""
+    if os.path.isfile(caminho):
+        return os.path.getsize(caminho)
+    total = 0
+    for raiz, _, arquivos in os.walk(caminho):
+        total += sum(os.path.getsize(os.path.join(raiz, arquivo)) for arquivo in arquivos)
+    return total
+
+
+def coletor_cache(cache, nome: str):
+    """Coletor (veja RegistroMetricas.ao_coletar) dos contadores de um CacheTabelas"""
+    def coletar():
+        estatisticas = cache.estatisticas()
+        rotulos = {'cache': nome}
+        return [
+            (('restoque_cache_acertos_total', rotulos), estatisticas['acertos']),
+            (('restoque_cache_falhas_total', rotulos), estatisticas['falhas']),
+            (('restoque_cache_descartes_total', rotulos), estatisticas['descartes']),
+            (('restoque_cache_entradas', rotulos), estatisticas['entradas']),
+            (('restoque_cache_bytes', rotulos), estatisticas['bytes']),
+        ]
+    return coletar
+
+
+class AmostradorPerfil:
+    def __init__(self, thread_id: int, intervalo: float = INTERVALO_PERFIL):
+        """
+        Perfilador por amostragem: uma thread lê a pilha da thread `thread_id`
+        a cada `intervalo` segundos e conta as pilhas vistas, sem instrumentar
+        o código perfilado
+
+        Args:
+            thread_id (int): Thread perfilada (threading.get_ident())
+            intervalo (float): Segundos entre amostras
+        """
+        self.thread_id = thread_id
+        self.intervalo = intervalo
+        self.pilhas = Counter()
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._amostrar, name='perfil', daemon=True)
+
+    def _amostrar(self):
+        while not self._parar.wait(self.intervalo):
+            quadro = sys._current_frames().get(self.thread_id)
+            pilha = []
+            while quadro is not None:
+                codigo = quadro.f_code
+                pilha.append(f"{os.path.basename(codigo.co_filename)}:{codigo.co_name}")
+                quadro = quadro.f_back
+            if pilha:
+                self.pilhas[';'.join(reversed(pilha))] += 1
+
+    def iniciar(self) -> 'AmostradorPerfil':
+        self._thread.start()
+        return self
+
+    def parar(self) -> Counter:
+        self._parar.set()
+        self._thread.join()
+        return self.pilhas
+
+    def gravar(self, caminho: str) -> None:
+        """Grava as pilhas no formato 'collapsed' (flamegraph.pl, speedscope)"""
+        os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+        with open(caminho, 'w', encoding='utf-8') as arquivo:
+            for pilha, amostras in self.pilhas.most_common():
+                arquivo.write(f"{pilha} {amostras}\n")
+
+
+def instrumentar(app, nome: str) -> None:
+    """
+    Mede a latência de todas as rotas do app Flask, aceita o cabeçalho
+    X-Perfil (com RESTOQUE_PERFIL=1) e expõe GET /metrics
+
+    Args:
+        app (Flask): Aplicação instrumentada
+        nome (str): Valor do rótulo `app` (ex.: 'servidor', 'microservico')
+    """
+    from flask import Response, g, request
+
+    @app.before_request
+    def _iniciar_medicao():
+        g.inicio_requisicao = perf_counter()
+        if PERFIL_HABILITADO and request.headers.get(CABECALHO_PERFIL):
+            g.perfil = AmostradorPerfil(threading.get_ident()).iniciar()
+
+    @app.after_request
+    def _registrar_medicao(resposta):
+        inicio = g.pop('inicio_requisicao', None)
+        if inicio is not None:
+            rota = request.url_rule.rule if request.url_rule is not None else 'desconhecida'
+            metricas.observar('restoque_http_duracao_segundos', perf_counter() - inicio, app=nome, rota=rota,
+                              metodo=request.method, status=resposta.status_code)
+        perfil = g.pop('perfil', None)
+        if perfil is not None:
+            perfil.parar()
+            arquivo = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{request.endpoint or 'desconhecida'}.txt"
+            perfil.gravar(os.path.join(PERFIS_DIRETORIO, arquivo))
+            resposta.headers[CABECALHO_PERFIL] = arquivo
+            logging.info(f"Perfil de {request.method} {request.path} gravado em {arquivo}")
+        return resposta
+
+    @app.teardown_request
+    def _encerrar_perfil(erro=None):
+        # Se a requisição falhou antes do after_request, o amostrador ainda precisa parar
+        perfil = g.pop('perfil', None)
+        if perfil is not None:
+            perfil.parar()
+
+    @app.route('/metrics', methods=['GET'])
+    def exportar_metricas():
+        return Response(metricas.texto(), status=200, content_type=MIME_METRICAS)
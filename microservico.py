@@ -1,13 +1,46 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 import pandas as pd
 import pyarrow.parquet as pq
+import logging
 import os
 from werkzeug.utils import secure_filename
+from main import BANCO_PADRAO, DatabaseError, SQLiteCRUD
+from snapshots import armazem
+from serializacao import MIME_JSON, prefere_arrow, resposta_arrow, tabela_para_json
+from metricas import instrumentar
+import uploads
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 200 * 1024 * 1024
+# Mesmo padrão do conversor, que sincroniza o banco a cada importação
+app.config['BANCO_SQLITE'] = os.environ.get('RESTOQUE_BANCO', BANCO_PADRAO)
+app.config['BANCO_CONEXOES'] = int(os.environ.get('RESTOQUE_BANCO_CONEXOES', 8))
+app.config['BANCO_LIMITE_MAX'] = int(os.environ.get('RESTOQUE_BANCO_LIMITE_MAX', 10000))
 ALLOWED_EXTENSIONS = ['xlsx', 'xls']
-UPLOAD_FOLDER = 'uploads'
+UPLOAD_FOLDER = os.environ.get('RESTOQUE_UPLOADS', 'uploads')
+# Latência por rota e GET /metrics (veja metricas.py)
+instrumentar(app, 'microservico')
+
+if not app.config['BANCO_SQLITE']:
+    logging.warning("RESTOQUE_BANCO vazio: as importações não sincronizam o banco e /banco/* responde 404")
+# Banco sincronizado por main.sincronizar_excel; as leituras usam o pool de conexões
+banco = SQLiteCRUD(app.config['BANCO_SQLITE'], pool_size=app.config['BANCO_CONEXOES'])
+TABELAS_BANCO = ['estoque', 'tabela']
+# INTEGER do SQLite: inteiro de 64 bits com sinal
+LIMITES_INTEGER = (-2 ** 63, 2 ** 63 - 1)
+
+
+def inteiro_banco(texto):
+    """Converte o parâmetro em int; ValueError se não couber em um INTEGER do SQLite"""
+    valor = int(texto)
+    if not LIMITES_INTEGER[0] <= valor <= LIMITES_INTEGER[1]:
+        raise ValueError(f"{texto} fora do intervalo de INTEGER")
+    return valor
+
+
+# Filtros aceitos na query string: coluna -> conversão do valor
+FILTROS_BANCO = {'ean': inteiro_banco, 'cod_produto': inteiro_banco, 'cod_fornecedor': inteiro_banco,
+                 'categoria': str}
 
 @app.route('/planilhas-processar', methods=['POST'])
 def processar_planilhas():
@@ -28,7 +61,13 @@ def processar_planilhas():
         if not filename:
             return jsonify({'erro': 'Nome de arquivo inválido'}), 400
         
-        df = pd.read_excel(file)
+        # Gravado em disco em pedaços e lido do arquivo mapeado, sem o upload inteiro em memória
+        upload = uploads.receber(file.stream, UPLOAD_FOLDER, filename)
+        try:
+            with uploads.ArquivoMapeado(upload.caminho) as arquivo:
+                df = pd.read_excel(arquivo)
+        finally:
+            upload.remover()
         print(df.head())
         
         return jsonify({'mensagem': 'Planilhas recebidas com sucesso!'}), 200
@@ -38,23 +77,27 @@ def processar_planilhas():
 @app.route('/dados-parquet', methods=['GET'])
 def ler_parquet_para_json():
     try:
-        # Caminho para o arquivo parquet
-        arquivo_parquet = 'estoque.parquet'
-        
-        # Verifica se o arquivo existe
-        if not os.path.exists(arquivo_parquet):
-            return jsonify({'erro': f'Arquivo {arquivo_parquet} não encontrado'}), 404
-        
-        # Lê o arquivo parquet usando pandas
-        df = pd.read_parquet(arquivo_parquet)
+        # Fixa a versão publicada durante a leitura
+        with armazem.fixar() as versao:
+            # Caminho para o arquivo parquet
+            arquivo_parquet = 'estoque.parquet'
+            caminho = armazem.caminho(versao, arquivo_parquet) if versao is not None else None
+            
+            # Verifica se o arquivo existe
+            if caminho is None or not os.path.exists(caminho):
+                return jsonify({'erro': f'Arquivo {arquivo_parquet} não encontrado'}), 404
+            
+            # Cliente pediu Arrow: os lotes do parquet vão direto para a resposta
+            if prefere_arrow(request):
+                return resposta_arrow(caminho)
+            
+            # Lê o arquivo parquet com pyarrow
+            tabela = pq.read_table(caminho)
         
         # Converte para JSON
-        # 'orient='records'' cria uma lista de objetos
-        dados_json = df.to_json(orient='records', date_format='iso')
-        
-        # Retorna os dados como JSON
-        # jsonify garante que o Content-Type seja application/json
-        return jsonify(dados_json)
+        # 'orient='records'' cria uma lista de objetos, serializada em C
+        # direto para bytes (sem passar de novo pelo jsonify)
+        return Response(tabela_para_json(tabela), mimetype=MIME_JSON)
         
     except Exception as e:
         return jsonify({'erro': f'Erro ao processar arquivo: {str(e)}'}), 500
@@ -63,19 +106,20 @@ def ler_parquet_para_json():
 @app.route('/dados-parquet-arrow', methods=['GET'])
 def ler_parquet_pyarrow():
     try:
-        arquivo_parquet = 'estoque.parquet'
-        
-        if not os.path.exists(arquivo_parquet):
-            return jsonify({'erro': f'Arquivo {arquivo_parquet} não encontrado'}), 404
-        
-        # Lê o arquivo com pyarrow
-        tabela = pq.read_table(arquivo_parquet)
-        
-        # Converte para pandas e depois para JSON
-        df = tabela.to_pandas()
-        dados_json = df.to_json(orient='records', date_format='iso')
-        
-        return jsonify(dados_json)
+        with armazem.fixar() as versao:
+            arquivo_parquet = 'estoque.parquet'
+            caminho = armazem.caminho(versao, arquivo_parquet) if versao is not None else None
+            
+            if caminho is None or not os.path.exists(caminho):
+                return jsonify({'erro': f'Arquivo {arquivo_parquet} não encontrado'}), 404
+            
+            if prefere_arrow(request):
+                return resposta_arrow(caminho)
+            
+            # Lê o arquivo com pyarrow
+            tabela = pq.read_table(caminho)
+        
+        return Response(tabela_para_json(tabela), mimetype=MIME_JSON)
         
     except Exception as e:
         return jsonify({'erro': f'Erro ao processar arquivo: {str(e)}'}), 500
@@ -84,18 +128,85 @@ def ler_parquet_pyarrow():
 @app.route('/dados-parquet/<nome_arquivo>', methods=['GET'])
 def ler_parquet_especifico(nome_arquivo):
     try:
-        arquivo_parquet = f'{nome_arquivo}.parquet'
-        
-        if not os.path.exists(arquivo_parquet):
-            return jsonify({'erro': f'Arquivo {arquivo_parquet} não encontrado'}), 404
+        arquivo_parquet = f'{secure_filename(nome_arquivo)}.parquet'
         
-        df = pd.read_parquet(arquivo_parquet)
-        dados_json = df.to_json(orient='records', date_format='iso')
+        with armazem.fixar() as versao:
+            caminho = armazem.caminho(versao, arquivo_parquet) if versao is not None else None
+            
+            if caminho is None or not os.path.exists(caminho):
+                return jsonify({'erro': f'Arquivo {arquivo_parquet} não encontrado'}), 404
+            
+            if prefere_arrow(request):
+                return resposta_arrow(caminho)
+            
+            tabela = pq.read_table(caminho)
         
-        return jsonify(dados_json)
+        return Response(tabela_para_json(tabela), mimetype=MIME_JSON)
         
     except Exception as e:
         return jsonify({'erro': f'Erro ao processar arquivo: {str(e)}'}), 500
 
+# Consultas ao banco SQLite, usando os índices da chave primária (ean) e de
+# cod_produto/cod_fornecedor em vez de ler o parquet inteiro
+@app.route('/banco/<tabela>', methods=['GET'])
+def consultar_banco(tabela):
+    if tabela not in TABELAS_BANCO:
+        return jsonify({'erro': f'Tabela {tabela} não encontrada'}), 404
+    try:
+        colunas = banco.table_columns(tabela)
+        if not colunas:
+            return jsonify({'erro': f'Tabela {tabela} ainda não sincronizada'}), 404
+
+        condicoes = []
+        parametros = []
+        try:
+            # Vários valores separados por vírgula viram um IN
+            for filtro, conversao in FILTROS_BANCO.items():
+                valor = request.args.get(filtro)
+                if not valor:
+                    continue
+                if filtro not in colunas:
+                    return jsonify({'erro': f"A tabela {tabela} não tem a coluna '{filtro}' para filtrar"}), 400
+                valores = [conversao(v) for v in valor.split(',')]
+                condicoes.append(f"{filtro} IN ({', '.join('?' for _ in valores)})")
+                parametros.extend(valores)
+
+            # Paginação por chave: 'apos' é o último EAN da página anterior
+            if request.args.get('apos'):
+                condicoes.append("ean > ?")
+                parametros.append(inteiro_banco(request.args['apos']))
+            limite = int(request.args.get('limit', 1000))
+        except ValueError:
+            return jsonify({'erro': 'Parâmetro inválido'}), 400
+        # LIMIT negativo no SQLite retorna a tabela inteira
+        if not 1 <= limite <= app.config['BANCO_LIMITE_MAX']:
+            return jsonify({'erro': f"limit deve estar entre 1 e {app.config['BANCO_LIMITE_MAX']}"}), 400
+
+        registros = banco.select(tabela, ' AND '.join(condicoes) or None, tuple(parametros),
+                                 order_by='ean', limit=limite)
+        resposta = jsonify(registros)
+        if registros and len(registros) == limite:
+            resposta.headers['X-Proximo-Apos'] = str(registros[-1]['ean'])
+        return resposta
+
+    except DatabaseError as e:
+        return jsonify({'erro': f'Erro ao consultar o banco: {str(e)}'}), 500
+
+@app.route('/banco/<tabela>/<int:ean>', methods=['GET'])
+def consultar_banco_ean(tabela, ean):
+    if tabela not in TABELAS_BANCO:
+        return jsonify({'erro': f'Tabela {tabela} não encontrada'}), 404
+    if ean > LIMITES_INTEGER[1]:
+        return jsonify({'erro': f'EAN {ean} fora do intervalo aceito'}), 400
+    try:
+        registro = banco.select_one(tabela, "ean = ?", (ean,))
+        if registro is None:
+            return jsonify({'erro': f'EAN {ean} não encontrado'}), 404
+        return jsonify(registro)
+
+    except DatabaseError as e:
+        return jsonify({'erro': f'Erro ao consultar o banco: {str(e)}'}), 500
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # Servidor de desenvolvimento; em produção use python producao.py microservico
+    app.run(debug=os.environ.get('RESTOQUE_DEBUG') == '1', host='0.0.0.0', port=5000)
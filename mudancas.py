@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Hashes por chave e mudanças em relação à versão anterior, gravados em cada versão
+ARQUIVO_HASHES = 'hashes_{}.parquet'
+ARQUIVO_MUDANCAS = 'mudancas_{}.parquet'
+ABAS = {'estoque': 'Estoque', 'tabela': 'Tabela'}
+CHAVE = 'EAN'
+
+INSERCAO = 'insercao'
+ATUALIZACAO = 'atualizacao'
+REMOCAO = 'remocao'
+
+
+class VersaoIndisponivel(Exception):
+    """As mudanças desde a versão pedida não estão mais disponíveis; é preciso recarregar tudo"""
+
+
+def hashes_linhas(df: pd.DataFrame) -> np.ndarray:
+    """Hash uint64 do conteúdo de cada linha (o índice é ignorado)"""
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def com_chave_inteira(df: pd.DataFrame, chave: str = CHAVE) -> pd.DataFrame:
+    """Linhas com chave numérica, com a chave convertida para int64 (o índice é mantido)"""
+    chaves = pd.to_numeric(df[chave], errors='coerce')
+    validas = chaves.notna().to_numpy()
+    return df[validas].assign(**{chave: chaves[validas].to_numpy(dtype='float64').astype(np.int64)})
+
+
+def ultimas_por_chave(df: pd.DataFrame, chave: str = CHAVE) -> pd.DataFrame:
+    """
+    Linhas com chave numérica, ficando apenas a última de cada chave, como no
+    mapeamento do conversor e no índice de EAN. A chave é convertida para int64.
+    """
+    df = com_chave_inteira(df, chave)
+    return df[~df[chave].duplicated(keep='last').to_numpy()]
+
+
+def ultimas_ocorrencias(chaves: np.ndarray) -> np.ndarray:
+    """Máscara da última ocorrência de cada chave, para a deduplicação feita fora de um DataFrame"""
+    return ~pd.Index(chaves).duplicated(keep='last')
+
+
+def calcular_mudancas(df: pd.DataFrame, anteriores, chave: str = CHAVE):
+    """
+    Compara as linhas da aba com os hashes gravados na versão anterior
+
+    Args:
+        df (pd.DataFrame): Aba lida
+        anteriores (pd.Series): Hash por chave da versão anterior, ou None
+        chave (str): Coluna que identifica a linha
+
+    Returns:
+        tuple: (hashes: pd.Series hash por chave, mudancas: DataFrame com a
+        coluna 'operacao' seguida das colunas da aba; None sem versão anterior)
+    """
+    ultimas = ultimas_por_chave(df, chave)
+    hashes = pd.Series(hashes_linhas(ultimas), index=pd.Index(ultimas[chave].to_numpy(), name=chave))
+    if anteriores is None:
+        return hashes, None
+
+    existiam = hashes.index.isin(anteriores.index)
+    alteradas = existiam & (hashes.to_numpy() != anteriores.reindex(hashes.index).to_numpy())
+    removidas = anteriores.index[~anteriores.index.isin(hashes.index)]
+
+    # Remoções levam só a chave; as demais colunas ficam nulas, com os mesmos tipos
+    remocoes = ultimas.iloc[[]].reindex(pd.RangeIndex(len(removidas)))
+    remocoes[chave] = removidas.to_numpy(dtype=np.int64)
+
+    mudancas = pd.concat([
+        ultimas[~existiam].assign(operacao=INSERCAO),
+        ultimas[alteradas].assign(operacao=ATUALIZACAO),
+        remocoes.assign(operacao=REMOCAO),
+    ], ignore_index=True)
+    mudancas = mudancas[['operacao'] + [c for c in mudancas.columns if c != 'operacao']]
+    return hashes, mudancas
+
+
+def contar_operacoes(mudancas: pd.DataFrame) -> dict:
+    """Quantidade de inserções, atualizações e remoções"""
+    contagem = mudancas['operacao'].value_counts()
+    return {operacao: int(contagem.get(operacao, 0)) for operacao in (INSERCAO, ATUALIZACAO, REMOCAO)}
+
+
+def gravar_hashes(hashes: pd.Series, caminho: str) -> None:
+    pq.write_table(pa.table({'chave': hashes.index.to_numpy(), 'hash': hashes.to_numpy()}), caminho)
+
+
+def ler_hashes(caminho: str):
+    """Hashes gravados em uma versão, ou None se a versão não os tiver"""
+    try:
+        tabela = pq.read_table(caminho)
+    except FileNotFoundError:
+        return None
+    return pd.Series(tabela.column('hash').to_numpy(), index=pd.Index(tabela.column('chave').to_numpy(), name=CHAVE))
+
+
+def gravar_mudancas(mudancas: pd.DataFrame, caminho: str) -> None:
+    mudancas.to_parquet(caminho, engine='pyarrow', compression='snappy', index=False)
+
+
+def mudancas_desde(armazem, desde: int, aba: str, ate: int) -> pd.DataFrame:
+    """
+    Junta as mudanças publicadas depois da versão `desde` até a versão `ate`
+
+    Cada chave aparece uma vez, com a linha mais recente. Uma chave inserida e
+    removida no intervalo é omitida; uma removida e inserida de novo vira atualização.
+
+    Raises:
+        VersaoIndisponivel: Se alguma versão do intervalo já foi removida pela
+            retenção ou não foi gerada como delta da anterior
+    """
+    partes = []
+    for versao in range(desde + 1, ate + 1):
+        try:
+            if armazem.manifesto(versao).get('base') != versao - 1:
+                raise VersaoIndisponivel(f"A versão {versao} não foi gerada a partir da versão {versao - 1}")
+            partes.append(pd.read_parquet(armazem.caminho(versao, ARQUIVO_MUDANCAS.format(aba)),
+                                          dtype_backend='pyarrow'))
+        except FileNotFoundError:
+            raise VersaoIndisponivel(f"As mudanças da versão {versao} não estão mais disponíveis")
+    if not partes:
+        return pd.DataFrame({'operacao': pd.Series(dtype=str), CHAVE: pd.Series(dtype=np.int64)})
+
+    todas = pd.concat(partes, ignore_index=True)
+    primeiras = todas.drop_duplicates(CHAVE, keep='first').set_index(CHAVE)['operacao']
+    ultimas = todas.drop_duplicates(CHAVE, keep='last').reset_index(drop=True)
+    primeira = primeiras.reindex(ultimas[CHAVE]).to_numpy()
+    ultima = ultimas['operacao'].to_numpy()
+
+    ultimas.loc[(primeira == INSERCAO) & (ultima != REMOCAO), 'operacao'] = INSERCAO
+    ultimas.loc[(primeira == REMOCAO) & (ultima == INSERCAO), 'operacao'] = ATUALIZACAO
+    # Inserida e removida dentro do intervalo: o consumidor nunca a viu
+    return ultimas[~((primeira == INSERCAO) & (ultima == REMOCAO))].reset_index(drop=True)
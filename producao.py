@@ -0,0 +1,129 @@
+"""
+Execução em produção do servidor.py ou do microservico.py com o gunicorn:
+vários workers (pre-fork) com threads, em vez do servidor de desenvolvimento
+do Flask.
+
+A aplicação é carregada no processo principal antes de criar os workers
+(preload) e a versão atual do armazém é pré-carregada (servidor.preaquecer),
+então os workers compartilham as tabelas por copy-on-write. Quando uma nova
+versão é publicada, por qualquer worker ou por outro processo, o processo
+principal recebe um SIGHUP: carrega a versão nova e troca os workers sem
+derrubar as conexões (os antigos terminam as requisições em andamento).
+
+Configuração por variáveis de ambiente:
+    RESTOQUE_ENDERECO: Endereço de escuta (padrão 0.0.0.0:5000)
+    RESTOQUE_WORKERS: Processos (padrão: número de CPUs)
+    RESTOQUE_THREADS: Threads por processo (padrão 4)
+    RESTOQUE_TIMEOUT: Segundos sem resposta até o worker ser reiniciado (padrão 120)
+    RESTOQUE_ENCERRAMENTO: Segundos que um worker antigo tem para terminar
+        as requisições e importações em andamento (padrão 300)
+    RESTOQUE_VIGIA_S: Intervalo de verificação de versões novas (padrão 2; 0 desativa)
+
+Cada worker tem os próprios contadores, então GET /metrics e GET /cache
+mostram apenas o worker que atendeu a requisição. As importações rodam no
+worker que recebeu o upload (IMPORTACAO_WORKERS por worker).
+
+Uso: python producao.py [servidor|microservico]
+"""
+import gc
+import importlib
+import logging
+import os
+import signal
+import sys
+import threading
+from time import sleep
+
+from gunicorn.app.base import BaseApplication
+
+from snapshots import armazem
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler(sys.stdout)]
+)
+
+APLICACOES = ('servidor', 'microservico')
+
+
+def opcoes_padrao() -> dict:
+    """Configuração do gunicorn lida das variáveis de ambiente"""
+    return {
+        'bind': os.environ.get('RESTOQUE_ENDERECO', '0.0.0.0:5000'),
+        'workers': int(os.environ.get('RESTOQUE_WORKERS', os.cpu_count() or 1)),
+        'threads': int(os.environ.get('RESTOQUE_THREADS', 4)),
+        'worker_class': 'gthread',
+        'timeout': int(os.environ.get('RESTOQUE_TIMEOUT', 120)),
+        'graceful_timeout': int(os.environ.get('RESTOQUE_ENCERRAMENTO', 300)),
+        'preload_app': True,
+        'accesslog': os.environ.get('RESTOQUE_ACESSOS') or None,
+    }
+
+
+def vigiar_versoes(servidor, intervalo: float):
+    """
+    Envia SIGHUP ao processo principal quando o ponteiro da versão atual muda.
+    Roda em uma thread do processo principal; só lê o arquivo ATUAL, sem
+    segurar locks que os workers herdariam no fork.
+    """
+    versao = armazem.versao_atual()
+    while True:
+        sleep(intervalo)
+        atual = armazem.versao_atual()
+        if atual != versao:
+            servidor.log.info(f"Versão {atual} publicada (era {versao}), recarregando os workers")
+            versao = atual
+            os.kill(servidor.pid, signal.SIGHUP)
+
+
+class Aplicacao(BaseApplication):
+    def __init__(self, nome: str, opcoes: dict = None):
+        """
+        Aplicação do gunicorn para o servidor.py ou o microservico.py
+
+        Args:
+            nome (str): Módulo da aplicação, um de APLICACOES
+            opcoes (dict): Configuração do gunicorn (padrão: opcoes_padrao())
+        """
+        if nome not in APLICACOES:
+            raise ValueError(f"Aplicação inválida: {nome}; use uma de {list(APLICACOES)}")
+        self.nome = nome
+        self.opcoes = opcoes_padrao() if opcoes is None else opcoes
+        self.modulo = None
+        super().__init__()
+
+    def load_config(self):
+        for chave, valor in self.opcoes.items():
+            self.cfg.set(chave, valor)
+        self.cfg.set('when_ready', self._quando_pronto)
+        self.cfg.set('on_reload', self._ao_recarregar)
+
+    def load(self):
+        self.modulo = importlib.import_module(self.nome)
+        self.preaquecer()
+        return self.modulo.app
+
+    def preaquecer(self):
+        preparar = getattr(self.modulo, 'preaquecer', None)
+        if preparar is not None:
+            versao = preparar()
+            logging.info(f"Versão {versao} pré-carregada no processo principal")
+        # Objetos criados até aqui não são mais visitados pelo coletor de lixo,
+        # que de outra forma tocaria nas páginas compartilhadas com os workers
+        gc.freeze()
+
+    def _quando_pronto(self, servidor):
+        intervalo = float(os.environ.get('RESTOQUE_VIGIA_S', 2))
+        if intervalo > 0:
+            threading.Thread(target=vigiar_versoes, args=(servidor, intervalo), name='vigia-versoes',
+                             daemon=True).start()
+
+    def _ao_recarregar(self, servidor):
+        # Chamado no processo principal após o SIGHUP, antes dos workers novos
+        # serem criados; a aplicação não é importada de novo (preload)
+        self.preaquecer()
+
+
+if __name__ == "__main__":
+    Aplicacao(sys.argv[1] if len(sys.argv) > 1 else 'servidor').run()
@@ -1,70 +1,162 @@
-import pandas as pd
 import os
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
 
-def separar_abas_para_arquivos(arquivo_original, pasta_destino=None):
+import openpyxl
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+from leitor import ler_aba, ler_planilhas
+
+FORMATOS = ('xlsx', 'parquet', 'csv')
+
+def _separar_aba(arquivo_original, aba, caminho_saida, formato):
+    """
+    Grava uma aba em um arquivo próprio (executado em um processo do pool)
+
+    O workbook é aberto em modo read-only, que só interpreta o XML da aba
+    lida, e o xlsx de saída usa o writer write-only do openpyxl: as linhas
+    passam de um para o outro sem montar a planilha inteira em memória.
+
+    Returns:
+        int: Quantidade de linhas gravadas (sem o cabeçalho no parquet/CSV)
+    """
+    workbook = openpyxl.load_workbook(arquivo_original, read_only=True, data_only=True)
+    try:
+        planilha = workbook[aba]
+        if formato == 'xlsx':
+            saida = openpyxl.Workbook(write_only=True)
+            folha = saida.create_sheet(title=aba)
+            linhas = 0
+            for linha in planilha.iter_rows(values_only=True):
+                folha.append(linha)
+                linhas += 1
+            saida.save(caminho_saida)
+            return linhas
+
+        tabela, _ = ler_aba(planilha)
+        if formato == 'parquet':
+            pq.write_table(tabela, caminho_saida, compression='snappy')
+        else:
+            pacsv.write_csv(tabela, caminho_saida)
+        return tabela.num_rows
+    finally:
+        workbook.close()
+
+def separar_abas_para_arquivos(arquivo_original, pasta_destino=None, formato='xlsx', processos=None):
     """
     Separa cada aba de uma planilha Excel em arquivos individuais.
-    
+
+    Cada aba é lida uma única vez e as abas são gravadas em paralelo.
+
     Args:
         arquivo_original (str): Caminho para o arquivo Excel original
         pasta_destino (str): Pasta onde os arquivos serão salvos (opcional)
+        formato (str): Formato de saída: 'xlsx', 'parquet' ou 'csv'
+        processos (int): Processos usados para gravar as abas (padrão: uma por aba, até o número de CPUs)
+
+    Returns:
+        dict: Dicionário aba: caminho do arquivo gerado
     """
-    
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato inválido: {formato}. Use um de {FORMATOS}")
+
     # Se não for especificada uma pasta de destino, usa a mesma pasta do arquivo original
     if pasta_destino is None:
         pasta_destino = os.path.dirname(arquivo_original)
-    
+
     # Garante que a pasta de destino existe
     os.makedirs(pasta_destino, exist_ok=True)
-    
-    # Lê o arquivo Excel
+
+    gerados = {}
     try:
-        # Lê todas as abas
-        planilha = pd.ExcelFile(arquivo_original)
-        abas = planilha.sheet_names
-        
+        # Lista as abas sem ler os dados
+        workbook = openpyxl.load_workbook(arquivo_original, read_only=True)
+        abas = workbook.sheetnames
+        workbook.close()
+
         print(f"Encontradas {len(abas)} abas no arquivo: {arquivo_original}")
-        
-        # Processa cada aba
-        for aba in abas:
-            # Lê os dados da aba
-            df = pd.read_excel(arquivo_original, sheet_name=aba)
-            
-            # Cria o nome do arquivo de saída
-            nome_base = os.path.splitext(os.path.basename(arquivo_original))[0]
-            nome_arquivo_saida = f"{nome_base}_{aba}.xlsx"
-            caminho_completo = os.path.join(pasta_destino, nome_arquivo_saida)
-            
-            # Salva a aba como arquivo separado
-            df.to_excel(caminho_completo, index=False, sheet_name=aba)
-            
-            print(f"✓ Aba '{aba}' salva como: {nome_arquivo_saida}")
-            
+
+        # Cria o nome de cada arquivo de saída
+        nome_base = os.path.splitext(os.path.basename(arquivo_original))[0]
+        saidas = {aba: os.path.join(pasta_destino, f"{nome_base}_{aba}.{formato}") for aba in abas}
+
+        processos = min(processos or os.cpu_count() or 1, len(abas))
+        if processos <= 1:
+            linhas = {aba: _separar_aba(arquivo_original, aba, caminho, formato) for aba, caminho in saidas.items()}
+        else:
+            with ProcessPoolExecutor(max_workers=processos) as executor:
+                futuros = {aba: executor.submit(_separar_aba, arquivo_original, aba, caminho, formato)
+                           for aba, caminho in saidas.items()}
+                linhas = {aba: futuro.result() for aba, futuro in futuros.items()}
+
+        for aba, caminho in saidas.items():
+            gerados[aba] = caminho
+            print(f"✓ Aba '{aba}' salva como: {os.path.basename(caminho)} ({linhas[aba]} linhas)")
+
         print(f"\nProcesso concluído! Arquivos salvos em: {pasta_destino}")
-        
+
     except FileNotFoundError:
         print(f"Erro: Arquivo '{arquivo_original}' não encontrado.")
     except Exception as e:
         print(f"Erro ao processar o arquivo: {e}")
+    return gerados
+
+class AbasPreguicosas(Mapping):
+    def __init__(self, arquivo_original, abas):
+        """
+        Dicionário aba: DataFrame que só lê uma aba quando ela é acessada
+
+        Cada aba é lida uma vez (com leitor.ler_planilhas, em modo read-only)
+        e fica guardada para os próximos acessos.
+        """
+        self.arquivo_original = arquivo_original
+        self.abas = list(abas)
+        self.carregadas = {}
+
+    def __getitem__(self, aba):
+        if aba not in self.carregadas:
+            if aba not in self.abas:
+                raise KeyError(aba)
+            self.carregadas[aba] = ler_planilhas(self.arquivo_original, {aba: None})[aba]
+        return self.carregadas[aba]
+
+    def __iter__(self):
+        return iter(self.abas)
+
+    def __len__(self):
+        return len(self.abas)
+
+    def __repr__(self):
+        return f"AbasPreguicosas({self.arquivo_original!r}, abas={self.abas}, carregadas={list(self.carregadas)})"
 
 # Versão alternativa que retorna os DataFrames (se você quiser trabalhar com eles)
-def separar_abas_em_dataframes(arquivo_original):
+def separar_abas_em_dataframes(arquivo_original, preguicoso=True):
     """
     Separa cada aba em DataFrames individuais e retorna um dicionário.
-    
+
     Args:
         arquivo_original (str): Caminho para o arquivo Excel original
-    
+        preguicoso (bool): Retorna um AbasPreguicosas, que só lê cada aba quando
+            ela é acessada; False lê todas as abas de uma vez
+
     Returns:
-        dict: Dicionário com nome_da_aba: DataFrame
+        Mapping: Dicionário com nome_da_aba: DataFrame
     """
     try:
+        if preguicoso:
+            workbook = openpyxl.load_workbook(arquivo_original, read_only=True)
+            abas = workbook.sheetnames
+            workbook.close()
+            print(f"Abas encontradas: {abas}")
+            return AbasPreguicosas(arquivo_original, abas)
+
         # Lê todas as abas em um dicionário de DataFrames
-        dataframes = pd.read_excel(arquivo_original, sheet_name=None)
-        
+        dataframes = ler_planilhas(arquivo_original, None)
+
         print(f"Abas carregadas: {list(dataframes.keys())}")
         return dataframes
-        
+
     except Exception as e:
         print(f"Erro ao carregar o arquivo: {e}")
         return {}
@@ -74,10 +166,10 @@ if __name__ == "__main__":
     # Configurações
     arquivo_excel = "tabela.xlsx"  # Substitua pelo caminho do seu arquivo
     pasta_saida = "planilhas_separadas"       # Pasta onde salvar os arquivos
-    
-    # Opção 1: Separar em arquivos individuais
+
+    # Opção 1: Separar em arquivos individuais (formato='parquet' ou 'csv' para outros formatos)
     separar_abas_para_arquivos(arquivo_excel, pasta_saida)
-    
+
     # Opção 2: Carregar em DataFrames (se quiser processar os dados)
     # dataframes = separar_abas_em_dataframes(arquivo_excel)
     # for nome_aba, df in dataframes.items():
@@ -0,0 +1,80 @@
+import io
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from flask import Response
+
+MIME_JSON = 'application/json'
+MIME_ARROW = 'application/vnd.apache.arrow.stream'
+
+
+def prefere_arrow(requisicao) -> bool:
+    """
+    Verifica se o cliente pediu Arrow IPC no cabeçalho Accept.
+    Sem preferência explícita a resposta continua sendo JSON.
+    """
+    return requisicao.accept_mimetypes.best_match([MIME_JSON, MIME_ARROW]) == MIME_ARROW
+
+
+def tabela_para_json(tabela: pa.Table) -> bytes:
+    """
+    Serializa uma tabela Arrow como lista de registros JSON.
+
+    O encoder em C do pandas percorre as colunas diretamente, sem montar
+    um dicionário Python por linha. Os metadados do pandas são ignorados para
+    usar colunas NumPy, que o encoder serializa sem conversão intermediária.
+    """
+    df = tabela.to_pandas(ignore_metadata=True)
+    return df.to_json(orient='records', date_format='iso', force_ascii=False).encode('utf-8')
+
+
+def arquivos_parquet(caminho: str) -> list:
+    """
+    Arquivos de um parquet: o próprio caminho ou, para um parquet particionado
+    (diretório), as partições na ordem dos nomes
+    """
+    if os.path.isdir(caminho):
+        return [os.path.join(caminho, nome) for nome in sorted(os.listdir(caminho)) if nome.endswith('.parquet')]
+    return [caminho]
+
+
+def _drenar(buffer: io.BytesIO) -> bytes:
+    dados = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return dados
+
+
+def _gerar_arrow(schema: pa.Schema, lotes, ao_final=None):
+    buffer = io.BytesIO()
+    try:
+        with pa.ipc.new_stream(buffer, schema) as escritor:
+            for lote in lotes:
+                escritor.write_batch(lote)
+                yield _drenar(buffer)
+        yield _drenar(buffer)
+    finally:
+        if ao_final is not None:
+            ao_final()
+
+
+def resposta_arrow(caminho: str, tamanho_lote: int = 8192) -> Response:
+    """
+    Transmite um parquet como Arrow IPC stream, lote a lote, sem converter para pandas.
+
+    Os arquivos são abertos antes de a resposta começar, então a leitura continua
+    válida mesmo que a versão seja removida durante a transmissão.
+    """
+    arquivos = [pq.ParquetFile(nome) for nome in arquivos_parquet(caminho)]
+    lotes = (lote for arquivo in arquivos for lote in arquivo.iter_batches(batch_size=tamanho_lote))
+
+    def fechar():
+        for arquivo in arquivos:
+            arquivo.close()
+    return Response(_gerar_arrow(arquivos[0].schema_arrow, lotes, fechar), status=200, mimetype=MIME_ARROW)
+
+
+def resposta_arrow_tabela(tabela: pa.Table) -> Response:
+    """Transmite uma tabela Arrow já carregada como Arrow IPC stream"""
+    return Response(_gerar_arrow(tabela.schema, tabela.to_batches()), status=200, mimetype=MIME_ARROW)
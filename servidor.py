@@ -1,14 +1,141 @@
 from werkzeug.utils import secure_filename
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, redirect, request, url_for
 from flask_cors import CORS
 from conversor import run
-import pandas as pd
+from blocos import run_blocos
+from lote import PRECEDENCIAS, listar_diretorio, run_lote
+from tarefas import GerenciadorTarefas, FilaCheia
+from snapshots import armazem
+from cache import CacheTabelas
+from metricas import coletor_cache, instrumentar, metricas
+from serializacao import (MIME_JSON, arquivos_parquet, prefere_arrow, resposta_arrow, resposta_arrow_tabela,
+                          tabela_para_json)
+import consultas
+import mudancas
+import uploads
+from cache_analises import cache_analises
+from detector import analisar_excel_completo
+from indice_ean import ARQUIVO_CHAVES, LIMITE_EAN, carregar_indice
+import pyarrow as pa
+import pyarrow.parquet as pq
+import logging
+import os
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 200 * 1024 * 1024
+app.config['IMPORTACAO_WORKERS'] = int(os.environ.get('IMPORTACAO_WORKERS', 1))
+app.config['IMPORTACAO_FILA_MAX'] = int(os.environ.get('IMPORTACAO_FILA_MAX', 4))
+# Estado das importações em disco, para que qualquer worker do producao.py
+# responda GET /importar/<id>
+app.config['TAREFAS_DIRETORIO'] = os.environ.get('RESTOQUE_TAREFAS', os.path.join(armazem.diretorio, 'tarefas'))
+app.config['CACHE_MAX_MB'] = int(os.environ.get('CACHE_MAX_MB', 256))
+app.config['LOOKUP_MAX_EANS'] = int(os.environ.get('LOOKUP_MAX_EANS', 10000))
+# Processos do detector em POST /analisar (1 analisa na própria thread da requisição)
+app.config['ANALISE_PROCESSOS'] = int(os.environ.get('ANALISE_PROCESSOS', 1))
+# Uploads maiores que isto são importados em blocos (blocos.run_blocos), com o
+# pico de memória limitado por RESTOQUE_MEMORIA_MB
+app.config['IMPORTACAO_BLOCOS_MB'] = int(os.environ.get('IMPORTACAO_BLOCOS_MB', 16))
+# Diretório do servidor de onde /importar/lote pode ler planilhas (vazio desativa)
+app.config['LOTE_DIRETORIO'] = os.environ.get('LOTE_DIRETORIO', '')
+app.config['LOTE_PROCESSOS'] = int(os.environ.get('LOTE_PROCESSOS', os.cpu_count() or 1))
+# Endereço do servidor de eventos (python eventos.py), que mantém as conexões SSE
+app.config['EVENTOS_URL'] = os.environ.get('EVENTOS_URL', 'http://localhost:5001/estoque/stream')
 ALLOWED_EXTENSIONS = ['xlsx', 'xls']
-UPLOAD_FOLDER = 'uploads'
+# Uploads são gravados aqui até a importação terminar (veja uploads.py)
+UPLOAD_FOLDER = os.environ.get('RESTOQUE_UPLOADS', 'uploads')
 CORS(app)
+# Latência por rota e GET /metrics (veja metricas.py)
+instrumentar(app, 'servidor')
+
+importacoes = GerenciadorTarefas(
+    max_workers=app.config['IMPORTACAO_WORKERS'],
+    max_fila=app.config['IMPORTACAO_FILA_MAX'],
+    diretorio=app.config['TAREFAS_DIRETORIO']
+)
+
+cache = CacheTabelas(tabela_para_json, max_bytes=app.config['CACHE_MAX_MB'] * 1024 * 1024)
+armazem.ao_publicar(cache.invalidar)
+metricas.ao_coletar(coletor_cache(cache, 'tabelas'))
+metricas.ao_coletar(coletor_cache(cache_analises, 'analises'))
+
+def preaquecer():
+    """
+    Carrega a versão atual no cache e abre o índice de EANs. O producao.py
+    chama esta função no processo principal antes de criar os workers, que
+    herdam as tabelas por copy-on-write em vez de cada um ler os parquets.
+
+    Returns:
+        int: Versão carregada, ou None se nada foi publicado
+    """
+    cache.invalidar()
+    with armazem.fixar() as versao:
+        if versao is None:
+            return None
+        for nome in ('estoque.parquet', 'tabela.parquet'):
+            cache.obter(armazem.caminho(versao, nome), versao)
+        if os.path.exists(armazem.caminho(versao, ARQUIVO_CHAVES)):
+            carregar_indice(armazem, versao)
+    return versao
+
+def responder_consulta(nome):
+    versao_pedida = None
+    if request.args.get('cursor'):
+        versao_pedida = consultas.decodificar_cursor(request.args['cursor'])[0]
+
+    with armazem.fixar(versao_pedida) as versao:
+        if versao is None:
+            if versao_pedida is not None:
+                return jsonify({'erro': 'A versão do cursor não está mais disponível'}), 410
+            return jsonify({'erro': 'Nenhuma importação publicada'}), 404
+        caminho = armazem.caminho(versao, nome)
+        consulta = consultas.montar_consulta(request.args, pq.read_schema(arquivos_parquet(caminho)[0]), nome)
+        tabela, proximo = consultas.executar(caminho, consulta)
+
+    if prefere_arrow(request):
+        resposta = resposta_arrow_tabela(tabela)
+    else:
+        resposta = Response(tabela_para_json(tabela), status=200, mimetype=MIME_JSON)
+    resposta.headers['X-Versao'] = str(versao)
+    if proximo is not None:
+        cursor = consultas.codificar_cursor(versao, *proximo)
+        resposta.headers['X-Proximo-Cursor'] = cursor
+        argumentos = request.args.to_dict()
+        argumentos['cursor'] = cursor
+        resposta.headers['Link'] = f'<{url_for(request.endpoint, **argumentos)}>; rel="next"'
+    return resposta
+
+def responder_parquet(nome):
+    if consultas.tem_consulta(request.args):
+        try:
+            return responder_consulta(nome)
+        except consultas.ConsultaInvalida as e:
+            return jsonify({'erro': str(e)}), 400
+
+    with armazem.fixar() as versao:
+        if versao is None:
+            return jsonify({'erro': 'Nenhuma importação publicada'}), 404
+        caminho = armazem.caminho(versao, nome)
+        if prefere_arrow(request):
+            return resposta_arrow(caminho)
+        entrada = cache.obter(caminho, versao)
+    return Response(entrada.json, status=200, mimetype=MIME_JSON)
+
+def importar_upload(upload, etapas):
+    """
+    Tarefa de importação de um upload, lido do arquivo mapeado em memória.
+    A planilha é ignorada se ficou idêntica à da versão atual enquanto
+    esperava na fila (reenvio do mesmo arquivo); o arquivo é removido no final.
+    """
+    try:
+        versao = uploads.versao_identica(armazem, upload.sha256)
+        if versao is not None:
+            logging.info(f"{upload.nome} é idêntica à planilha da versão {versao}, importação ignorada")
+            return {'ignorada': True, 'versao': versao}
+        importar = run_blocos if upload.tamanho > app.config['IMPORTACAO_BLOCOS_MB'] * 1024 * 1024 else run
+        with uploads.ArquivoMapeado(upload.caminho) as arquivo:
+            return importar(arquivo, etapas, origem=upload.origem())
+    finally:
+        upload.remover()
 
 @app.route('/importar', methods=['POST'])
 def processar_planilhas():
@@ -30,29 +157,249 @@ def processar_planilhas():
         if not filename:
             return jsonify({'erro': 'Nome de arquivo inválido'}), 400
         
-        run(file)
-        
-        return jsonify({'mensagem': 'Planilhas recebidas com sucesso!'}), 200
+        # O stream do upload é fechado ao fim da requisição, então o conteúdo
+        # é gravado em disco antes de ir para a fila
+        upload = uploads.receber(file.stream, UPLOAD_FOLDER, filename)
+        if not upload.tamanho:
+            upload.remover()
+            return jsonify({'erro': 'Arquivo vazio'}), 400
+        versao = uploads.versao_identica(armazem, upload.sha256)
+        if versao is not None:
+            upload.remover()
+            return jsonify({
+                'mensagem': 'Planilha idêntica à da versão atual, importação ignorada',
+                'versao': versao
+            }), 200
+        try:
+            tarefa = importacoes.enviar(importar_upload, upload, descricao=filename)
+        except FilaCheia:
+            upload.remover()
+            resposta = jsonify({'erro': 'Fila de importação cheia, tente novamente mais tarde'})
+            return resposta, 429, {'Retry-After': '30'}
+
+        return jsonify({
+            'mensagem': 'Planilhas recebidas com sucesso!',
+            'tarefa': tarefa.id,
+            'status': f'/importar/{tarefa.id}'
+        }), 202
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
 
+@app.route('/analisar', methods=['POST'])
+def analisar_planilha():
+    try:
+        if 'arquivo' not in request.files:
+            return jsonify({'erro': 'Nenhum arquivo enviado'}), 400
+
+        file = request.files['arquivo']
+        filename = secure_filename(file.filename)
+        if not filename.endswith('.xlsx'):
+            return jsonify({'erro': 'Tipo de arquivo não permitido'}), 400
+        try:
+            margem_erro = float(request.form['margem_erro']) if request.form.get('margem_erro') else None
+        except ValueError:
+            return jsonify({'erro': 'margem_erro deve ser numérica'}), 400
+
+        # O hash calculado na gravação é a chave do relatório no cache
+        upload = uploads.receber(file.stream, UPLOAD_FOLDER, filename)
+        try:
+            if not upload.tamanho:
+                return jsonify({'erro': 'Arquivo vazio'}), 400
+            estatisticas = {}
+            with uploads.ArquivoMapeado(upload.caminho) as arquivo:
+                relatorio = analisar_excel_completo(arquivo, processos=app.config['ANALISE_PROCESSOS'],
+                                                    margem_erro=margem_erro, cache=cache_analises,
+                                                    sha256=upload.sha256, estatisticas=estatisticas)
+        finally:
+            upload.remover()
+
+        return jsonify({
+            'arquivo': filename,
+            'sha256': upload.sha256,
+            'abas': {aba: df.to_dict(orient='records') for aba, df in relatorio.items()},
+            'cache': estatisticas
+        }), 200
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+@app.route('/importar/lote', methods=['POST'])
+def importar_lote():
+    try:
+        precedencia = request.form.get('precedencia') or request.args.get('precedencia', 'ultimo')
+        if precedencia not in PRECEDENCIAS:
+            return jsonify({'erro': f"Precedência inválida, use uma de {list(PRECEDENCIAS)}"}), 400
+
+        arquivos = request.files.getlist('arquivos')
+        recebidos = []
+        if arquivos:
+            # Upload multipart: a ordem dos arquivos no formulário define a precedência
+            nomes = [secure_filename(file.filename or '') for file in arquivos]
+            for file, filename in zip(arquivos, nomes):
+                if not filename or not filename.endswith('.xlsx'):
+                    return jsonify({'erro': f'Arquivo inválido: {file.filename}'}), 400
+            # Gravados em disco como em /importar; o pool do lote recebe só os caminhos
+            recebidos = [uploads.receber(file.stream, UPLOAD_FOLDER, filename)
+                         for file, filename in zip(arquivos, nomes)]
+            origens = [(upload.nome, upload.caminho) for upload in recebidos]
+            descricao = f'lote de {len(origens)} arquivos'
+        else:
+            # Subdiretório de LOTE_DIRETORIO no servidor, em ordem de nome
+            base = app.config['LOTE_DIRETORIO']
+            subdiretorio = request.form.get('diretorio') or request.args.get('diretorio')
+            if not base or subdiretorio is None:
+                return jsonify({'erro': "Envie os arquivos no campo 'arquivos' ou informe 'diretorio'"}), 400
+            diretorio = os.path.realpath(os.path.join(base, subdiretorio))
+            if os.path.commonpath([diretorio, os.path.realpath(base)]) != os.path.realpath(base):
+                return jsonify({'erro': 'Diretório inválido'}), 400
+            if not os.path.isdir(diretorio):
+                return jsonify({'erro': 'Diretório não encontrado'}), 404
+            origens = [(os.path.basename(caminho), caminho) for caminho in listar_diretorio(diretorio)]
+            descricao = f'lote {subdiretorio}'
+        if not origens:
+            return jsonify({'erro': 'Nenhuma planilha encontrada'}), 400
+
+        def importar(origens, etapas):
+            try:
+                return run_lote(origens, etapas, precedencia, app.config['LOTE_PROCESSOS'])
+            finally:
+                for upload in recebidos:
+                    upload.remover()
+
+        try:
+            tarefa = importacoes.enviar(importar, origens, descricao=descricao)
+        except FilaCheia:
+            for upload in recebidos:
+                upload.remover()
+            resposta = jsonify({'erro': 'Fila de importação cheia, tente novamente mais tarde'})
+            return resposta, 429, {'Retry-After': '30'}
+
+        return jsonify({
+            'mensagem': f'{len(origens)} planilhas recebidas com sucesso!',
+            'tarefa': tarefa.id,
+            'status': f'/importar/{tarefa.id}'
+        }), 202
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+@app.route('/importar/<tarefa_id>', methods=['GET'])
+def status_importacao(tarefa_id):
+    tarefa = importacoes.obter(tarefa_id)
+    if tarefa is None:
+        return jsonify({'erro': 'Tarefa não encontrada'}), 404
+    return jsonify(tarefa.para_dict()), 200
+
 @app.route('/estoque', methods=['GET'])
 def obter_estoque():
     try:
-        df = pd.read_parquet('estoque.parquet', engine='pyarrow')
-        dados_json = df.to_dict(orient='records')
-        return jsonify(dados_json), 200
+        return responder_parquet('estoque.parquet')
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+@app.route('/estoque/stream', methods=['GET'])
+def stream_estoque():
+    # As conexões SSE ficam abertas por muito tempo; elas são atendidas pelo
+    # event loop de eventos.py em vez de ocupar uma thread do Flask cada
+    destino = app.config['EVENTOS_URL']
+    if request.query_string:
+        destino += '?' + request.query_string.decode('utf-8')
+    return redirect(destino, code=307)
+
+@app.route('/estoque/<int:ean>', methods=['GET'])
+def obter_estoque_ean(ean):
+    try:
+        with armazem.fixar() as versao:
+            if versao is None:
+                return jsonify({'erro': 'Nenhuma importação publicada'}), 404
+            estoque = carregar_indice(armazem, versao).buscar(ean)
+        if estoque is None:
+            return jsonify({'erro': f'EAN {ean} não encontrado'}), 404
+        return jsonify({'ean': ean, 'estoque': estoque, 'versao': versao}), 200
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+def ean_lookup(valor) -> int:
+    """EAN do corpo do lookup; booleanos e valores fora de [0, LIMITE_EAN) são recusados (ValueError)"""
+    if isinstance(valor, bool):
+        raise ValueError(f"EAN inválido: {valor}")
+    ean = int(valor)
+    if not 0 <= ean < LIMITE_EAN:
+        raise ValueError(f"EAN fora do intervalo: {valor}")
+    return ean
+
+@app.route('/estoque/lookup', methods=['POST'])
+def buscar_estoques():
+    try:
+        corpo = request.get_json(silent=True) or {}
+        eans = corpo.get('eans')
+        if not isinstance(eans, list) or not eans:
+            return jsonify({'erro': "Envie uma lista de EANs no campo 'eans'"}), 400
+        if len(eans) > app.config['LOOKUP_MAX_EANS']:
+            return jsonify({'erro': f"Máximo de {app.config['LOOKUP_MAX_EANS']} EANs por requisição"}), 400
+        try:
+            eans = [ean_lookup(ean) for ean in eans]
+        except (TypeError, ValueError):
+            return jsonify({'erro': 'Todos os EANs devem ser numéricos'}), 400
+
+        with armazem.fixar() as versao:
+            if versao is None:
+                return jsonify({'erro': 'Nenhuma importação publicada'}), 404
+            valores, encontrados = carregar_indice(armazem, versao).buscar_lote(eans)
+
+        estoque = {}
+        nao_encontrados = []
+        for ean, valor, achou in zip(eans, valores.tolist(), encontrados.tolist()):
+            if achou:
+                estoque[str(ean)] = valor
+            else:
+                nao_encontrados.append(ean)
+        return jsonify({'versao': versao, 'estoque': estoque, 'nao_encontrados': nao_encontrados}), 200
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
 
 @app.route('/tabela', methods=['GET'])
 def obter_tabela():
     try:
-        df = pd.read_parquet('tabela.parquet', engine='pyarrow')
-        dados_json = df.to_dict(orient='records')
-        return jsonify(dados_json), 200
+        return responder_parquet('tabela.parquet')
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
 
+@app.route('/mudancas', methods=['GET'])
+def obter_mudancas():
+    try:
+        try:
+            desde = int(request.args['desde'])
+        except (KeyError, ValueError):
+            return jsonify({'erro': "Informe a versão de origem no parâmetro 'desde'"}), 400
+        nome = request.args.get('tabela', 'estoque')
+        if nome not in mudancas.ABAS:
+            return jsonify({'erro': f"Tabela inválida, use uma de {list(mudancas.ABAS)}"}), 400
+
+        with armazem.fixar() as versao:
+            if versao is None:
+                return jsonify({'erro': 'Nenhuma importação publicada'}), 404
+            if desde > versao or desde < 0:
+                return jsonify({'erro': f'Versão {desde} inválida; a versão atual é {versao}'}), 400
+            try:
+                df = mudancas.mudancas_desde(armazem, desde, nome, versao)
+            except mudancas.VersaoIndisponivel as e:
+                # O consumidor precisa recarregar tudo (GET /estoque ou /tabela)
+                return jsonify({'erro': str(e), 'versao': versao}), 410
+
+        if prefere_arrow(request):
+            resposta = resposta_arrow_tabela(pa.Table.from_pandas(df, preserve_index=False))
+        else:
+            # Direto do DataFrame com tipos Arrow: inteiros das remoções ficam null, não NaN
+            json = df.to_json(orient='records', date_format='iso', force_ascii=False).encode('utf-8')
+            resposta = Response(json, status=200, mimetype=MIME_JSON)
+        resposta.headers['X-Versao'] = str(versao)
+        return resposta
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+@app.route('/cache', methods=['GET'])
+def estatisticas_cache():
+    return jsonify(cache.estatisticas()), 200
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # Servidor de desenvolvimento; em produção use python producao.py servidor
+    app.run(debug=os.environ.get('RESTOQUE_DEBUG') == '1', host='0.0.0.0', port=5000)
@@ -0,0 +1,265 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from time import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: apenas o lock entre threads é usado
+    fcntl = None
+
+
+def _fsync_arquivo(caminho):
+    with open(caminho, 'rb') as arquivo:
+        os.fsync(arquivo.fileno())
+
+
+def _fsync_diretorio(caminho):
+    if os.name == 'nt':
+        return
+    fd = os.open(caminho, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class EscritaVersao:
+    def __init__(self, diretorio: str):
+        """
+        Versão em preparação: os arquivos são gravados em `diretorio` e só
+        ficam visíveis aos leitores depois de publicados.
+        """
+        self.diretorio = diretorio
+        self.versao = None
+        self.metadados = {}
+
+    def caminho(self, nome: str) -> str:
+        """Caminho de um arquivo dentro da versão em preparação"""
+        return os.path.join(self.diretorio, nome)
+
+
+class ArmazemSnapshots:
+    ATUAL = 'ATUAL'
+    MANIFESTO = 'manifesto.json'
+
+    def __init__(self, diretorio: str = 'dados', retencao: int = 5, carencia: float = 60.0):
+        """
+        Armazena os parquets gerados em versões imutáveis
+
+        Cada importação grava em um diretório novo e, ao final, o ponteiro
+        ATUAL é trocado de forma atômica. Leitores fixam uma versão e nunca
+        veem arquivos pela metade.
+
+        Args:
+            diretorio (str): Pasta raiz do armazenamento
+            retencao (int): Quantidade de versões antigas mantidas
+            carencia (float): Segundos que uma versão substituída ainda é mantida,
+                para leitores de outros processos que já a estejam lendo
+        """
+        self.diretorio = diretorio
+        self.diretorio_versoes = os.path.join(diretorio, 'versoes')
+        self.diretorio_tmp = os.path.join(diretorio, 'tmp')
+        self.retencao = retencao
+        self.carencia = carencia
+        self.lock = threading.Lock()
+        self.fixadas = {}
+        self.ouvintes = []
+
+    def ao_publicar(self, funcao) -> None:
+        """Registra uma função chamada com o número de cada versão publicada neste processo"""
+        self.ouvintes.append(funcao)
+
+    def _garantir_diretorios(self):
+        os.makedirs(self.diretorio_versoes, exist_ok=True)
+        os.makedirs(self.diretorio_tmp, exist_ok=True)
+
+    def versoes(self) -> list:
+        """Versões publicadas, em ordem crescente"""
+        if not os.path.isdir(self.diretorio_versoes):
+            return []
+        return sorted(int(nome) for nome in os.listdir(self.diretorio_versoes) if nome.isdigit())
+
+    def versao_atual(self):
+        """Versão apontada por ATUAL ou None se nada foi publicado"""
+        try:
+            with open(os.path.join(self.diretorio, self.ATUAL), encoding='utf-8') as arquivo:
+                return int(arquivo.read().strip())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def diretorio_versao(self, versao: int) -> str:
+        return os.path.join(self.diretorio_versoes, f"{versao:08d}")
+
+    def caminho(self, versao: int, nome: str) -> str:
+        """Caminho de um arquivo de uma versão publicada"""
+        return os.path.join(self.diretorio_versao(versao), nome)
+
+    def manifesto(self, versao: int) -> dict:
+        """Manifesto gravado junto com a versão"""
+        with open(self.caminho(versao, self.MANIFESTO), encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+
+    @contextmanager
+    def fixar(self, versao: int = None):
+        """
+        Fixa uma versão enquanto o bloco estiver aberto, impedindo que a
+        coleta de lixo a remova.
+
+        Args:
+            versao (int): Versão desejada; None fixa a versão atual
+
+        Yields:
+            int: Versão fixada, ou None se nada foi publicado ou se a versão
+            pedida já foi removida
+        """
+        with self.lock:
+            if versao is None:
+                versao = self.versao_atual()
+            elif not os.path.isdir(self.diretorio_versao(versao)):
+                versao = None
+            if versao is not None:
+                self.fixadas[versao] = self.fixadas.get(versao, 0) + 1
+        try:
+            yield versao
+        finally:
+            if versao is not None:
+                with self.lock:
+                    self.fixadas[versao] -= 1
+                    if not self.fixadas[versao]:
+                        del self.fixadas[versao]
+
+    @contextmanager
+    def nova_versao(self):
+        """
+        Prepara uma nova versão. Se o bloco terminar sem erro, os arquivos
+        gravados são sincronizados em disco e a versão é publicada.
+
+        Yields:
+            EscritaVersao: Destino da gravação; `versao` é preenchido na publicação
+        """
+        self._garantir_diretorios()
+        escrita = EscritaVersao(tempfile.mkdtemp(dir=self.diretorio_tmp))
+        try:
+            yield escrita
+            escrita.versao = self._publicar(escrita)
+        except BaseException:
+            shutil.rmtree(escrita.diretorio, ignore_errors=True)
+            raise
+        for funcao in self.ouvintes:
+            try:
+                funcao(escrita.versao)
+            except Exception as e:
+                logging.error(f"Erro ao notificar publicação da versão {escrita.versao}: {e}")
+        self.coletar_lixo()
+
+    @contextmanager
+    def _lock_publicacao(self):
+        with self.lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.diretorio, '.lock'), 'w') as arquivo_lock:
+                fcntl.flock(arquivo_lock, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(arquivo_lock, fcntl.LOCK_UN)
+
+    def _publicar(self, escrita: EscritaVersao) -> int:
+        # Parquets particionados são subdiretórios da versão
+        arquivos = []
+        for raiz, _, nomes in os.walk(escrita.diretorio):
+            for nome in nomes:
+                caminho = os.path.join(raiz, nome)
+                _fsync_arquivo(caminho)
+                arquivos.append(os.path.relpath(caminho, escrita.diretorio).replace(os.sep, '/'))
+            if raiz != escrita.diretorio:
+                _fsync_diretorio(raiz)
+        arquivos.sort()
+
+        with self._lock_publicacao():
+            versoes = self.versoes()
+            versao = (versoes[-1] if versoes else 0) + 1
+
+            manifesto = {
+                'versao': versao,
+                'criada_em': datetime.now().isoformat(),
+                'arquivos': arquivos,
+                **escrita.metadados,
+            }
+            with open(escrita.caminho(self.MANIFESTO), 'w', encoding='utf-8') as arquivo:
+                json.dump(manifesto, arquivo, ensure_ascii=False)
+                arquivo.flush()
+                os.fsync(arquivo.fileno())
+            _fsync_diretorio(escrita.diretorio)
+
+            destino = self.diretorio_versao(versao)
+            os.rename(escrita.diretorio, destino)
+            escrita.diretorio = destino
+            _fsync_diretorio(self.diretorio_versoes)
+
+            ponteiro_tmp = os.path.join(self.diretorio, f"{self.ATUAL}.{os.getpid()}.tmp")
+            with open(ponteiro_tmp, 'w', encoding='utf-8') as arquivo:
+                arquivo.write(str(versao))
+                arquivo.flush()
+                os.fsync(arquivo.fileno())
+            os.replace(ponteiro_tmp, os.path.join(self.diretorio, self.ATUAL))
+            _fsync_diretorio(self.diretorio)
+
+        logging.info(f"Versão {versao} publicada em {destino}")
+        return versao
+
+    def coletar_lixo(self) -> list:
+        """
+        Remove versões antigas além da retenção, exceto a atual, as fixadas e
+        as substituídas há menos tempo que a carência.
+
+        Returns:
+            list: Versões removidas
+        """
+        atual = self.versao_atual()
+        versoes = self.versoes()
+        antigas = [v for v in versoes if atual is not None and v < atual]
+        candidatas = antigas[:max(0, len(antigas) - self.retencao)]
+
+        removidas = []
+        agora = time()
+        self._garantir_diretorios()
+        for versao in candidatas:
+            # A versão foi substituída quando a seguinte foi publicada
+            seguinte = versoes[versoes.index(versao) + 1]
+            try:
+                substituida_em = os.path.getmtime(self.diretorio_versao(seguinte))
+            except FileNotFoundError:
+                substituida_em = agora
+            if agora - substituida_em < self.carencia:
+                continue
+            # Sob o lock a versão sai de versoes/ (fixar passa a vê-la como
+            # removida); os arquivos são apagados depois, fora do lock
+            lapide = os.path.join(self.diretorio_tmp, f"{versao:08d}.removida")
+            with self.lock:
+                if versao in self.fixadas:
+                    continue
+                shutil.rmtree(lapide, ignore_errors=True)
+                try:
+                    os.rename(self.diretorio_versao(versao), lapide)
+                except FileNotFoundError:
+                    continue
+            shutil.rmtree(lapide, ignore_errors=True)
+            removidas.append(versao)
+
+        if removidas:
+            logging.info(f"Versões removidas pela retenção: {removidas}")
+        return removidas
+
+
+armazem = ArmazemSnapshots(
+    diretorio=os.environ.get('RESTOQUE_DADOS', 'dados'),
+    retencao=int(os.environ.get('RESTOQUE_RETENCAO', 5)),
+)
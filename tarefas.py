@@ -0,0 +1,161 @@
+import json
+import logging
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+class FilaCheia(Exception):
+    """Levantada quando não há espaço na fila para uma nova tarefa"""
+
+
+class Tarefa:
+    NA_FILA = 'na_fila'
+    PROCESSANDO = 'processando'
+    CONCLUIDA = 'concluida'
+    ERRO = 'erro'
+
+    def __init__(self, descricao: str = ''):
+        self.id = uuid.uuid4().hex
+        self.descricao = descricao
+        self.estado = Tarefa.NA_FILA
+        self.criada_em = datetime.now()
+        self.iniciada_em = None
+        self.finalizada_em = None
+        self.etapas = {}
+        self.resultado = None
+        self.erro = None
+
+    def para_dict(self) -> dict:
+        """Representação da tarefa para a resposta JSON"""
+        return {
+            'id': self.id,
+            'descricao': self.descricao,
+            'estado': self.estado,
+            'criada_em': self.criada_em.isoformat(),
+            'iniciada_em': self.iniciada_em.isoformat() if self.iniciada_em else None,
+            'finalizada_em': self.finalizada_em.isoformat() if self.finalizada_em else None,
+            'etapas': dict(self.etapas),
+            'resultado': self.resultado,
+            'erro': self.erro,
+        }
+
+    @classmethod
+    def de_dict(cls, dados: dict) -> 'Tarefa':
+        """Reconstrói a tarefa a partir de para_dict (gravada por outro processo)"""
+        tarefa = cls(dados['descricao'])
+        tarefa.id = dados['id']
+        tarefa.estado = dados['estado']
+        for campo in ('criada_em', 'iniciada_em', 'finalizada_em'):
+            setattr(tarefa, campo, datetime.fromisoformat(dados[campo]) if dados[campo] else None)
+        tarefa.etapas = dados['etapas']
+        tarefa.resultado = dados['resultado']
+        tarefa.erro = dados['erro']
+        return tarefa
+
+
+class GerenciadorTarefas:
+    def __init__(self, max_workers: int = 1, max_fila: int = 4, historico: int = 100, diretorio: str = None):
+        """
+        Executa tarefas em segundo plano com fila limitada
+
+        Args:
+            max_workers (int): Quantidade de tarefas executadas ao mesmo tempo
+            max_fila (int): Quantidade de tarefas que podem aguardar na fila
+            historico (int): Quantidade de tarefas finalizadas mantidas para consulta
+            diretorio (str): Se informado, o estado de cada tarefa é gravado em
+                um JSON nesta pasta, então qualquer processo que use a mesma
+                pasta (workers do producao.py) consegue consultá-la
+        """
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='importacao')
+        self.vagas = threading.BoundedSemaphore(max_workers + max_fila)
+        self.historico = historico
+        self.diretorio = diretorio
+        self.tarefas = OrderedDict()
+        self.lock = threading.Lock()
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+
+    def enviar(self, funcao, *args, descricao: str = '') -> Tarefa:
+        """
+        Enfileira uma função para execução em segundo plano
+
+        A função recebe os argumentos informados e, por último, o dicionário
+        de etapas da tarefa, onde registra o tempo de cada etapa.
+
+        Raises:
+            FilaCheia: Se todas as vagas da fila estiverem ocupadas
+        """
+        if not self.vagas.acquire(blocking=False):
+            raise FilaCheia("Fila de importação cheia")
+
+        tarefa = Tarefa(descricao)
+        with self.lock:
+            self.tarefas[tarefa.id] = tarefa
+            self._limpar_historico()
+        self._gravar(tarefa)
+
+        try:
+            self.executor.submit(self._executar, tarefa, funcao, args)
+        except Exception:
+            self.vagas.release()
+            raise
+        return tarefa
+
+    def obter(self, tarefa_id: str):
+        """Retorna a tarefa pelo id ou None se não existir"""
+        with self.lock:
+            tarefa = self.tarefas.get(tarefa_id)
+        if tarefa is not None or not self.diretorio or not re.fullmatch(r'[0-9a-f]{32}', tarefa_id):
+            return tarefa
+        # Tarefa enviada a outro processo
+        try:
+            with open(self._caminho(tarefa_id), encoding='utf-8') as arquivo:
+                return Tarefa.de_dict(json.load(arquivo))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _caminho(self, tarefa_id):
+        return os.path.join(self.diretorio, f"{tarefa_id}.json")
+
+    def _gravar(self, tarefa):
+        if not self.diretorio:
+            return
+        try:
+            temporario = f"{self._caminho(tarefa.id)}.{threading.get_ident()}.tmp"
+            with open(temporario, 'w', encoding='utf-8') as arquivo:
+                json.dump(tarefa.para_dict(), arquivo, ensure_ascii=False, default=str)
+            os.replace(temporario, self._caminho(tarefa.id))
+        except OSError as e:
+            logging.error(f"Erro ao gravar o estado da tarefa {tarefa.id}: {e}")
+
+    def _executar(self, tarefa, funcao, args):
+        tarefa.estado = Tarefa.PROCESSANDO
+        tarefa.iniciada_em = datetime.now()
+        self._gravar(tarefa)
+        try:
+            tarefa.resultado = funcao(*args, tarefa.etapas)
+            tarefa.estado = Tarefa.CONCLUIDA
+        except Exception as e:
+            logging.error(f"Tarefa {tarefa.id} falhou: {e}")
+            tarefa.estado = Tarefa.ERRO
+            tarefa.erro = f"{type(e).__name__}: {e}"
+        finally:
+            tarefa.finalizada_em = datetime.now()
+            self._gravar(tarefa)
+            self.vagas.release()
+
+    def _limpar_historico(self):
+        finalizadas = [t.id for t in self.tarefas.values()
+                       if t.estado in (Tarefa.CONCLUIDA, Tarefa.ERRO)]
+        for tarefa_id in finalizadas[:max(0, len(finalizadas) - self.historico)]:
+            del self.tarefas[tarefa_id]
+            if self.diretorio:
+                try:
+                    os.remove(self._caminho(tarefa_id))
+                except FileNotFoundError:
+                    pass
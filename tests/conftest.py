@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+
+# Os módulos leem o diretório de dados, o registro de esquemas e o banco na
+# importação; os testes nunca tocam os dados reais do projeto (RESTOQUE_BANCO
+# vazio desativa a sincronização do banco)
+_DIRETORIO = tempfile.mkdtemp(prefix='restoque-testes-')
+os.environ['RESTOQUE_DADOS'] = os.path.join(_DIRETORIO, 'dados')
+os.environ['RESTOQUE_ESQUEMAS'] = os.path.join(_DIRETORIO, 'esquemas.json')
+os.environ['RESTOQUE_BANCO'] = ''
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
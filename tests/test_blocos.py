@@ -0,0 +1,64 @@
+import os
+
+import openpyxl
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import conversor
+from benchmarks.gerador import CABECALHO_ESTOQUE, gerar_planilha
+from blocos import _gravar_aba, run_blocos
+from snapshots import armazem
+
+
+def planilha_estoque(caminho, codigos):
+    workbook = openpyxl.Workbook(write_only=True)
+    estoque = workbook.create_sheet('Estoque')
+    estoque.append(CABECALHO_ESTOQUE)
+    for i, codigo in enumerate(codigos):
+        estoque.append([5000 + i % 3, f"FORNECEDOR {i % 3}", codigo, f"PRODUTO {i}", 7890000000000 + i,
+                        'MED', 0, i, i])
+    workbook.save(caminho)
+
+
+def test_inteiro_que_estoura_int32_em_bloco_seguinte_vira_int64(tmp_path):
+    codigos = list(range(25)) + [3_000_000_000] + list(range(26, 40))
+    planilha_estoque(os.path.join(tmp_path, 'p.xlsx'), codigos)
+    destino = os.path.join(tmp_path, 'estoque.parquet')
+
+    workbook = openpyxl.load_workbook(os.path.join(tmp_path, 'p.xlsx'), read_only=True)
+    resumo = _gravar_aba(workbook['Estoque'], destino, 10, {})
+    workbook.close()
+
+    tabela = pq.read_table(destino)
+    assert tabela.schema.field('Cód. Produto').type == pa.int64()
+    assert tabela.schema.field('Estoque Disponivel').type == pa.int32()
+    assert tabela.column('Cód. Produto').to_pylist() == codigos
+    assert resumo['linhas'] == 40
+    # Os segmentos gravados antes do alargamento foram juntados e removidos
+    assert sorted(os.listdir(tmp_path)) == ['estoque.parquet', 'p.xlsx']
+
+
+def test_run_blocos_grava_como_o_conversor(tmp_path):
+    arquivo = os.path.join(tmp_path, 'sintetica.xlsx')
+    gerar_planilha(arquivo, 3000, fornecedores=20)
+
+    conversor.run(arquivo)
+    versao_conversor = armazem.versao_atual()
+    run_blocos(arquivo, orcamento_mb=1)
+    versao_blocos = armazem.versao_atual()
+    run_blocos(arquivo, orcamento_mb=1)
+
+    for nome in ('estoque.parquet', 'tabela.parquet'):
+        esperado = ds.dataset(armazem.caminho(versao_conversor, nome), format='parquet').to_table()
+        gravado = ds.dataset(armazem.caminho(versao_blocos, nome), format='parquet').to_table()
+        # Mesmas linhas na mesma ordem (os dicionários das categorias podem diferir)
+        assert gravado.to_pylist() == esperado.to_pylist()
+    assert os.listdir(armazem.caminho(versao_blocos, 'estoque.parquet')) == \
+        os.listdir(armazem.caminho(versao_conversor, 'estoque.parquet'))
+    assert armazem.manifesto(versao_blocos)['particoes'] == armazem.manifesto(versao_conversor)['particoes']
+    assert not [nome for nome in os.listdir(armazem.diretorio_versao(versao_blocos)) if '.blocos.' in nome]
+
+    # A reimportação da mesma planilha liga todas as partições por hardlink
+    particoes = armazem.caminho(armazem.versao_atual(), 'estoque.parquet')
+    assert all(os.stat(os.path.join(particoes, nome)).st_nlink > 1 for nome in os.listdir(particoes))
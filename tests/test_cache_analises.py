@@ -0,0 +1,48 @@
+import pandas as pd
+
+from cache_analises import CacheAnalises, hash_coluna
+
+
+def test_obter_retorna_o_valor_gravado(tmp_path):
+    cache = CacheAnalises(str(tmp_path))
+    chave = cache.chave('coluna', 'Estoque', 'EAN', 'abc', None)
+
+    assert cache.obter(chave) is None
+    cache.gravar(chave, ['INTEIRO', 100.0])
+
+    assert cache.obter(chave) == ['INTEIRO', 100.0]
+    assert cache.estatisticas()['acertos'] == 1
+    assert cache.estatisticas()['falhas'] == 1
+
+
+def test_regravar_chave_nao_acumula_tamanho(tmp_path):
+    cache = CacheAnalises(str(tmp_path))
+    chave = cache.chave('relatorio', 'abc', None)
+    cache.gravar(chave, ['STRING', 1.0])
+    for i in range(10):
+        cache.gravar(chave, ['STRING', float(i)])
+
+    estatisticas = cache.estatisticas()
+    cache._recontar()
+    assert (estatisticas['bytes'], estatisticas['entradas']) == (cache.bytes, cache.entradas) == (cache.bytes, 1)
+
+
+def test_descarta_as_entradas_menos_usadas(tmp_path):
+    cache = CacheAnalises(str(tmp_path), max_bytes=200)
+    chaves = [cache.chave('x', i) for i in range(30)]
+    for i, chave in enumerate(chaves):
+        cache.gravar(chave, ['STRING', float(i)])
+        # Renova a primeira entrada a cada gravação, então ela nunca é a mais antiga
+        cache.obter(chaves[0])
+
+    assert cache.estatisticas()['bytes'] <= 200
+    assert cache.estatisticas()['descartes'] > 0
+    assert cache.obter(chaves[0]) is not None
+    assert cache.obter(chaves[1]) is None
+    assert cache.obter(chaves[-1]) is not None
+
+
+def test_hash_coluna_distingue_tipos_misturados():
+    assert hash_coluna(pd.Series([1, 'a'], dtype=object)) != hash_coluna(pd.Series(['1', 'a'], dtype=object))
+    assert hash_coluna(pd.Series([1, 2])) == hash_coluna(pd.Series([1, 2]))
+    assert hash_coluna(pd.Series([1, 2])) != hash_coluna(pd.Series([2, 1]))
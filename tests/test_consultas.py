@@ -0,0 +1,110 @@
+import os
+
+import pandas as pd
+import pyarrow.dataset as ds
+import pytest
+
+import consultas
+from consultas import ConsultaInvalida, decodificar_cursor, executar, montar_consulta
+from conversor import gravar_parquet, gravar_particionado
+
+
+@pytest.fixture
+def estoque(tmp_path):
+    """Estoque particionado por fornecedor, com EANs repetidos e linhas sem fornecedor"""
+    linhas = []
+    for i in range(40):
+        linhas.append({
+            'Cód. Fornecedor': [7, 12, 100, None][i % 4],
+            'Categoria': ['MED', 'PERF', 'HIG'][i % 3],
+            # Cada combinação de fornecedor, categoria e EAN se repete em 3 ou 4 linhas
+            'EAN': 7890000000000 + i % 2,
+            'Cód. Produto': i,
+            'Estoque Disponivel': i % 5,
+        })
+    df = pd.DataFrame(linhas).astype({'Cód. Fornecedor': 'Int64', 'EAN': 'uint64'})
+    caminho = os.path.join(tmp_path, 'estoque.parquet')
+    gravar_particionado(df, caminho, 'estoque.parquet')
+    return caminho
+
+
+def paginar(caminho, nome, args):
+    """Segue o cursor até o fim, devolvendo as linhas de todas as páginas"""
+    schema = ds.dataset(caminho, format='parquet').schema
+    linhas = []
+    argumentos = dict(args)
+    for _ in range(100):
+        consulta = montar_consulta(argumentos, schema, nome)
+        tabela, proximo = executar(caminho, consulta)
+        linhas.extend(tabela.to_pylist())
+        if proximo is None:
+            return linhas
+        argumentos['cursor'] = consultas.codificar_cursor(1, *proximo)
+    raise AssertionError("O cursor não terminou")
+
+
+def test_cursor_percorre_todas_as_linhas_na_ordem(estoque):
+    todas = ds.dataset(estoque, format='parquet').to_table().to_pylist()
+
+    for limite in (1, 2, 3, 7, 40, 41):
+        assert paginar(estoque, 'estoque.parquet', {'limit': str(limite)}) == todas
+
+
+def test_cursor_com_filtro_e_projecao_sem_as_chaves(estoque):
+    linhas = paginar(estoque, 'estoque.parquet', {'limit': '2', 'categoria': 'MED,HIG', 'columns': 'cod_produto'})
+
+    assert sorted(linha['Cód. Produto'] for linha in linhas) == [i for i in range(40) if i % 3 != 1]
+    assert all(list(linha) == ['Cód. Produto'] for linha in linhas)
+
+
+def test_ultima_pagina_nao_tem_cursor(estoque):
+    schema = ds.dataset(estoque, format='parquet').schema
+    tabela, proximo = executar(estoque, montar_consulta({'limit': '40'}, schema, 'estoque.parquet'))
+
+    assert tabela.num_rows == 40
+    assert proximo is None
+
+
+def test_cursor_de_parquet_sem_particao(tmp_path):
+    df = pd.DataFrame({'Categoria': ['B', 'A', 'B', 'A', None], 'EAN': [3, 2, 1, 2, 5], 'Estoque': [1, 0, 2, 3, 4]})
+    caminho = os.path.join(tmp_path, 'tabela.parquet')
+    gravar_parquet(df, caminho, 'tabela.parquet')
+
+    linhas = paginar(caminho, 'tabela.parquet', {'limit': '1'})
+    assert [(linha['Categoria'], linha['EAN']) for linha in linhas] == [
+        ('A', 2), ('A', 2), ('B', 1), ('B', 3), (None, 5)]
+    assert len(paginar(caminho, 'tabela.parquet', {'limit': '1', 'com_estoque': '1'})) == 4
+
+
+def test_filtros_de_igualdade_e_intervalo(estoque):
+    schema = ds.dataset(estoque, format='parquet').schema
+    consulta = montar_consulta({'cod_fornecedor': '12', 'cod_produto_min': '10', 'cod_produto_max': '30'},
+                               schema, 'estoque.parquet')
+    tabela, proximo = executar(estoque, consulta)
+
+    assert sorted(tabela.column('Cód. Produto').to_pylist()) == [13, 17, 21, 25, 29]
+    assert proximo is None
+
+
+@pytest.mark.parametrize('args', [
+    {'limit': '0'},
+    {'limit': '-1'},
+    {'limit': 'dez'},
+    {'columns': 'inexistente'},
+    {'ean': 'abc'},
+    {'cursor': 'nao-e-um-cursor'},
+    {'cursor': consultas.codificar_cursor(1, [7], 0)},
+    {'ean': '99999999999999999999999'},
+    {'ean_min': '-1'},
+    {'cod_produto_max': str(2 ** 63)},
+    {'cursor': consultas.codificar_cursor(1, [7, 'MED', 2 ** 70], 0)},
+    {'cursor': consultas.codificar_cursor(1, ['sete', 'MED', 1], 0)},
+])
+def test_parametros_invalidos(estoque, args):
+    schema = ds.dataset(estoque, format='parquet').schema
+    with pytest.raises(ConsultaInvalida):
+        montar_consulta(args, schema, 'estoque.parquet')
+
+
+def test_decodificar_cursor():
+    assert decodificar_cursor(consultas.codificar_cursor(3, [7, 'MED', None], 2)) == (3, [7, 'MED', None], 2)
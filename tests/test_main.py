@@ -0,0 +1,126 @@
+import os
+import sqlite3
+import threading
+
+import pytest
+
+from main import DatabaseConnectionError, QueryError, SQLiteCRUD
+
+
+@pytest.fixture
+def db(tmp_path):
+    with SQLiteCRUD(os.path.join(tmp_path, 'teste.db'), pool_size=2) as db:
+        db.create_table('estoque', {'ean': 'INTEGER PRIMARY KEY', 'estoque': 'INTEGER'})
+        yield db
+
+
+def contar(db):
+    return db.select_one('estoque', columns='COUNT(*) AS total')['total']
+
+
+def test_leituras_reaproveitam_a_conexao(db):
+    with db.reader() as primeira:
+        pass
+    with db.reader() as segunda:
+        assert segunda is primeira
+    assert db._readers == 1
+
+
+def test_pool_limita_as_conexoes_de_leitura(db):
+    emprestada = threading.Event()
+    liberar = threading.Event()
+
+    def segurar():
+        with db.reader():
+            emprestada.set()
+            liberar.wait(5)
+
+    segurando = threading.Thread(target=segurar)
+    segurando.start()
+    emprestada.wait(5)
+    with db.reader():
+        # Pool cheio (2 emprestadas): a terceira leitura espera uma ser devolvida
+        conseguiu = []
+        terceira = threading.Thread(target=lambda: conseguiu.append(contar(db)))
+        terceira.start()
+        terceira.join(0.2)
+        assert terceira.is_alive()
+        assert db._readers == 2
+    terceira.join(5)
+    liberar.set()
+    segurando.join(5)
+
+    assert conseguiu == [0]
+    assert db._readers == 2
+
+
+def test_conexao_de_leitura_nao_escreve(db):
+    with db.reader() as conexao:
+        with pytest.raises(sqlite3.OperationalError):
+            conexao.execute("INSERT INTO estoque (ean, estoque) VALUES (1, 1)")
+
+
+def test_transacao_desfeita_em_erro(db):
+    db.bulk_insert('estoque', [{'ean': 1, 'estoque': 10}])
+
+    with pytest.raises(RuntimeError):
+        with db.transaction() as conexao:
+            conexao.execute("INSERT INTO estoque (ean, estoque) VALUES (2, 20)")
+            raise RuntimeError('falhou')
+
+    assert contar(db) == 1
+
+
+def test_transacoes_aninhadas_viram_um_commit(db):
+    with pytest.raises(QueryError):
+        with db.transaction():
+            db.bulk_insert('estoque', [{'ean': 1, 'estoque': 10}])
+            # Chave repetida: a carga falha e a transação externa inteira é desfeita
+            db.bulk_insert('estoque', [{'ean': 2, 'estoque': 20}, {'ean': 2, 'estoque': 21}])
+    assert contar(db) == 0
+
+    with db.transaction():
+        db.bulk_insert('estoque', [{'ean': 1, 'estoque': 10}])
+        db.bulk_upsert('estoque', [{'ean': 1, 'estoque': 11}, {'ean': 2, 'estoque': 20}])
+    assert db.select('estoque', order_by='ean') == [{'ean': 1, 'estoque': 11}, {'ean': 2, 'estoque': 20}]
+
+
+def test_leitura_nao_ve_transacao_em_andamento(db):
+    db.bulk_insert('estoque', [{'ean': 1, 'estoque': 10}])
+
+    with db.transaction() as conexao:
+        conexao.execute("INSERT INTO estoque (ean, estoque) VALUES (2, 20)")
+        # WAL: o leitor de outra thread lê o último commit sem esperar o escritor
+        lidas = []
+        leitor = threading.Thread(target=lambda: lidas.append(contar(db)))
+        leitor.start()
+        leitor.join(5)
+        assert lidas == [1]
+
+    assert contar(db) == 2
+
+
+def test_banco_em_memoria_compartilha_a_conexao():
+    with SQLiteCRUD(':memory:') as db:
+        db.create_table('estoque', {'ean': 'INTEGER PRIMARY KEY', 'estoque': 'INTEGER'})
+        db.bulk_insert('estoque', [{'ean': 1, 'estoque': 10}])
+
+        assert db.select_one('estoque', 'ean = ?', (1,)) == {'ean': 1, 'estoque': 10}
+
+
+def test_banco_fechado(db):
+    db.close()
+
+    with pytest.raises(DatabaseConnectionError):
+        with db.reader():
+            pass
+    with pytest.raises(DatabaseConnectionError):
+        with db.transaction():
+            pass
+
+
+def test_inteiro_fora_do_int64_vira_query_error(db):
+    with pytest.raises(QueryError):
+        db.select('estoque', 'ean = ?', (2 ** 70,))
+    with pytest.raises(QueryError):
+        db.bulk_insert('estoque', [{'ean': 2 ** 70, 'estoque': 1}])
@@ -0,0 +1,19 @@
+import os
+
+import pytest
+
+from benchmarks.gerador import planilha_em_cache
+from benchmarks.memoria import medir_importacao
+from benchmarks.suite import CACHE_PLANILHAS
+from blocos import ORCAMENTO_MEMORIA_MB
+
+
+@pytest.mark.lento
+def test_pico_da_importacao_em_blocos_cabe_no_orcamento(tmp_path):
+    # Planilha de 1 milhão de linhas por aba, gerada uma vez e guardada com as dos benchmarks
+    arquivo = planilha_em_cache(CACHE_PLANILHAS, 1_000_000)
+
+    pico, _ = medir_importacao("import sys, blocos; blocos.run_blocos(sys.argv[1])", arquivo,
+                               os.path.join(tmp_path, 'dados'), ORCAMENTO_MEMORIA_MB)
+
+    assert pico <= ORCAMENTO_MEMORIA_MB
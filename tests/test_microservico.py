@@ -0,0 +1,38 @@
+import os
+
+import pytest
+
+import microservico
+from main import SQLiteCRUD
+
+FORA_DO_INT64 = '99999999999999999999999'
+
+
+@pytest.fixture
+def cliente(tmp_path, monkeypatch):
+    with SQLiteCRUD(os.path.join(tmp_path, 'banco.db')) as banco:
+        banco.create_table('estoque', {'ean': 'INTEGER PRIMARY KEY', 'cod_produto': 'INTEGER', 'estoque': 'INTEGER'})
+        banco.bulk_insert('estoque', [{'ean': 7890000000000 + i, 'cod_produto': i, 'estoque': i} for i in range(5)])
+        monkeypatch.setattr(microservico, 'banco', banco)
+        yield microservico.app.test_client()
+
+
+def test_paginacao_por_ean(cliente):
+    resposta = cliente.get('/banco/estoque?limit=2&apos=7890000000000')
+
+    assert [registro['ean'] for registro in resposta.get_json()] == [7890000000001, 7890000000002]
+    assert resposta.headers['X-Proximo-Apos'] == '7890000000002'
+
+
+@pytest.mark.parametrize('url', [
+    f'/banco/estoque?apos={FORA_DO_INT64}',
+    f'/banco/estoque?ean={FORA_DO_INT64}',
+    f'/banco/estoque?cod_produto=1,-{FORA_DO_INT64}',
+    f'/banco/estoque/{FORA_DO_INT64}',
+    '/banco/estoque?limit=0',
+])
+def test_parametro_fora_do_intervalo(cliente, url):
+    resposta = cliente.get(url)
+
+    assert resposta.status_code == 400
+    assert 'erro' in resposta.get_json()
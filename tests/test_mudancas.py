@@ -0,0 +1,72 @@
+import pandas as pd
+import pytest
+
+import mudancas
+from mudancas import ATUALIZACAO, CHAVE, INSERCAO, REMOCAO, VersaoIndisponivel, mudancas_desde
+from snapshots import ArmazemSnapshots
+
+
+def publicar(armazem, linhas, base):
+    """Publica uma versão com o delta do estoque dado por (operacao, EAN, estoque)"""
+    with armazem.nova_versao() as versao:
+        df = pd.DataFrame(linhas, columns=['operacao', CHAVE, 'Estoque Disponivel'])
+        mudancas.gravar_mudancas(df.astype({CHAVE: 'int64', 'Estoque Disponivel': 'Int64'}),
+                                 versao.caminho(mudancas.ARQUIVO_MUDANCAS.format('estoque')))
+        versao.metadados['base'] = base
+    return versao.versao
+
+
+@pytest.fixture
+def armazem(tmp_path):
+    armazem = ArmazemSnapshots(str(tmp_path), retencao=10, carencia=0)
+    # Versão 1: carga inicial, sem delta
+    with armazem.nova_versao() as versao:
+        versao.metadados['base'] = None
+    publicar(armazem, [(INSERCAO, 1, 10), (ATUALIZACAO, 2, 20), (REMOCAO, 3, None)], base=1)
+    publicar(armazem, [(ATUALIZACAO, 1, 11), (INSERCAO, 4, 40), (INSERCAO, 3, 30)], base=2)
+    publicar(armazem, [(REMOCAO, 1, None), (ATUALIZACAO, 4, 41)], base=3)
+    return armazem
+
+
+def por_chave(df):
+    return {linha[CHAVE]: (linha['operacao'], linha['Estoque Disponivel'])
+            for linha in df.astype(object).where(df.notna(), None).to_dict(orient='records')}
+
+
+def test_mudancas_de_uma_versao(armazem):
+    assert por_chave(mudancas_desde(armazem, 2, 'estoque', 3)) == {
+        1: (ATUALIZACAO, 11), 4: (INSERCAO, 40), 3: (INSERCAO, 30)}
+
+
+def test_mudancas_juntadas_no_intervalo(armazem):
+    assert por_chave(mudancas_desde(armazem, 1, 'estoque', 4)) == {
+        # A chave 1, inserida e removida no intervalo, é omitida
+        2: (ATUALIZACAO, 20),
+        # Removida e inserida de novo: atualização
+        3: (ATUALIZACAO, 30),
+        # Inserida e depois atualizada: continua inserção, com a linha mais recente
+        4: (INSERCAO, 41),
+    }
+
+
+def test_sem_versoes_no_intervalo(armazem):
+    vazio = mudancas_desde(armazem, 4, 'estoque', 4)
+    assert list(vazio.columns) == ['operacao', CHAVE]
+    assert vazio.empty
+
+
+def test_versao_removida_pela_retencao(armazem):
+    armazem.retencao = 1
+    armazem.coletar_lixo()
+
+    with pytest.raises(VersaoIndisponivel):
+        mudancas_desde(armazem, 1, 'estoque', 4)
+    assert por_chave(mudancas_desde(armazem, 3, 'estoque', 4)) == {1: (REMOCAO, None), 4: (ATUALIZACAO, 41)}
+
+
+def test_versao_sem_delta_da_anterior(armazem):
+    # Versão 5 regravada por inteiro (a base não é a versão 4)
+    publicar(armazem, [(INSERCAO, 9, 90)], base=None)
+
+    with pytest.raises(VersaoIndisponivel):
+        mudancas_desde(armazem, 4, 'estoque', 5)
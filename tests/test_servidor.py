@@ -0,0 +1,59 @@
+import os
+import time
+
+import pytest
+
+import servidor
+from benchmarks.gerador import gerar_planilha
+from indice_ean import gravar_indice
+from snapshots import armazem
+
+
+@pytest.fixture
+def cliente():
+    with armazem.nova_versao() as versao:
+        gravar_indice([7890000000001, 7890000000002], [10, 20], versao)
+    return servidor.app.test_client()
+
+
+def test_lookup(cliente):
+    resposta = cliente.post('/estoque/lookup', json={'eans': [7890000000001, '7890000000002', 1]})
+
+    assert resposta.status_code == 200
+    assert resposta.get_json()['estoque'] == {'7890000000001': 10, '7890000000002': 20}
+    assert resposta.get_json()['nao_encontrados'] == [1]
+
+
+@pytest.mark.parametrize('eans', [[7890000000001, 2 ** 70], [True], [-1], ['abc'], [None]])
+def test_lookup_recusa_ean_invalido(cliente, eans):
+    resposta = cliente.post('/estoque/lookup', json={'eans': eans})
+
+    assert resposta.status_code == 400
+    assert resposta.get_json() == {'erro': 'Todos os EANs devem ser numéricos'}
+
+
+def test_ean_fora_do_intervalo_nao_encontrado(cliente):
+    assert cliente.get(f'/estoque/{2 ** 70}').status_code == 404
+
+
+def test_lote_enviado_por_upload(tmp_path, monkeypatch):
+    monkeypatch.setattr(servidor, 'UPLOAD_FOLDER', str(tmp_path / 'uploads'))
+    arquivos = []
+    for semente in range(2):
+        caminho = os.path.join(tmp_path, f'lote_{semente}.xlsx')
+        gerar_planilha(caminho, 50, semente=semente)
+        arquivos.append((open(caminho, 'rb'), os.path.basename(caminho)))
+    cliente = servidor.app.test_client()
+
+    resposta = cliente.post('/importar/lote', data={'arquivos': arquivos}, content_type='multipart/form-data')
+    assert resposta.status_code == 202
+    for _ in range(300):
+        tarefa = cliente.get(resposta.get_json()['status']).get_json()
+        if tarefa['estado'] in ('concluida', 'falhou'):
+            break
+        time.sleep(0.1)
+
+    assert tarefa['estado'] == 'concluida', tarefa['erro']
+    assert tarefa['resultado']['versao'] == armazem.versao_atual()
+    # Os arquivos gravados para o lote são removidos no fim da tarefa
+    assert os.listdir(tmp_path / 'uploads') == []
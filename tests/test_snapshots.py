@@ -0,0 +1,120 @@
+import os
+import shutil
+
+import pytest
+
+from snapshots import ArmazemSnapshots
+
+
+def publicar(armazem, conteudo='x'):
+    with armazem.nova_versao() as versao:
+        with open(versao.caminho('dados.txt'), 'w', encoding='utf-8') as arquivo:
+            arquivo.write(conteudo)
+    return versao.versao
+
+
+def envelhecer(armazem, versao, segundos=3600):
+    """Recua a data de publicação da versão, como se ela tivesse sido publicada há `segundos`"""
+    diretorio = armazem.diretorio_versao(versao)
+    instante = os.path.getmtime(diretorio) - segundos
+    os.utime(diretorio, (instante, instante))
+
+
+def test_publicacao_troca_a_versao_atual(tmp_path):
+    armazem = ArmazemSnapshots(str(tmp_path), carencia=0)
+    assert armazem.versao_atual() is None
+
+    assert publicar(armazem, 'um') == 1
+    assert publicar(armazem, 'dois') == 2
+
+    assert armazem.versao_atual() == 2
+    assert armazem.manifesto(2)['arquivos'] == ['dados.txt']
+    with open(armazem.caminho(1, 'dados.txt'), encoding='utf-8') as arquivo:
+        assert arquivo.read() == 'um'
+
+
+def test_falha_na_gravacao_nao_publica(tmp_path):
+    armazem = ArmazemSnapshots(str(tmp_path))
+    publicar(armazem)
+
+    with pytest.raises(RuntimeError):
+        with armazem.nova_versao() as versao:
+            open(versao.caminho('dados.txt'), 'w').close()
+            raise RuntimeError('falhou')
+
+    assert armazem.versoes() == [1]
+    assert armazem.versao_atual() == 1
+    assert os.listdir(armazem.diretorio_tmp) == []
+
+
+def test_fixar_versao_removida_ou_sem_publicacao(tmp_path):
+    armazem = ArmazemSnapshots(str(tmp_path))
+    with armazem.fixar() as versao:
+        assert versao is None
+
+    publicar(armazem)
+    with armazem.fixar(7) as versao:
+        assert versao is None
+    with armazem.fixar() as versao:
+        assert versao == 1
+        assert armazem.fixadas == {1: 1}
+    assert armazem.fixadas == {}
+
+
+def test_coleta_mantem_a_retencao_e_a_atual(tmp_path):
+    armazem = ArmazemSnapshots(str(tmp_path), retencao=2, carencia=0)
+    for _ in range(6):
+        publicar(armazem)
+
+    assert armazem.versoes() == [4, 5, 6]
+    assert armazem.versao_atual() == 6
+
+
+def test_coleta_respeita_a_versao_fixada(tmp_path):
+    armazem = ArmazemSnapshots(str(tmp_path), retencao=0, carencia=0)
+    publicar(armazem)
+
+    with armazem.fixar() as fixada:
+        publicar(armazem)
+        publicar(armazem)
+        assert armazem.versoes() == [fixada, 3]
+
+    assert armazem.coletar_lixo() == [fixada]
+    assert armazem.versoes() == [3]
+
+
+def test_coleta_respeita_a_carencia(tmp_path):
+    armazem = ArmazemSnapshots(str(tmp_path), retencao=0, carencia=60)
+    publicar(armazem)
+    publicar(armazem)
+    publicar(armazem)
+
+    # A versão 1 foi substituída há pouco (a 2 acabou de ser publicada)
+    assert armazem.versoes() == [1, 2, 3]
+
+    envelhecer(armazem, 2)
+    assert armazem.coletar_lixo() == [1]
+    assert armazem.versoes() == [2, 3]
+
+
+def test_versao_em_remocao_nao_pode_ser_fixada(tmp_path, monkeypatch):
+    armazem = ArmazemSnapshots(str(tmp_path), retencao=5, carencia=0)
+    for _ in range(3):
+        publicar(armazem)
+
+    fixadas = []
+    rmtree = shutil.rmtree
+
+    def apagar(caminho, **kwargs):
+        # Enquanto os arquivos são apagados, a versão já não pode ser fixada
+        if os.path.exists(caminho):
+            versao = int(os.path.basename(caminho).split('.')[0])
+            with armazem.fixar(versao) as fixada:
+                fixadas.append(fixada)
+        rmtree(caminho, **kwargs)
+
+    monkeypatch.setattr(shutil, 'rmtree', apagar)
+    armazem.retencao = 0
+    assert armazem.coletar_lixo() == [1, 2]
+    assert fixadas == [None, None]
+    assert os.listdir(armazem.diretorio_tmp) == []
@@ -0,0 +1,136 @@
+"""
+Recebimento das planilhas enviadas por upload.
+
+O corpo é copiado em pedaços para um arquivo na pasta de uploads enquanto o
+SHA-256 é calculado, então o upload nunca fica inteiro na memória do
+processo. A leitura usa o arquivo mapeado em memória (ArquivoMapeado): o
+zipfile do openpyxl lê as duas abas direto das páginas do arquivo, que o
+sistema operacional compartilha e descarta sob pressão de memória.
+
+O hash vai para o manifesto da versão publicada ('origem'), o que permite
+ignorar o reenvio de uma planilha idêntica à da versão atual.
+"""
+import hashlib
+import io
+import mmap
+import os
+import tempfile
+
+TAMANHO_PEDACO = 1024 * 1024
+
+
+class Upload:
+    def __init__(self, caminho: str, sha256: str, tamanho: int, nome: str = ''):
+        """
+        Planilha recebida e gravada em disco
+
+        Args:
+            caminho (str): Arquivo na pasta de uploads
+            sha256 (str): Hash do conteúdo, em hexadecimal
+            tamanho (int): Tamanho em bytes
+            nome (str): Nome original do arquivo
+        """
+        self.caminho = caminho
+        self.sha256 = sha256
+        self.tamanho = tamanho
+        self.nome = nome
+
+    def origem(self) -> dict:
+        """Identificação do arquivo gravada no manifesto da versão"""
+        return {'arquivo': self.nome, 'sha256': self.sha256, 'tamanho': self.tamanho}
+
+    def remover(self) -> None:
+        try:
+            os.remove(self.caminho)
+        except FileNotFoundError:
+            pass
+
+
+class ArquivoMapeado(io.RawIOBase):
+    def __init__(self, caminho: str):
+        """
+        Arquivo somente leitura sobre um mmap, com a interface de arquivo
+        (read, seek, tell) que o zipfile do openpyxl usa
+
+        Raises:
+            ValueError: Se o arquivo estiver vazio (não pode ser mapeado)
+        """
+        super().__init__()
+        with open(caminho, 'rb') as arquivo:
+            self.mapa = mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, tamanho=-1):
+        return self.mapa.read(None if tamanho is None or tamanho < 0 else tamanho)
+
+    def readinto(self, buffer):
+        posicao = self.mapa.tell()
+        lidos = min(len(buffer), len(self.mapa) - posicao)
+        buffer[:lidos] = self.mapa[posicao:posicao + lidos]
+        self.mapa.seek(posicao + lidos)
+        return lidos
+
+    def seek(self, posicao, origem=os.SEEK_SET):
+        self.mapa.seek(posicao, origem)
+        return self.mapa.tell()
+
+    def tell(self):
+        return self.mapa.tell()
+
+    def close(self):
+        if not self.closed:
+            self.mapa.close()
+        super().close()
+
+
+def receber(stream, diretorio: str, nome: str = '') -> Upload:
+    """
+    Grava o stream do upload em um arquivo novo da pasta, em pedaços de
+    TAMANHO_PEDACO, calculando o SHA-256 no caminho
+
+    Args:
+        stream: Objeto arquivo com o conteúdo (ex.: FileStorage.stream)
+        diretorio (str): Pasta de uploads, criada se não existir
+        nome (str): Nome original do arquivo
+
+    Returns:
+        Upload: Arquivo gravado; quem recebe é responsável por removê-lo
+    """
+    os.makedirs(diretorio, exist_ok=True)
+    resumo = hashlib.sha256()
+    tamanho = 0
+    descritor, caminho = tempfile.mkstemp(dir=diretorio, suffix=os.path.splitext(nome)[1])
+    try:
+        with os.fdopen(descritor, 'wb') as destino:
+            while True:
+                pedaco = stream.read(TAMANHO_PEDACO)
+                if not pedaco:
+                    break
+                resumo.update(pedaco)
+                destino.write(pedaco)
+                tamanho += len(pedaco)
+    except BaseException:
+        os.remove(caminho)
+        raise
+    return Upload(caminho, resumo.hexdigest(), tamanho, nome)
+
+
+def versao_identica(armazem, sha256: str):
+    """
+    Versão atual do armazém, se ela foi importada de um arquivo com o mesmo
+    SHA-256; senão None. Só a versão atual conta: reenviar a planilha de uma
+    versão antiga precisa ser importado de novo para voltar a ela.
+    """
+    with armazem.fixar() as versao:
+        if versao is None:
+            return None
+        try:
+            origem = armazem.manifesto(versao).get('origem') or {}
+        except (FileNotFoundError, ValueError):
+            return None
+    return versao if origem.get('sha256') == sha256 else None